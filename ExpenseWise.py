@@ -1,13 +1,40 @@
 """ExpenseWise - A Personal Finance Tracker Application using Tkinter"""
 
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import argparse
 import datetime
 import random
 import csv
 import os
 import json
 import logging
+import decimal
+import time
+import bisect
+import collections
+import re
+import functools
+import threading
+import operator
+import array
+import mmap
+import struct
+import sys
+import sqlite3
+import queue
+import concurrent.futures
+
+try:
+    import numpy as np
+except ImportError: # Optional: ledger analytics fall back to plain Python loops
+    np = None
+
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+except ImportError: # Optional: the Charts page shows an install hint instead
+    Figure = FigureCanvasTkAgg = None
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -80,7 +107,54 @@ FONT_TITLE = (FONT_FAMILY, 12, "bold")
 FONT_SMALL = (FONT_FAMILY, 8)
 
 # --- Data Store ---
-app_data = {
+class LazyAppData(dict):
+    """
+    The app_data mapping. Datasets registered with a loader are read on first access
+    (item lookup or get()); concurrent readers wait for the one load in progress.
+    A loader must not read its own key from app_data.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaders = {} # key -> zero-argument callable returning the value
+        self._load_locks = {}
+
+    def register_loader(self, key, loader):
+        """Replaces any current value for key with a loader that runs on first access."""
+        with self._load_locks.setdefault(key, threading.Lock()):
+            super().pop(key, None)
+            self._loaders[key] = loader
+
+    def is_loaded(self, key):
+        return key not in self._loaders
+
+    def ensure_loaded(self, *keys):
+        """Runs any pending loaders for keys, waiting if another thread is already loading them."""
+        for key in keys:
+            if key not in self._loaders: continue
+            with self._load_locks[key]:
+                loader = self._loaders.get(key)
+                if loader is None: continue # Loaded by another thread while we waited
+                super().__setitem__(key, loader())
+                del self._loaders[key]
+
+    def __missing__(self, key):
+        if key not in self._loaders: raise KeyError(key)
+        self.ensure_loaded(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key in self._loaders: self.ensure_loaded(key)
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        if key in self._loaders:
+            with self._load_locks[key]: # Let an in-flight load finish before replacing it
+                self._loaders.pop(key, None)
+                super().__setitem__(key, value)
+        else:
+            super().__setitem__(key, value)
+
+app_data = LazyAppData({
     "user_profiles": {},
     "current_user_id": None,
     "wallets": {},
@@ -90,7 +164,7 @@ app_data = {
     "activity_log": [],
     "settings": {"theme": "dark"},
     "categories": {},
-}
+})
 
 # --- Core Categories ---
 BASE_CATEGORIES = {
@@ -126,7 +200,42 @@ BASE_CATEGORIES = {
 DATA_DIR = "ExpenseWiseData"
 USER_PROFILES_CSV = os.path.join(DATA_DIR, "user_profiles.csv")
 ACCOUNT_ICON_COLORS = ["#E57373", "#81C784", "#64B5F6", "#FFD54F", "#BA68C8", "#4DB6AC", "#F06292", "#A1887F"]
-MAX_ACTIVITY_LOG_SIZE = 150
+MAX_ACTIVITY_LOG_SIZE = 150 # Entries kept in memory; older ones are spilled to the activity archive
+ACTIVITY_ARCHIVE_PAGE_SIZE = 200 # Archived entries the Activity Log page loads per request
+TRANSACTION_ROW_HEIGHT = 25 # Matches the Treeview rowheight style
+TRANSACTION_ROW_BUFFER = 50 # Rows formatted ahead of/behind the visible window
+IMPORT_BATCH_SIZE = 5000 # Statement rows recorded (and balances/log/UI updated) per batch
+TOMBSTONE_COMPACTION_MIN = 256 # Deleted ledger rows tolerated (or 1/8 of the ledger, if more) before compacting
+DUPLICATE_WINDOW_MINUTES = 10 # Same wallet and amount within this many minutes counts as a near-duplicate
+JOURNAL_COMPACTION_THRESHOLD = 500 # Journal rows before save_user_data folds them into the base file
+IO_POLL_INTERVAL_MS = 50 # How often the Tk thread checks on background loads/saves
+AUTOSAVE_CHECK_MS = 1000 # How often the autosave timer looks for dirty datasets
+AUTOSAVE_IDLE_SECONDS = 3 # Save once edits have paused this long...
+AUTOSAVE_MAX_DELAY_SECONDS = 30 # ...or once the oldest unsaved edit is this old
+USE_BINARY_SNAPSHOTS = True # Keep a columnar .snap next to transactions CSVs for fast startup
+SNAPSHOT_MAGIC = b"EWSNAP02" # 02: amounts stored as int64 centavos
+SNAPSHOT_HEADER = struct.Struct("<8sI") # magic, JSON header length
+MONEY_UNITS = "centavos" # Money is held as integer centavos in memory, SQLite and derived files; CSV files keep decimal pesos
+STORAGE_BACKEND = os.environ.get("EXPENSEWISE_STORAGE", "csv").strip().lower() # "csv" (flat files) or "sqlite"
+
+TIMESTAMP_EPOCH = datetime.datetime(1970, 1, 1)
+UNKNOWN_TIMESTAMP = int((datetime.datetime.min - TIMESTAMP_EPOCH).total_seconds()) # Sorts before every real date
+
+# --- Data Schemas ---
+TRANSACTION_FIELDS = ['transaction_id', 'date', 'time', 'timestamp', 'title', 'wallet', 'amount', 'category', 'type', 'from_account', 'to_account', 'linked_budget', 'linked_goal']
+ACTIVITY_LOG_FIELDS = ['timestamp', 'action']
+JOURNAL_FIELDS = {"transactions": TRANSACTION_FIELDS, "activity_log": ACTIVITY_LOG_FIELDS}
+JOURNAL_TOMBSTONE_TYPE = "deleted" # Type of a journaled row that only records the deletion of its transaction_id
+# Transaction fields that refer to wallets, budgets and goals by name
+REFERENCE_FIELDS = {"wallets": ("wallet", "from_account", "to_account"), "budgets": ("linked_budget",), "goals": ("linked_goal",)}
+BUDGET_CYCLES = ["Once", "Daily", "Weekly", "Monthly", "Yearly"]
+PREVIOUS_PERIOD_LABELS = {"Daily": "yesterday", "Weekly": "last week", "Monthly": "last month", "Yearly": "last year"}
+# Files derived from the user's datasets and saved in the same generation as them
+DERIVED_DATA_TYPES = ("checkpoint",)
+
+# Journal bookkeeping for the current user (rows appended since the last compaction)
+journal_row_counts = {data_type: 0 for data_type in JOURNAL_FIELDS}
+compaction_requested = set() # Journaled data types changed in place, needing a full rewrite on next save
 
 # --- Utility Functions ---
 def create_stylish_button(parent, text, command, style="TButton", **kwargs):
@@ -137,15 +246,49 @@ def create_card_frame(parent):
     """Creates a standard card frame."""
     return tk.Frame(parent, bg=theme_colors["card"], relief=tk.FLAT, bd=0)
 
-def format_currency(amount):
-    """Formats a number as Philippine Peso currency."""
-    if amount is None:
+def format_currency(cents):
+    """Formats integer centavos as Philippine Peso currency."""
+    if cents is None:
         return "₱ N/A"
     try:
-        return f"₱ {float(amount):,.2f}"
+        cents = int(cents)
     except (ValueError, TypeError):
-        logging.warning(f"Invalid amount for currency formatting: {amount}")
+        logging.warning(f"Invalid amount for currency formatting: {cents}")
         return "₱ Invalid"
+    pesos, centavos = divmod(abs(cents), 100)
+    return f"₱ {'-' if cents < 0 else ''}{pesos:,}.{centavos:02d}"
+
+def parse_money(value):
+    """Converts a peso amount ('1,234.50', '-12', 12.5) to integer centavos, rounding half away from zero. Raises ValueError."""
+    text = str(value).replace(",", "").strip()
+    dot = text.find(".")
+    try:
+        if len(text) <= 16 and (dot < 0 or len(text) - dot <= 3) and "e" not in text and "E" not in text:
+            # At most two decimals and under 2**53 centavos: the float product is within 0.5 of the exact value
+            return round(float(text) * 100)
+        return int(decimal.Decimal(text).scaleb(2).to_integral_value(rounding=decimal.ROUND_HALF_UP))
+    except (decimal.InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"Invalid amount '{value}'")
+
+def money_text(cents):
+    """Returns integer centavos as plain decimal pesos ('-1234.50'), the form CSV files and entry fields use."""
+    pesos, centavos = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}{pesos}.{centavos:02d}"
+
+def cents_to_pesos(cents):
+    """Returns centavos as a float number of pesos, for plotting only."""
+    return cents / 100
+
+def money_rows(rows, money_fields):
+    """Yields rows ready for a CSV writer: copies with their integer money fields as decimal text."""
+    if not money_fields:
+        yield from rows
+        return
+    for row in rows:
+        row = dict(row)
+        for field in money_fields:
+            if isinstance(row.get(field), int): row[field] = money_text(row[field])
+        yield row
 
 def log_activity(action):
     """Adds an entry to the activity log for the current user."""
@@ -156,17 +299,79 @@ def log_activity(action):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_entry = {"timestamp": timestamp, "action": action}
 
-    if not isinstance(app_data.get("activity_log"), list):
-        app_data["activity_log"] = [] # Ensure log is a list
+    activity_log = app_data.get("activity_log")
+    if not isinstance(activity_log, collections.deque):
+        activity_log = app_data["activity_log"] = new_activity_log(activity_log if isinstance(activity_log, list) else ())
+
+    # The deque drops its oldest entry on append; archive it first so a crash cannot lose it
+    if len(activity_log) == activity_log.maxlen:
+        archive_activity_entries(user_id, [activity_log[0]])
+    activity_log.append(log_entry)
+    append_to_journal("activity_log", [log_entry])
+    dirty_data.mark("activity_log")
+
+def new_activity_log(entries=()):
+    """Returns the in-memory activity log: a ring buffer of the newest MAX_ACTIVITY_LOG_SIZE entries."""
+    return collections.deque(entries, maxlen=MAX_ACTIVITY_LOG_SIZE)
+
+def parse_transaction_timestamp(tx):
+    """Returns a transaction's timestamp as seconds since 1970 (naive local time) for sorting."""
+    ts_str = tx.get('timestamp'); date_str = tx.get('date')
+    try:
+        if ts_str:
+            try: parsed = datetime.datetime.fromisoformat(ts_str)
+            except ValueError:
+                try: parsed = datetime.datetime.strptime(ts_str, "%Y-%m-%d %H:%M")
+                except ValueError: parsed = datetime.datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
+        elif date_str: parsed = datetime.datetime.strptime(date_str, "%Y-%m-%d")
+        else: return UNKNOWN_TIMESTAMP
+        return int((parsed - TIMESTAMP_EPOCH).total_seconds())
+    except (ValueError, TypeError): return UNKNOWN_TIMESTAMP
+
+class IdGenerator:
+    """
+    Issues IDs shaped prefix_<13-digit milliseconds><4-digit counter>_<process tag>. The counter
+    makes IDs from one process unique and strictly increasing even within a millisecond (or if the
+    clock steps back); the random per-process tag keeps two processes started together apart.
+    Equal-length IDs with the same prefix therefore sort in creation order.
+    """
+    COUNTER_LIMIT = 10000
 
-    app_data["activity_log"].append(log_entry)
-    # Limit activity log size
-    if len(app_data["activity_log"]) > MAX_ACTIVITY_LOG_SIZE:
-        app_data["activity_log"].pop(0)
+    def __init__(self):
+        self.lock = threading.Lock() # IDs may be requested from the I/O worker as well
+        self.last_ms = 0
+        self.counter = 0
+        self.process_tag = os.urandom(2).hex()
+
+    def reserve(self, count):
+        """Reserves `count` consecutive (millisecond, counter) slots. Returns the first one."""
+        with self.lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self.last_ms: self.last_ms, self.counter = now_ms, 0
+            first = (self.last_ms, self.counter)
+            # Running past the counter borrows the next milliseconds, which keeps the order
+            self.last_ms += (self.counter + count) // self.COUNTER_LIMIT
+            self.counter = (self.counter + count) % self.COUNTER_LIMIT
+            return first
+
+    def generate(self, prefix, count):
+        ms, counter = self.reserve(count)
+        ids = []
+        for _ in range(count):
+            ids.append(f"{prefix}_{ms:013d}{counter:04d}_{self.process_tag}")
+            counter += 1
+            if counter == self.COUNTER_LIMIT: ms, counter = ms + 1, 0
+        return ids
+
+id_generator = IdGenerator()
 
 def get_unique_id(prefix):
-    """Generates a simple unique ID (timestamp + random)."""
-    return f"{prefix}_{int(datetime.datetime.now().timestamp())}_{random.randint(1000, 9999)}"
+    """Generates a unique, creation-ordered ID (see IdGenerator)."""
+    return id_generator.generate(prefix, 1)[0]
+
+def get_unique_ids(prefix, count):
+    """Generates `count` unique IDs in creation order with a single reservation, for bulk creation."""
+    return id_generator.generate(prefix, count)
 
 def ensure_data_dir():
     """Creates the data directory if it doesn't exist."""
@@ -176,9 +381,92 @@ def ensure_data_dir():
             logging.info(f"Created data directory: {DATA_DIR}")
         except OSError as e:
             logging.error(f"Could not create data directory '{DATA_DIR}': {e}")
-            messagebox.showerror("Directory Error", f"Could not create data directory '{DATA_DIR}':\n{e}\nApplication cannot continue.")
+            report_error("Directory Error", f"Could not create data directory '{DATA_DIR}':\n{e}\nApplication cannot continue.")
             exit(1) # Critical failure
 
+# --- Dirty Tracking ---
+class DirtyTracker:
+    """Remembers which per-user datasets changed since they were last handed to a save."""
+    def __init__(self):
+        self._lock = threading.Lock() # Failed background saves re-mark from the I/O worker
+        self.datasets = set()
+        self.first_change = None # time.monotonic() of the oldest unsaved change
+        self.last_change = None
+
+    def mark(self, *data_keys):
+        now = time.monotonic()
+        with self._lock:
+            self.datasets.update(data_keys)
+            if self.first_change is None: self.first_change = now
+            self.last_change = now
+
+    def take(self):
+        """Returns the dirty dataset names and clears them."""
+        with self._lock:
+            taken, self.datasets = self.datasets, set()
+            self.first_change = self.last_change = None
+            return taken
+
+    def clear(self):
+        self.take()
+
+    def is_due(self, now=None):
+        """Checks whether an autosave should run now (debounced, but never deferred past the max delay)."""
+        if not self.datasets: return False
+        now = time.monotonic() if now is None else now
+        return now - self.last_change >= AUTOSAVE_IDLE_SECONDS or now - self.first_change >= AUTOSAVE_MAX_DELAY_SECONDS
+
+dirty_data = DirtyTracker()
+
+# --- Background I/O ---
+io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="expensewise-io") # One worker keeps writes in order
+pending_io = set() # Futures not yet finished
+ui_error_queue = queue.Queue() # (title, message) raised on the worker, shown by the Tk thread
+
+def report_error(title, message):
+    """Shows an error dialog, deferring it to the Tk thread when called from the I/O worker."""
+    if threading.current_thread() is threading.main_thread():
+        messagebox.showerror(title, message)
+    else:
+        ui_error_queue.put((title, message))
+
+def ledger_ready(parent):
+    """Returns True once the transaction ledger is loaded; otherwise tells the user it is still loading."""
+    if app_data.is_loaded("transactions"): return True
+    messagebox.showinfo("Still Loading", "Transactions are still loading. Try again in a moment.", parent=parent)
+    return False
+
+def run_in_background(widget, func, *args, on_done=None, on_error=None):
+    """Runs func(*args) on the I/O worker; on_done(result) or on_error(exception) is then called on the Tk thread."""
+    future = io_executor.submit(func, *args)
+    pending_io.add(future)
+    future.add_done_callback(pending_io.discard)
+
+    def poll():
+        while not ui_error_queue.empty():
+            title, message = ui_error_queue.get_nowait()
+            messagebox.showerror(title, message, parent=widget)
+        if not future.done():
+            widget.after(IO_POLL_INTERVAL_MS, poll)
+            return
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Background task {getattr(func, '__name__', func)} failed: {error}")
+            if on_error: on_error(error)
+        elif on_done:
+            on_done(future.result())
+
+    try:
+        widget.after(IO_POLL_INTERVAL_MS, poll)
+    except tk.TclError:
+        logging.warning("Widget gone before a background task was scheduled; its result will be dropped.")
+    return future
+
+def wait_for_io(timeout=None):
+    """Blocks until every submitted load/save has finished. Returns False if some are still running after timeout."""
+    not_done = concurrent.futures.wait(list(pending_io), timeout=timeout).not_done
+    return not not_done
+
 # --- CSV/JSON Handling for User Profiles ---
 def load_user_profiles_from_csv():
     """Loads user profile data from user_profiles.csv."""
@@ -225,8 +513,8 @@ def load_user_profiles_from_csv():
             created_demo = True
         except (ValueError, csv.Error, Exception) as e:
             logging.exception(f"Failed to load user profiles from '{USER_PROFILES_CSV}': {e}")
-            messagebox.showerror("CSV Load Error",
-                                 f"Failed to load user profiles from '{USER_PROFILES_CSV}':\n{e}\n\nPlease check the file or delete it to start fresh with a demo user.")
+            report_error("CSV Load Error",
+                         f"Failed to load user profiles from '{USER_PROFILES_CSV}':\n{e}\n\nPlease check the file or delete it to start fresh with a demo user.")
             # Load demo as fallback on error
             profiles.clear()
             demo_id = get_unique_id("user_demo")
@@ -244,44 +532,43 @@ def load_user_profiles_from_csv():
     if created_demo:
         save_user_profiles_to_csv() # Save the newly created demo user
 
-def save_user_profiles_to_csv():
-    """Saves the current app_data['user_profiles'] to user_profiles.csv."""
+def save_user_profiles_to_csv(profiles_to_save=None):
+    """Saves user profiles (a copy passed by a background caller, else app_data['user_profiles']) to user_profiles.csv."""
     ensure_data_dir()
-    profiles_to_save = app_data.get("user_profiles")
+    if profiles_to_save is None: profiles_to_save = app_data.get("user_profiles")
     if not profiles_to_save:
         logging.warning("Attempted to save user profiles, but none are loaded in memory.")
         try:
-            with open(USER_PROFILES_CSV, mode='w', newline='', encoding='utf-8') as csvfile:
-                 fieldnames = ['user_id', 'name', 'icon_color']
-                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                 writer.writeheader()
+            write_file_atomically(USER_PROFILES_CSV, lambda csvfile: csv.DictWriter(csvfile, fieldnames=['user_id', 'name', 'icon_color']).writeheader())
             logging.info(f"Created empty user profiles file with header: '{USER_PROFILES_CSV}'.")
         except IOError as e:
             logging.error(f"Could not write header to empty '{USER_PROFILES_CSV}': {e}")
         return
 
+    def write_profiles(csvfile):
+        fieldnames = ['user_id', 'name', 'icon_color']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for user_id, details in profiles_to_save.items():
+             if not isinstance(details, dict):
+                 logging.warning(f"Skipping saving invalid profile data for ID {user_id}: {details}")
+                 continue
+             row_data = {
+                'user_id': user_id,
+                'name': details.get('name', f'Unnamed User {user_id}'),
+                'icon_color': details.get('icon_color', random.choice(ACCOUNT_ICON_COLORS))
+             }
+             writer.writerow(row_data)
+
     try:
-        with open(USER_PROFILES_CSV, mode='w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['user_id', 'name', 'icon_color']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for user_id, details in profiles_to_save.items():
-                 if not isinstance(details, dict):
-                     logging.warning(f"Skipping saving invalid profile data for ID {user_id}: {details}")
-                     continue
-                 row_data = {
-                    'user_id': user_id,
-                    'name': details.get('name', f'Unnamed User {user_id}'),
-                    'icon_color': details.get('icon_color', random.choice(ACCOUNT_ICON_COLORS))
-                 }
-                 writer.writerow(row_data)
+        write_file_atomically(USER_PROFILES_CSV, write_profiles)
         logging.info(f"User profiles saved successfully to '{USER_PROFILES_CSV}'.")
     except IOError as e:
         logging.error(f"Could not write to '{USER_PROFILES_CSV}': {e}")
-        messagebox.showerror("CSV Save Error", f"Could not write user profiles to '{USER_PROFILES_CSV}':\n{e}")
+        report_error("CSV Save Error", f"Could not write user profiles to '{USER_PROFILES_CSV}':\n{e}")
     except Exception as e:
         logging.exception(f"An unexpected error occurred while saving user profiles: {e}")
-        messagebox.showerror("CSV Save Error", f"An unexpected error occurred while saving user profiles:\n{e}")
+        report_error("CSV Save Error", f"An unexpected error occurred while saving user profiles:\n{e}")
 
 
 # --- CSV/JSON Handling for Specific User Data ---
@@ -289,9 +576,1508 @@ def get_user_data_file_path(user_id, data_type):
     """Generates the file path for a specific user's data type."""
     ensure_data_dir()
     base_filename = f"{data_type}_{user_id}"
-    extension = ".json" if data_type == "settings" else ".csv"
+    extension = ".json" if data_type in ("settings", *DERIVED_DATA_TYPES) else ".csv"
     return os.path.join(DATA_DIR, f"{base_filename}{extension}")
 
+def get_generation_file_path(user_id, data_type, generation):
+    """Generates the path a data type is written to in a given save generation (e.g. wallets_<id>.g3.csv)."""
+    root, extension = os.path.splitext(get_user_data_file_path(user_id, data_type))
+    return f"{root}.g{generation}{extension}"
+
+def list_user_files(user_id):
+    """Returns every file in DATA_DIR holding data for user_id (base files, generations, journals, snapshots, manifest)."""
+    data_types = "|".join([*USER_DATA_TYPES, *DERIVED_DATA_TYPES] + [f"{data_type}_journal" for data_type in JOURNAL_FIELDS] + ["activity_log_archive", "manifest"])
+    pattern = re.compile(rf"^(?:{data_types})_{re.escape(user_id)}(?:\.[^.]+)*\.(?:csv|json|snap|tmp)$")
+    try:
+        return [os.path.join(DATA_DIR, name) for name in os.listdir(DATA_DIR) if pattern.match(name)]
+    except OSError:
+        return []
+
+def write_file_atomically(file_path, write_contents, mode='w'):
+    """Writes a file via a temp file + fsync + os.replace, so readers see either the old or the new contents."""
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {"newline": '', "encoding": 'utf-8'})) as f:
+            write_contents(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+    try: # Make the rename itself durable
+        dir_fd = os.open(os.path.dirname(file_path) or ".", os.O_RDONLY)
+        try: os.fsync(dir_fd)
+        finally: os.close(dir_fd)
+    except OSError:
+        pass # Not supported on every platform (e.g. Windows)
+
+# --- Save Manifest ---
+# manifest_<id>.json names the file currently holding each data type and the save generation
+# that wrote it. A save writes new generation files, then commits them all at once by replacing
+# the manifest; it also lists the set-aside journals whose rows the committed files already hold.
+user_manifests = {} # user_id -> manifest dict, as last read or committed
+
+def get_manifest_path(user_id):
+    ensure_data_dir()
+    return os.path.join(DATA_DIR, f"manifest_{user_id}.json")
+
+def get_manifest(user_id, reload=False):
+    """Returns the user's manifest, reading it from disk the first time (or when reload=True)."""
+    if reload or user_id not in user_manifests:
+        manifest = _load_json_data(get_manifest_path(user_id), default_value={}) if os.path.exists(get_manifest_path(user_id)) else {}
+        manifest.setdefault("generation", 0)
+        manifest.setdefault("files", {})
+        manifest.setdefault("folded_journals", [])
+        user_manifests[user_id] = manifest
+    return user_manifests[user_id]
+
+def resolve_user_data_file(user_id, data_type):
+    """Returns the committed file for a data type: the manifest's entry, else the pre-manifest file name."""
+    file_name = get_manifest(user_id)["files"].get(data_type)
+    return os.path.join(DATA_DIR, file_name) if file_name else get_user_data_file_path(user_id, data_type)
+
+def commit_manifest(user_id, written_files, folded_journals):
+    """Atomically points the manifest at newly written files. Returns the superseded files, now safe to delete."""
+    old_manifest = get_manifest(user_id)
+    manifest = {
+        "generation": old_manifest["generation"] + 1,
+        "files": dict(old_manifest["files"]),
+        # Still-present journals from earlier commits stay listed until they are gone
+        "folded_journals": [name for name in old_manifest["folded_journals"] if os.path.exists(os.path.join(DATA_DIR, name))],
+    }
+    superseded = []
+    for data_type, file_path in written_files.items():
+        old_path = resolve_user_data_file(user_id, data_type)
+        if old_path != file_path: superseded.append(old_path)
+        manifest["files"][data_type] = os.path.basename(file_path)
+    manifest["folded_journals"] += [os.path.basename(path) for path in folded_journals]
+    write_file_atomically(get_manifest_path(user_id), lambda f: json.dump(manifest, f, indent=4))
+    user_manifests[user_id] = manifest
+    return superseded
+
+def cleanup_user_files(user_id):
+    """Deletes what an interrupted save can leave behind: temp files, uncommitted or superseded generations, folded journals."""
+    manifest = get_manifest(user_id)
+    committed = {os.path.splitext(name)[0] for name in manifest["files"].values()}
+    folded = set(manifest["folded_journals"])
+    data_file = re.compile(rf"^({'|'.join([*USER_DATA_TYPES, *DERIVED_DATA_TYPES])})_{re.escape(user_id)}(\.g\d+)?\.(csv|json|snap)$")
+    leftovers = []
+    for file_path in list_user_files(user_id):
+        name = os.path.basename(file_path)
+        match = data_file.match(name)
+        if name.endswith(".tmp") or name in folded:
+            leftovers.append(file_path)
+        elif match and match.group(1) in manifest["files"] and os.path.splitext(name)[0] not in committed:
+            leftovers.append(file_path)
+        elif match and match.group(2) and match.group(1) not in manifest["files"]:
+            leftovers.append(file_path) # Written by a save whose manifest commit never happened
+    if leftovers:
+        logging.info(f"Removing {len(leftovers)} leftover file(s) from earlier saves for user {user_id}.")
+        remove_files(leftovers)
+
+def remove_files(file_paths):
+    """Deletes files that may or may not exist, logging failures."""
+    for file_path in file_paths:
+        try:
+            if os.path.exists(file_path): os.remove(file_path)
+        except OSError as e:
+            logging.error(f"Could not delete {file_path}: {e}")
+
+# --- Append-Only Journal ---
+def get_journal_file_path(user_id, data_type, sealed_token=None):
+    """Generates the live journal path for a journaled data type, or the path of a journal sealed for compaction."""
+    live_path = get_user_data_file_path(user_id, f"{data_type}_journal")
+    if sealed_token is None: return live_path
+    root, extension = os.path.splitext(live_path)
+    return f"{root}.{sealed_token}{extension}"
+
+def _sealed_journals(user_id, data_type):
+    """Returns sealed journals whose rows no committed save holds yet, oldest first."""
+    folded = set(get_manifest(user_id)["folded_journals"])
+    prefix = os.path.basename(get_journal_file_path(user_id, data_type))[:-len(".csv")] + "."
+    sealed = []
+    for path in list_user_files(user_id):
+        name = os.path.basename(path)
+        token = name[len(prefix):-len(".csv")] if name.startswith(prefix) and name.endswith(".csv") else ""
+        if token.isdigit() and name not in folded: sealed.append((int(token), path))
+    return [path for _, path in sorted(sealed)]
+
+def rotate_journal(user_id, data_type):
+    """
+    Seals the live journal before a compaction so rows recorded while it runs start a fresh one.
+    Returns every sealed journal the compaction folds in, including ones left by failed compactions.
+    """
+    live_path = get_journal_file_path(user_id, data_type)
+    journal_row_counts[data_type] = 0
+    if os.path.exists(live_path):
+        try:
+            os.replace(live_path, get_journal_file_path(user_id, data_type, sealed_token=time.time_ns()))
+        except OSError as e:
+            logging.error(f"Could not seal journal {live_path}: {e}")
+            return None # Rows would be folded in twice; skip this compaction
+    return _sealed_journals(user_id, data_type)
+
+def append_to_journal(data_type, rows):
+    """Appends rows to the current user's journal for data_type and fsyncs them to disk."""
+    user_id = app_data.get("current_user_id")
+    fields = JOURNAL_FIELDS.get(data_type)
+    if not user_id or not fields or not rows:
+        return False
+
+    store = get_user_store(user_id)
+    if store is not None:
+        try:
+            return store.append(data_type, rows)
+        except sqlite3.Error as e:
+            logging.error(f"Could not append {data_type} to {store.db_path}: {e}")
+            compaction_requested.add(data_type) # Rewrite the table from memory on the next save
+            return False
+
+    file_path = get_journal_file_path(user_id, data_type)
+    try:
+        write_header = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        with open(file_path, mode='a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fields, extrasaction='ignore', restval='')
+            if write_header: writer.writeheader()
+            writer.writerows(money_rows(rows, USER_DATA_TYPES[data_type].get("money_fields")))
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        journal_row_counts[data_type] += len(rows)
+        return True
+    except (IOError, OSError, csv.Error) as e:
+        logging.error(f"Could not append to journal {file_path}: {e}")
+        # Force a full rewrite on the next save so the rows are not lost
+        journal_row_counts[data_type] = JOURNAL_COMPACTION_THRESHOLD
+        return False
+
+def _repair_journal_tail(file_path):
+    """Truncates a torn final row left by a crash mid-append."""
+    try:
+        with open(file_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0: return
+            f.seek(size - 1)
+            if f.read(1) == b"\n": return
+            # Drop everything after the last complete line
+            f.seek(0)
+            content = f.read()
+            last_newline = content.rfind(b"\n")
+            f.truncate(last_newline + 1 if last_newline >= 0 else 0)
+            logging.warning(f"Discarded incomplete trailing row in journal {file_path}.")
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        logging.error(f"Could not check journal tail for {file_path}: {e}")
+
+def _seal_outdated_journal(user_id, data_type):
+    """Seals a live journal written with an older field list, so new rows never land under its header."""
+    live_path = get_journal_file_path(user_id, data_type)
+    try:
+        with open(live_path, newline='', encoding='utf-8') as csvfile:
+            header = next(csv.reader(csvfile), None)
+        if header and header != JOURNAL_FIELDS[data_type]:
+            os.replace(live_path, get_journal_file_path(user_id, data_type, sealed_token=time.time_ns()))
+            logging.info(f"Sealed journal {live_path} written with an older field list.")
+    except FileNotFoundError:
+        pass
+    except (OSError, csv.Error) as e:
+        logging.error(f"Could not check journal header of {live_path}: {e}")
+
+def _load_journal_rows(user_id, data_type, money_fields=None):
+    """Loads rows appended to a journal since the last committed compaction (including sealed, unfolded journals)."""
+    _seal_outdated_journal(user_id, data_type)
+    rows = []
+    for file_path in _sealed_journals(user_id, data_type) + [get_journal_file_path(user_id, data_type)]:
+        if not os.path.exists(file_path): continue
+        _repair_journal_tail(file_path)
+        rows.extend(_load_csv_data(file_path, JOURNAL_FIELDS[data_type], money_fields=money_fields))
+    return rows
+
+# --- Activity Log Archive ---
+# Entries evicted from the in-memory activity log are appended to activity_log_archive_<id>.csv
+# (one entry per line) or, with the sqlite backend, the activity_archive table. Nothing is ever
+# rewritten; the Activity Log page reads it backwards a page at a time.
+ARCHIVE_READ_BLOCK = 64 * 1024
+
+def get_activity_archive_path(user_id):
+    return get_user_data_file_path(user_id, "activity_log_archive")
+
+def archive_activity_entries(user_id, entries):
+    """Appends evicted activity log entries to the user's archive. Returns True on success."""
+    store = get_user_store(user_id)
+    if store is not None:
+        try:
+            store.archive_activity(entries)
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Could not archive activity log entries in {store.db_path}: {e}")
+            return False
+
+    file_path = get_activity_archive_path(user_id)
+    try:
+        write_header = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        with open(file_path, mode='a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=ACTIVITY_LOG_FIELDS, extrasaction='ignore', restval='', lineterminator="\n")
+            if write_header: writer.writeheader()
+            # Line breaks inside an action would split its row when the archive is read backwards
+            writer.writerows({"timestamp": entry.get("timestamp", ''), "action": " ".join(str(entry.get("action", '')).splitlines())}
+                             for entry in entries if isinstance(entry, dict))
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        return True
+    except (IOError, OSError, csv.Error) as e:
+        logging.error(f"Could not append to activity archive {file_path}: {e}")
+        return False
+
+def activity_archive_end(user_id):
+    """Returns a cursor just past the newest archived entry, for paging from 'now' backwards."""
+    store = get_user_store(user_id)
+    if store is not None: return store.activity_archive_end()
+    file_path = get_activity_archive_path(user_id)
+    return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+def read_activity_archive(user_id, before, limit=ACTIVITY_ARCHIVE_PAGE_SIZE):
+    """
+    Returns (entries, cursor): up to `limit` archived entries older than the cursor `before`,
+    newest first, and the cursor for the next page (None once the start of the archive is reached).
+    """
+    store = get_user_store(user_id)
+    if store is not None: return store.activity_archive_page(before, limit)
+    file_path = get_activity_archive_path(user_id)
+    if before <= 0 or not os.path.exists(file_path): return [], None
+    with open(file_path, 'rb') as f:
+        position, buffer = before, b""
+        while position > 0 and buffer.count(b"\n") <= limit:
+            step = min(ARCHIVE_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+    lines = buffer.split(b"\n")
+    if lines[-1] == b"": lines.pop() # `before` is always a line boundary
+    cursor = position + len(lines.pop(0)) + 1 if lines else position # A partial line, or the CSV header
+    older = lines[:-limit] if len(lines) > limit else []
+    cursor += sum(len(line) + 1 for line in older)
+    page = lines[len(older):]
+    entries = [dict(zip(ACTIVITY_LOG_FIELDS, values)) for values in csv.reader(line.decode('utf-8') for line in page)]
+    entries.reverse()
+    return entries, (cursor if position > 0 or older else None)
+
+# --- Binary Columnar Snapshot ---
+# Layout: magic | header length | JSON header (row count, source CSV stat, string dictionary)
+# | padding to 8 bytes | int64 amounts (centavos) | int64 timestamps | one uint32 code column per string field.
+# Arrays use the writer's native byte order, which the header records.
+SNAPSHOT_STRING_FIELDS = [field for field in TRANSACTION_FIELDS if field != "amount"]
+
+def get_snapshot_file_path(user_id, data_type):
+    """Generates the binary snapshot path that mirrors a user's committed CSV file."""
+    return os.path.splitext(resolve_user_data_file(user_id, data_type))[0] + ".snap"
+
+def _snapshot_source_stat(csv_path):
+    """Returns the (size, mtime_ns) identifying the CSV version a snapshot was built from."""
+    stat = os.stat(csv_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def write_transaction_snapshot(user_id, transactions):
+    """Writes the columnar snapshot for the transactions CSV that was just saved. Returns True on success."""
+    csv_path = resolve_user_data_file(user_id, "transactions")
+    snap_path = get_snapshot_file_path(user_id, "transactions")
+    rows = [tx for tx in transactions if isinstance(tx, dict)]
+    try:
+        amounts = array.array('q', (tx.get("amount") if isinstance(tx.get("amount"), int) else 0 for tx in rows))
+        timestamps = array.array('q', (tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx) for tx in rows))
+
+        string_codes = {} # Dictionary encoding shared by every string column
+        code_columns = []
+        for field in SNAPSHOT_STRING_FIELDS:
+            codes = array.array('I')
+            for tx in rows:
+                val = tx.get(field)
+                val = '' if val is None else str(val)
+                codes.append(string_codes.setdefault(val, len(string_codes)))
+            code_columns.append(codes)
+
+        header = json.dumps({
+            "rows": len(rows), "byteorder": sys.byteorder, "source": _snapshot_source_stat(csv_path),
+            "fields": SNAPSHOT_STRING_FIELDS, "strings": list(string_codes),
+        }).encode('utf-8')
+        prefix_len = SNAPSHOT_HEADER.size + len(header)
+        padding = b"\0" * (-prefix_len % 8)
+
+        def write_columns(f):
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(header) + len(padding)))
+            f.write(header + padding)
+            amounts.tofile(f); timestamps.tofile(f)
+            for codes in code_columns: codes.tofile(f)
+        write_file_atomically(snap_path, write_columns, mode='wb')
+        logging.info(f"Wrote binary snapshot of {len(rows)} transactions to {snap_path}")
+        return True
+    except (OSError, struct.error, OverflowError) as e:
+        logging.error(f"Could not write snapshot {snap_path}: {e}")
+        return False
+
+def _read_snapshot_column(view, offset, count, typecode):
+    """Copies a typed column out of the mapped file. Returns (values, next offset)."""
+    end = offset + count * array.array(typecode).itemsize
+    with view[offset:end] as chunk, chunk.cast(typecode) as column:
+        return column.tolist(), end
+
+def load_transaction_snapshot(user_id):
+    """Returns the transactions stored in the user's snapshot, or None if it is missing or stale."""
+    csv_path = resolve_user_data_file(user_id, "transactions")
+    snap_path = get_snapshot_file_path(user_id, "transactions")
+    if not USE_BINARY_SNAPSHOTS or not os.path.exists(snap_path) or not os.path.exists(csv_path): return None
+    try:
+        if os.path.getmtime(snap_path) < os.path.getmtime(csv_path): return None
+        with open(snap_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            magic, header_len = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC: return None
+            offset = SNAPSHOT_HEADER.size
+            header = json.loads(bytes(view[offset:offset + header_len]).rstrip(b"\0"))
+            if header["source"] != _snapshot_source_stat(csv_path) or header["byteorder"] != sys.byteorder \
+                    or header["fields"] != SNAPSHOT_STRING_FIELDS:
+                logging.info(f"Snapshot {snap_path} does not match the current CSV. Ignoring it.")
+                return None
+            count = header["rows"]
+            offset += header_len
+            if len(view) != offset + count * (8 + 8 + 4 * len(SNAPSHOT_STRING_FIELDS)):
+                logging.warning(f"Snapshot {snap_path} is truncated. Ignoring it.")
+                return None
+
+            amounts, offset = _read_snapshot_column(view, offset, count, 'q')
+            timestamps, offset = _read_snapshot_column(view, offset, count, 'q')
+            strings = header["strings"]
+            columns = []
+            for _ in SNAPSHOT_STRING_FIELDS:
+                codes, offset = _read_snapshot_column(view, offset, count, 'I')
+                columns.append(list(map(strings.__getitem__, codes)))
+
+        keys = SNAPSHOT_STRING_FIELDS + ["amount", "_ts"]
+        transactions = [dict(zip(keys, values)) for values in zip(*columns, amounts, timestamps)]
+        logging.info(f"Loaded {len(transactions)} transactions from binary snapshot {snap_path}")
+        return transactions
+    except (OSError, ValueError, KeyError, IndexError, struct.error) as e:
+        logging.warning(f"Could not read snapshot {snap_path}: {e}. Falling back to CSV.")
+        return None
+
+def snapshot_is_current(user_id):
+    """Checks whether the user's transactions snapshot matches their CSV file."""
+    csv_path = resolve_user_data_file(user_id, "transactions")
+    snap_path = get_snapshot_file_path(user_id, "transactions")
+    try:
+        with open(snap_path, 'rb') as f:
+            magic, header_len = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+            header = json.loads(f.read(header_len).rstrip(b"\0"))
+        return magic == SNAPSHOT_MAGIC and header.get("source") == _snapshot_source_stat(csv_path)
+    except (OSError, ValueError, struct.error):
+        return False
+
+# --- SQLite Storage Backend ---
+class SQLiteStore:
+    """Per-user SQLite database holding the same datasets load_user_data/save_user_data keep in app_data."""
+    ENTITY_TABLES = {
+        "wallets": ("wallet_id", ['wallet_id', 'name', 'balance', 'opening_balance']),
+        "budgets": ("budget_id", ['budget_id', 'name', 'allocated', 'cycle']),
+        "goals": ("goal_id", ['goal_id', 'name', 'target', 'saved', 'due_date']),
+    }
+    INDEXED_COLUMNS = ("wallet", "category", "linked_budget", "linked_goal")
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS wallets (wallet_id TEXT PRIMARY KEY, name TEXT, balance INTEGER, opening_balance INTEGER);
+        CREATE TABLE IF NOT EXISTS budgets (budget_id TEXT PRIMARY KEY, name TEXT, allocated INTEGER, cycle TEXT);
+        CREATE TABLE IF NOT EXISTS goals (goal_id TEXT PRIMARY KEY, name TEXT, target INTEGER, saved INTEGER, due_date TEXT);
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, transaction_id TEXT, date TEXT, time TEXT, timestamp TEXT, title TEXT,
+            wallet TEXT, amount INTEGER, category TEXT, type TEXT, from_account TEXT, to_account TEXT,
+            linked_budget TEXT, linked_goal TEXT);
+        CREATE INDEX IF NOT EXISTS idx_transactions_ts ON transactions (ts);
+        CREATE INDEX IF NOT EXISTS idx_transactions_transaction_id ON transactions (transaction_id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_wallet ON transactions (wallet);
+        CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category);
+        CREATE INDEX IF NOT EXISTS idx_transactions_linked_budget ON transactions (linked_budget);
+        CREATE INDEX IF NOT EXISTS idx_transactions_linked_goal ON transactions (linked_goal);
+        CREATE TABLE IF NOT EXISTS activity_log (id INTEGER PRIMARY KEY, timestamp TEXT, action TEXT);
+        CREATE TABLE IF NOT EXISTS activity_archive (id INTEGER PRIMARY KEY, timestamp TEXT, action TEXT);
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, user_id):
+        ensure_data_dir()
+        self.db_path = get_store_file_path(user_id)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.RLock() # The Tk thread and the I/O worker share this connection
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL") # WAL keeps commits atomic; NORMAL skips the per-commit fsync of the db file
+        self.conn.executescript(self.SCHEMA)
+        logging.info(f"Opened SQLite store {self.db_path}")
+
+    def close(self):
+        self.conn.close()
+
+    def is_migrated(self):
+        """Checks whether the user's flat files were already imported."""
+        return self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_at'").fetchone() is not None
+
+    def migrate_from_app_data(self):
+        """Imports the datasets just loaded from the CSV/JSON files, then marks the store as migrated."""
+        with self.lock:
+            if not self.replace_many({data_key: app_data.get(data_key) for data_key in USER_DATA_TYPES}): return False
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_at', ?)", (datetime.datetime.now().isoformat(),))
+            logging.info(f"Migrated flat-file data into {self.db_path}")
+            return True
+
+    def load(self, data_key):
+        """Returns a dataset shaped like the flat-file loaders produce it."""
+        with self.lock:
+            if data_key in self.ENTITY_TABLES:
+                fields = self.ENTITY_TABLES[data_key][1]
+                cursor = self.conn.execute(f"SELECT {', '.join(fields)} FROM {data_key}")
+                return {row[0]: dict(zip(fields, row)) for row in cursor}
+            if data_key == "transactions":
+                return self.transactions_between()
+            if data_key == "activity_log":
+                cursor = self.conn.execute("SELECT timestamp, action FROM (SELECT * FROM activity_log ORDER BY id DESC LIMIT ?) ORDER BY id", (MAX_ACTIVITY_LOG_SIZE,))
+                return [dict(zip(ACTIVITY_LOG_FIELDS, row)) for row in cursor]
+            if data_key == "settings":
+                return {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM settings")}
+            raise KeyError(data_key)
+
+    def transactions_between(self, start_ts=None, end_ts=None, **filters):
+        """Returns transactions with start_ts <= '_ts' < end_ts, oldest first, optionally filtered on indexed columns."""
+        with self.lock:
+            clauses, params = [], []
+            if start_ts is not None: clauses.append("ts >= ?"); params.append(start_ts)
+            if end_ts is not None: clauses.append("ts < ?"); params.append(end_ts)
+            for column, value in filters.items():
+                if column not in self.INDEXED_COLUMNS: raise ValueError(f"Cannot filter transactions on '{column}'")
+                clauses.append(f"{column} = ?"); params.append(value)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            keys = TRANSACTION_FIELDS + ["_ts"]
+            cursor = self.conn.execute(f"SELECT {', '.join(TRANSACTION_FIELDS)}, ts FROM transactions{where} ORDER BY ts, id", params)
+            return [{key: ('' if value is None else value) for key, value in zip(keys, row)} for row in cursor]
+
+    def transactions_after(self, row_id):
+        """Returns transactions inserted after row_id, in insertion order."""
+        with self.lock:
+            keys = TRANSACTION_FIELDS + ["_ts"]
+            cursor = self.conn.execute(f"SELECT {', '.join(TRANSACTION_FIELDS)}, ts FROM transactions WHERE id > ? ORDER BY id", (row_id,))
+            return [{key: ('' if value is None else value) for key, value in zip(keys, row)} for row in cursor]
+
+    def transactions_state(self):
+        """
+        Returns (epoch, last row id). The epoch changes whenever transaction rows are deleted
+        or rewritten, so a checkpoint taken at some state stays valid while rows are only added.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'transactions_epoch'").fetchone()
+            last_id = self.conn.execute("SELECT coalesce(max(id), 0) FROM transactions").fetchone()[0]
+            return (int(row[0]) if row else 0), last_id
+
+    def _bump_transactions_epoch(self):
+        self.conn.execute("INSERT INTO meta (key, value) VALUES ('transactions_epoch', 1) ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+    def save_checkpoint(self, aggregates, state=None):
+        """Saves a LedgerIndex.checkpoint() covering every transaction up to state (default: the current one)."""
+        with self.lock:
+            try:
+                epoch, last_id = state if state is not None else self.transactions_state()
+                checkpoint = dict(aggregates, epoch=epoch, last_id=last_id, units=MONEY_UNITS)
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('checkpoint', ?)", (json.dumps(checkpoint),))
+                return True
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logging.error(f"Error saving the ledger checkpoint to {self.db_path}: {e}")
+                return False
+
+    def load_checkpoint(self):
+        """Returns the saved checkpoint if no transaction was deleted or rewritten since, else None."""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'checkpoint'").fetchone()
+            if row is None: return None
+            try:
+                checkpoint = json.loads(row[0])
+            except ValueError as e:
+                logging.warning(f"Could not read the saved ledger checkpoint: {e}")
+                return None
+            if checkpoint.get("epoch") != self.transactions_state()[0] or checkpoint.get("units") != MONEY_UNITS:
+                logging.info("Saved ledger checkpoint predates a rewrite of the transactions table. Rebuilding it.")
+                return None
+            return checkpoint
+
+    def append(self, data_type, rows):
+        """Durably inserts rows for a journaled data type (transactions, activity_log). A transaction replaces any row with its ID."""
+        with self.lock:
+            with self.conn:
+                if data_type == "transactions":
+                    cursor = self.conn.executemany("DELETE FROM transactions WHERE transaction_id = ?", [(row.get("transaction_id"),) for row in rows if row.get("transaction_id")])
+                    if cursor.rowcount > 0: self._bump_transactions_epoch() # An edit replaced a row a checkpoint may cover
+                self._insert_rows(data_type, rows)
+            return True
+
+    def delete_transactions(self, tx_ids):
+        """Durably deletes transactions by ID."""
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("DELETE FROM transactions WHERE transaction_id = ?", [(tx_id,) for tx_id in tx_ids])
+                self._bump_transactions_epoch()
+
+    def archive_activity(self, entries):
+        """Appends evicted activity log entries to the activity_archive table."""
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("INSERT INTO activity_archive (timestamp, action) VALUES (?, ?)",
+                                      [(entry.get("timestamp", ''), entry.get("action", '')) for entry in entries if isinstance(entry, dict)])
+
+    def activity_archive_end(self):
+        with self.lock:
+            return self.conn.execute("SELECT coalesce(max(id), 0) + 1 FROM activity_archive").fetchone()[0]
+
+    def activity_archive_page(self, before, limit):
+        """Archived entries with id < before, newest first, and the cursor for the next page."""
+        with self.lock:
+            rows = self.conn.execute("SELECT id, timestamp, action FROM activity_archive WHERE id < ? ORDER BY id DESC LIMIT ?", (before, limit)).fetchall()
+        entries = [dict(zip(ACTIVITY_LOG_FIELDS, row[1:])) for row in rows]
+        return entries, (rows[-1][0] if len(rows) == limit else None)
+
+    def replace(self, data_key, data):
+        """Rewrites a whole dataset in one transaction. Returns True on success."""
+        return self.replace_many({data_key: data})
+
+    def replace_many(self, datasets):
+        """Rewrites several datasets in a single transaction, so either all of them or none are saved."""
+        with self.lock:
+            try:
+                with self.conn:
+                    for data_key, data in datasets.items():
+                        if data_key == "settings":
+                            self.conn.execute("DELETE FROM settings")
+                            self.conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", [(key, json.dumps(value)) for key, value in (data or {}).items()])
+                            continue
+                        self.conn.execute(f"DELETE FROM {data_key}")
+                        if data_key in self.ENTITY_TABLES:
+                            fields = self.ENTITY_TABLES[data_key][1]
+                            placeholders = ", ".join("?" for _ in fields)
+                            self.conn.executemany(f"INSERT INTO {data_key} ({', '.join(fields)}) VALUES ({placeholders})",
+                                                  [[item.get(field) for field in fields] for item in (data or {}).values() if isinstance(item, dict)])
+                        else:
+                            self._insert_rows(data_key, data or [])
+                            if data_key == "transactions": self._bump_transactions_epoch()
+                return True
+            except (sqlite3.Error, TypeError, ValueError, KeyError) as e:
+                logging.error(f"Error saving {', '.join(datasets)} to {self.db_path}: {e}")
+                return False
+
+    def _insert_rows(self, data_type, rows):
+        rows = [row for row in rows if isinstance(row, dict)]
+        if data_type == "transactions":
+            placeholders = ", ".join("?" for _ in range(len(TRANSACTION_FIELDS) + 1))
+            self.conn.executemany(f"INSERT INTO transactions (ts, {', '.join(TRANSACTION_FIELDS)}) VALUES ({placeholders})",
+                                  [[row["_ts"] if "_ts" in row else parse_transaction_timestamp(row)] + [row.get(field, '') for field in TRANSACTION_FIELDS] for row in rows])
+        elif data_type == "activity_log":
+            self.conn.executemany("INSERT INTO activity_log (timestamp, action) VALUES (?, ?)", [(row.get("timestamp", ''), row.get("action", '')) for row in rows])
+        else:
+            raise KeyError(data_type)
+
+user_stores = {} # user_id -> open SQLiteStore
+
+def get_store_file_path(user_id):
+    """Generates the SQLite database path for a user."""
+    return os.path.join(DATA_DIR, f"expensewise_{user_id}.db")
+
+def get_user_store(user_id):
+    """Returns the user's SQLiteStore when the sqlite backend is selected, else None (flat files)."""
+    if STORAGE_BACKEND != "sqlite" or not user_id: return None
+    if user_id not in user_stores:
+        user_stores[user_id] = SQLiteStore(user_id)
+    return user_stores[user_id]
+
+def close_user_store(user_id):
+    """Closes a user's database connection if one is open."""
+    store = user_stores.pop(user_id, None)
+    if store is not None: store.close()
+
+# --- Spending Rollups ---
+SECONDS_PER_DAY = 86400
+UNCATEGORIZED = "Uncategorized"
+
+def classify_spending(tx):
+    """Returns ('income' | 'expense', amount in centavos) for a transaction counted in spending totals, else (None, 0)."""
+    amount = tx.get('amount')
+    if not isinstance(amount, int): return None, 0
+    tx_type = (tx.get('type') or '').lower()
+    if tx_type.startswith("transfer"): return None, 0
+    if (tx_type == "income") or (tx_type != "expense" and amount > 0): return "income", amount
+    if (tx_type == "expense") or (tx_type != "income" and amount < 0): return "expense", abs(amount)
+    return None, 0
+
+def spending_category(category):
+    """Returns the key an expense's category is summed under: a missing or empty category counts as 'Uncategorized'."""
+    return category or UNCATEGORIZED
+
+class SpendingRollups:
+    """
+    Per-day and per-month income/expense sums in centavos (expenses also by category), kept up to date as
+    transactions are added or removed. Spending summaries read a few hundred buckets instead of
+    the whole ledger; a date range uses whole months plus the days of its partial months.
+    """
+
+    def __init__(self):
+        self.days = {}   # day number (days since 1970) -> bucket
+        self.months = {} # "YYYY-MM" -> bucket
+        self._month_of_day = {}
+
+    @staticmethod
+    def _new_bucket():
+        return {"income": 0, "expense": 0, "categories": {}}
+
+    def month_key(self, day):
+        month = self._month_of_day.get(day)
+        if month is None:
+            month = self._month_of_day[day] = (TIMESTAMP_EPOCH + datetime.timedelta(days=day)).strftime("%Y-%m")
+        return month
+
+    def apply(self, tx, sign):
+        """Adds (sign=1) or backs out (sign=-1) one transaction."""
+        kind, amount = classify_spending(tx)
+        if kind is None: return
+        day = tx["_ts"] // SECONDS_PER_DAY if "_ts" in tx else parse_transaction_timestamp(tx) // SECONDS_PER_DAY
+        for buckets, key in ((self.days, day), (self.months, self.month_key(day))):
+            bucket = buckets.get(key)
+            if bucket is None: bucket = buckets[key] = self._new_bucket()
+            bucket[kind] += sign * amount
+            if kind == "expense":
+                category = spending_category(tx.get('category'))
+                bucket["categories"][category] = bucket["categories"].get(category, 0) + sign * amount
+
+    def summary(self, start_date=None, end_date=None):
+        """Returns (total_income, total_expense, expense_by_category) for start_date..end_date (inclusive datetime.date bounds)."""
+        first_day = (start_date - TIMESTAMP_EPOCH.date()).days if start_date else None
+        last_day = (end_date - TIMESTAMP_EPOCH.date()).days if end_date else None
+        start_month = start_date.strftime("%Y-%m") if start_date else None
+        end_month = end_date.strftime("%Y-%m") if end_date else None
+
+        buckets = []
+        for month, bucket in self.months.items():
+            if (start_month and month < start_month) or (end_month and month > end_month): continue
+            if month == start_month or month == end_month: continue # Partial month: added day by day below
+            buckets.append(bucket)
+        edge_months = {month for month in (start_month, end_month) if month}
+        if edge_months:
+            buckets += [bucket for day, bucket in self.days.items() if self.month_key(day) in edge_months
+                        and (first_day is None or day >= first_day) and (last_day is None or day <= last_day)]
+
+        total_income, total_expense, expense_by_category = 0, 0, {}
+        for bucket in buckets:
+            total_income += bucket["income"]; total_expense += bucket["expense"]
+            for category, amount in bucket["categories"].items():
+                expense_by_category[category] = expense_by_category.get(category, 0) + amount
+        return total_income, total_expense, {category: amount for category, amount in expense_by_category.items() if amount}
+
+    def to_dict(self):
+        """Returns a JSON-ready copy of the buckets."""
+        copy_bucket = lambda bucket: dict(bucket, categories=dict(bucket["categories"]))
+        return {"days": {str(day): copy_bucket(bucket) for day, bucket in self.days.items()},
+                "months": {month: copy_bucket(bucket) for month, bucket in self.months.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        rollups = cls()
+        rollups.days = {int(day): bucket for day, bucket in data["days"].items()}
+        rollups.months = dict(data["months"])
+        return rollups
+
+# --- Budget Cycles ---
+def to_timestamp(moment):
+    """Converts a naive datetime to the seconds-since-1970 scale used for '_ts'."""
+    return int((moment - TIMESTAMP_EPOCH).total_seconds())
+
+def cycle_period_start(cycle, moment):
+    """Returns the start of the budget period containing moment, or None for 'Once' budgets (which never reset)."""
+    day = datetime.datetime(moment.year, moment.month, moment.day)
+    if cycle == "Daily": return day
+    if cycle == "Weekly": return day - datetime.timedelta(days=day.weekday()) # Weeks start on Monday
+    if cycle == "Monthly": return day.replace(day=1)
+    if cycle == "Yearly": return day.replace(month=1, day=1)
+    return None
+
+def shift_period(cycle, period_start, periods):
+    """Returns the start of the period 'periods' cycles after (or, if negative, before) period_start."""
+    if cycle == "Daily": return period_start + datetime.timedelta(days=periods)
+    if cycle == "Weekly": return period_start + datetime.timedelta(weeks=periods)
+    if cycle == "Monthly":
+        year, month = divmod(period_start.month - 1 + periods, 12)
+        return period_start.replace(year=period_start.year + year, month=month + 1)
+    if cycle == "Yearly": return period_start.replace(year=period_start.year + periods)
+    raise ValueError(f"Budget cycle '{cycle}' has no periods")
+
+def format_budget_period(cycle, period_start):
+    """Returns a short label for a budget period."""
+    if period_start is None: return "All time"
+    if cycle == "Weekly": return f"Week of {period_start.strftime('%Y-%m-%d')}"
+    return period_start.strftime({"Daily": "%Y-%m-%d", "Monthly": "%B %Y", "Yearly": "%Y"}.get(cycle, "%Y-%m-%d"))
+
+class PrefixSumSeries:
+    """Amounts sorted by timestamp with running totals, so the sum over any time window takes two binary searches."""
+
+    def __init__(self):
+        self.timestamps = []
+        self.amounts = []
+        self.cumulative = [0] # cumulative[i] = sum of amounts[:i]
+
+    def add(self, ts, amount):
+        if not self.timestamps or self.timestamps[-1] <= ts: # Ledger order: O(1)
+            self.timestamps.append(ts); self.amounts.append(amount)
+            self.cumulative.append(self.cumulative[-1] + amount)
+            return
+        i = bisect.bisect_right(self.timestamps, ts)
+        self.timestamps.insert(i, ts); self.amounts.insert(i, amount)
+        self._refold(i)
+
+    def remove(self, ts, amount):
+        lo, hi = bisect.bisect_left(self.timestamps, ts), bisect.bisect_right(self.timestamps, ts)
+        for i in range(hi - 1, lo - 1, -1):
+            if self.amounts[i] == amount:
+                del self.timestamps[i]; del self.amounts[i]
+                self._refold(i)
+                return
+
+    def merge(self, other):
+        """Folds another series' entries into this one with a single sort and prefix-sum pass."""
+        entries = sorted(zip(self.timestamps + other.timestamps, self.amounts + other.amounts), key=operator.itemgetter(0))
+        self.timestamps = [ts for ts, _ in entries]
+        self.amounts = [amount for _, amount in entries]
+        self._refold(0)
+        return self
+
+    def total_between(self, start_ts=None, end_ts=None):
+        """Returns the sum of amounts with start_ts <= ts < end_ts (either bound may be None)."""
+        lo = 0 if start_ts is None else bisect.bisect_left(self.timestamps, start_ts)
+        hi = len(self.timestamps) if end_ts is None else bisect.bisect_left(self.timestamps, end_ts)
+        return self.cumulative[hi] - self.cumulative[lo] if hi > lo else 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _refold(self, start):
+        del self.cumulative[start + 1:]
+        total = self.cumulative[start]
+        for amount in self.amounts[start:]:
+            total += amount
+            self.cumulative.append(total)
+
+# --- Vectorized Ledger Analytics ---
+class LedgerArrays:
+    """
+    The ledger as typed NumPy columns: amounts (int64 centavos, with a 'valid' mask for rows
+    without one), '_ts' seconds (int64) and dictionary-encoded codes (int32) for the categorical
+    fields. Offers the group-by / sum operations LedgerIndex.rebuild() and reconcile_wallets()
+    are built from. LedgerIndex.analytics() keeps one cached, fed through 'pending', until rows
+    are removed or renamed. Group sums accumulate in float64, which is exact for integer
+    centavos up to 2**53 (about ₱90 trillion). Requires numpy.
+    """
+    CATEGORICAL_FIELDS = ("wallet", "from_account", "to_account", "category", "type", "linked_budget", "linked_goal")
+    TYPE_KINDS = {"income": 1, "expense": 2} # Any 'transfer...' type is 3, everything else 0
+
+    def __init__(self, transactions=()):
+        self.names = []   # code -> string, shared by every categorical column
+        self.codes = {}   # string -> code
+        self.amounts = np.empty(0, dtype=np.int64)
+        self.valid = np.empty(0, dtype=np.bool_)
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.columns = {field: np.empty(0, dtype=np.int32) for field in self.CATEGORICAL_FIELDS}
+        self.pending = [] # Rows recorded since the arrays were last synced
+        self.extend(transactions)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def code(self, name):
+        """Returns the code for a value, or -1 if no row uses it."""
+        return self.codes.get(name, -1)
+
+    def _encode(self, values):
+        """Returns an int32 code array for raw field values (None and non-strings share their string's code)."""
+        codes = self.codes
+        for value in set(values).difference(codes): # Only new distinct values need work
+            name = '' if value is None else str(value)
+            if name not in codes:
+                codes[name] = len(self.names)
+                self.names.append(name)
+            codes[value] = codes[name]
+        return np.fromiter(map(codes.__getitem__, values), dtype=np.int32, count=len(values))
+
+    def extend(self, transactions):
+        """Appends rows (any order: nothing here depends on the arrays being time-sorted)."""
+        rows = [tx for tx in transactions if isinstance(tx, dict)]
+        if not rows: return
+        raw_amounts = [tx.get("amount") for tx in rows]
+        valid = np.fromiter((isinstance(amount, int) for amount in raw_amounts), dtype=np.bool_, count=len(rows))
+        amounts = np.fromiter((amount if isinstance(amount, int) else 0 for amount in raw_amounts), dtype=np.int64, count=len(rows))
+        timestamps = np.fromiter((tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx) for tx in rows), dtype=np.int64, count=len(rows))
+        self.amounts = np.concatenate((self.amounts, amounts))
+        self.valid = np.concatenate((self.valid, valid))
+        self.timestamps = np.concatenate((self.timestamps, timestamps))
+        for field in self.CATEGORICAL_FIELDS:
+            codes = self._encode([tx.get(field) for tx in rows])
+            self.columns[field] = np.concatenate((self.columns[field], codes))
+
+    def sync(self):
+        """Folds rows queued in pending into the arrays."""
+        if self.pending:
+            rows, self.pending = self.pending, []
+            self.extend(rows)
+        return self
+
+    def mask(self):
+        """Returns a boolean mask of the rows that have an amount."""
+        return self.valid.copy()
+
+    def type_kinds(self):
+        """Returns per-row kind codes: 1 income, 2 expense, 3 transfer, 0 other (case-insensitive type)."""
+        kinds = np.array([3 if name.lower().startswith("transfer") else self.TYPE_KINDS.get(name.lower(), 0) for name in self.names] or [0], dtype=np.int8)
+        return kinds[self.columns["type"]]
+
+    def spending_masks(self, selected=None):
+        """Returns (income_mask, expense_mask) classified like classify_spending()."""
+        if selected is None: selected = self.mask()
+        kinds = self.type_kinds()
+        income = selected & ((kinds == 1) | ((kinds == 0) & (self.amounts > 0)))
+        expense = selected & ~income & ((kinds == 2) | ((kinds == 0) & (self.amounts < 0)))
+        return income, expense
+
+    # Aggregations
+    @staticmethod
+    def _bincount_sum(codes, values, minlength=0):
+        """Sums integer values per code (np.bincount accumulates in float64) and returns them as int64."""
+        return np.rint(np.bincount(codes, weights=values, minlength=minlength)).astype(np.int64)
+
+    def group_sum(self, field, selected=None, values=None, skip_empty=True):
+        """Returns {name: sum of values (default: amounts)} over selected rows, grouped by a categorical field."""
+        if selected is None: selected = self.mask()
+        if values is None: values = self.amounts
+        codes = self.columns[field][selected]
+        sums = self._bincount_sum(codes, values[selected], len(self.names))
+        present = np.bincount(codes, minlength=len(self.names)) > 0
+        empty = self.code('') if skip_empty else -1
+        return {self.names[code]: int(sums[code]) for code in np.flatnonzero(present) if code != empty}
+
+    def group_count(self, field, selected=None):
+        """Returns {name: row count} over selected rows (default: all), grouped by a categorical field. Skips ''."""
+        codes = self.columns[field] if selected is None else self.columns[field][selected]
+        counts = np.bincount(codes, minlength=len(self.names))
+        empty = self.code('')
+        return {self.names[code]: int(counts[code]) for code in np.flatnonzero(counts) if code != empty}
+
+    def wallet_reference_counts(self):
+        """Counts rows per wallet name across wallet/from_account/to_account, once per row and name."""
+        wallet, source, target = (self.columns[field] for field in REFERENCE_FIELDS["wallets"])
+        counts = np.bincount(wallet, minlength=len(self.names))
+        counts += np.bincount(source[source != wallet], minlength=len(self.names))
+        counts += np.bincount(target[(target != wallet) & (target != source)], minlength=len(self.names))
+        empty = self.code('')
+        return {self.names[code]: int(counts[code]) for code in np.flatnonzero(counts) if code != empty}
+
+    def daily_rollups(self, rollups):
+        """Fills a SpendingRollups from the arrays in one pass per group-by."""
+        income, expense = self.spending_masks()
+        days = self.timestamps // SECONDS_PER_DAY
+        magnitudes = np.abs(self.amounts)
+        def day_sums(selected, values):
+            unique_days, inverse = np.unique(days[selected], return_inverse=True)
+            return unique_days.tolist(), self._bincount_sum(inverse, values[selected], len(unique_days)).tolist()
+        for kind, selected in (("income", income), ("expense", expense)):
+            for day, amount in zip(*day_sums(selected, self.amounts if kind == "income" else magnitudes)):
+                rollups.days.setdefault(day, rollups._new_bucket())[kind] += amount
+        keys = days[expense] * len(self.names) + self.columns["category"][expense]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = self._bincount_sum(inverse, magnitudes[expense], len(unique_keys)).tolist()
+        for key, amount in zip(unique_keys.tolist(), sums):
+            day, category = divmod(key, len(self.names))
+            categories = rollups.days[day]["categories"]
+            name = spending_category(self.names[category]) # '' and 'Uncategorized' share one key, as in SpendingRollups.apply()
+            categories[name] = categories.get(name, 0) + amount
+        for day, bucket in sorted(rollups.days.items()):
+            month = rollups.months.setdefault(rollups.month_key(day), rollups._new_bucket())
+            month["income"] += bucket["income"]; month["expense"] += bucket["expense"]
+            for category, amount in bucket["categories"].items():
+                month["categories"][category] = month["categories"].get(category, 0) + amount
+        return rollups
+
+# --- Duplicate Detection ---
+class DuplicateIndex:
+    """
+    Content keys (date, time, wallet, amount, title) -> number of ledger rows with that content,
+    plus a per-wallet index of timestamps by amount (time-sorted) for near-duplicate checks.
+    Both are O(1)/O(log n) to query and to update.
+    """
+
+    def __init__(self, transactions=()):
+        self.counts = {}
+        self.by_wallet = {} # wallet -> amount in centavos -> sorted '_ts' list
+        for tx in transactions: self.add(tx)
+
+    @staticmethod
+    def content_key(tx):
+        """Returns the key identical transactions share (None for rows without a numeric amount)."""
+        amount = tx.get("amount")
+        if not isinstance(amount, int): return None
+        return (tx.get("date") or "", (tx.get("time") or "")[:5], tx.get("wallet") or "", amount, " ".join(str(tx.get("title") or "").lower().split()))
+
+    def add(self, tx):
+        key = self.content_key(tx)
+        if key is None: return
+        self.counts[key] = self.counts.get(key, 0) + 1
+        times = self.by_wallet.setdefault(key[2], {}).setdefault(key[3], [])
+        ts = tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx)
+        if not times or times[-1] <= ts: times.append(ts)
+        else: bisect.insort_right(times, ts)
+
+    def remove(self, tx):
+        key = self.content_key(tx)
+        if key is None or key not in self.counts: return
+        if self.counts[key] > 1: self.counts[key] -= 1
+        else: del self.counts[key]
+        times = self.by_wallet.get(key[2], {}).get(key[3], [])
+        ts = tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx)
+        i = bisect.bisect_left(times, ts)
+        if i < len(times) and times[i] == ts: del times[i]
+
+    def count(self, tx):
+        """Returns how many ledger rows have exactly this transaction's content."""
+        key = self.content_key(tx)
+        return self.counts.get(key, 0) if key is not None else 0
+
+    def has_near_duplicate(self, tx, window_minutes=DUPLICATE_WINDOW_MINUTES):
+        """Checks for a row in the same wallet with the same amount within window_minutes of tx."""
+        times = self.by_wallet.get(tx.get("wallet") or "", {}).get(tx.get("amount"))
+        if not times: return False
+        ts = tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx)
+        i = bisect.bisect_left(times, ts - window_minutes * 60)
+        return i < len(times) and times[i] <= ts + window_minutes * 60
+
+    def classify(self, tx, window_minutes=DUPLICATE_WINDOW_MINUTES):
+        """Returns 'exact', 'near' or None for a transaction about to be recorded."""
+        if self.count(tx): return "exact"
+        if window_minutes and self.has_near_duplicate(tx, window_minutes): return "near"
+        return None
+
+# --- Transaction Aggregate Index ---
+class LedgerIndex:
+    """Running spend totals (integer centavos) over app_data['transactions'], keyed by budget, goal and wallet, plus the spending rollups."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Empties every aggregate."""
+        self.budget_series = {}       # linked_budget -> PrefixSumSeries of expense amounts
+        self.goal_contributions = {}  # linked_goal -> total expense amount
+        self.wallet_totals = {}       # wallet -> net signed amount
+        # Reference counts: name -> number of transactions pointing at it
+        self.references = {"wallets": {}, "budgets": {}, "goals": {}}
+        self.rollups = SpendingRollups()
+        self.arrays = None # LedgerArrays mirror of the ledger (numpy only), built on demand by analytics() and dropped when rows are removed
+        self._duplicates = None # DuplicateIndex, built on first use and then kept up to date
+        self.positions = None  # transaction_id -> ledger position, rebuilt on the first lookup after rows shift
+        self.tombstones = []   # Sorted ledger positions of deleted rows awaiting compaction
+
+    def rebuild(self, transactions):
+        """Recomputes all aggregates from a full transaction list."""
+        self.clear()
+        if not isinstance(transactions, list): return
+        if np is not None:
+            self._rebuild_vectorized(transactions)
+            return
+        for tx in transactions:
+            self._apply(tx, 1)
+
+    def checkpoint(self):
+        """Returns a JSON-ready copy of every aggregate, for restore() to start from on the next load."""
+        return dict(self.rollups.to_dict(), wallets=dict(self.wallet_totals), goals=dict(self.goal_contributions),
+                    references={data_type: dict(counts) for data_type, counts in self.references.items()},
+                    budgets={name: [list(series.timestamps), list(series.amounts)] for name, series in self.budget_series.items()})
+
+    def restore(self, checkpoint, tail_rows=()):
+        """
+        Seeds the aggregates from a checkpoint() and folds in the rows recorded after it, instead of
+        rebuilding from the whole ledger. Raises KeyError, ValueError or TypeError if it is malformed.
+        """
+        self.clear()
+        self.rollups = SpendingRollups.from_dict(checkpoint)
+        self.wallet_totals = {name: int(total) for name, total in checkpoint["wallets"].items()}
+        self.goal_contributions = {name: int(total) for name, total in checkpoint["goals"].items()}
+        self.references = {data_type: {name: int(count) for name, count in checkpoint["references"][data_type].items()} for data_type in REFERENCE_FIELDS}
+        for name, (timestamps, amounts) in checkpoint["budgets"].items():
+            series = self.budget_series[name] = PrefixSumSeries()
+            series.timestamps, series.amounts = [int(ts) for ts in timestamps], [int(amount) for amount in amounts]
+            series._refold(0)
+        for tx in tail_rows:
+            self._apply(tx, 1)
+
+    def _rebuild_vectorized(self, transactions):
+        """Builds every aggregate from LedgerArrays group-bys instead of a per-row loop."""
+        arrays = LedgerArrays(transactions) # Dropped once the aggregates are built; analytics() rebuilds it if asked
+        self.references["wallets"] = arrays.wallet_reference_counts()
+        self.references["budgets"] = arrays.group_count("linked_budget")
+        self.references["goals"] = arrays.group_count("linked_goal")
+
+        valid = arrays.mask()
+        magnitudes = np.abs(arrays.amounts)
+        expense = valid & (arrays.columns["type"] == arrays.code("expense"))
+        self.goal_contributions = arrays.group_sum("linked_goal", expense & (arrays.amounts < 0), magnitudes)
+        self.wallet_totals = arrays.group_sum("wallet", valid)
+
+        budgeted = expense & (arrays.columns["linked_budget"] != arrays.code(''))
+        budget_codes, timestamps = arrays.columns["linked_budget"][budgeted], arrays.timestamps[budgeted]
+        order = np.lexsort((timestamps, budget_codes)) # By budget, then time (stable for equal timestamps)
+        budget_codes, timestamps, amounts = budget_codes[order], timestamps[order], magnitudes[budgeted][order]
+        boundaries = [0] + (np.flatnonzero(np.diff(budget_codes)) + 1).tolist() + [len(budget_codes)]
+        for start, end in zip(boundaries, boundaries[1:]):
+            if start == end: continue
+            series = self.budget_series[arrays.names[budget_codes[start]]] = PrefixSumSeries()
+            series.timestamps = timestamps[start:end].tolist()
+            series.amounts = amounts[start:end].tolist()
+            series.cumulative = [0] + np.cumsum(amounts[start:end]).tolist()
+        arrays.daily_rollups(self.rollups)
+
+    def analytics(self):
+        """Returns LedgerArrays in sync with app_data['transactions'], or None without numpy."""
+        if np is None: return None
+        if self.arrays is None:
+            self.compact()
+            self.arrays = LedgerArrays(app_data.get("transactions", []))
+        return self.arrays.sync()
+
+    def duplicates(self):
+        """Returns the DuplicateIndex over app_data['transactions'], building it the first time it is needed."""
+        if self._duplicates is None:
+            self._duplicates = DuplicateIndex(tx for tx in app_data.get("transactions", []) if isinstance(tx, dict) and not tx.get("_deleted"))
+        return self._duplicates
+
+    def position_of(self, tx_id):
+        """Returns the ledger position of a live transaction by ID, or None."""
+        ledger = app_data.get("transactions", [])
+        if self.positions is None:
+            self.positions = {tx.get("transaction_id"): position for position, tx in enumerate(ledger) if not tx.get("_deleted")}
+        position = self.positions.get(tx_id)
+        return position if position is not None and not ledger[position].get("_deleted") else None
+
+    def note_inserted(self, position, tx):
+        """Keeps positions and tombstones valid after tx was inserted into the ledger at position."""
+        if position == len(app_data["transactions"]) - 1:
+            if self.positions is not None: self.positions[tx.get("transaction_id")] = position
+            return
+        self.positions = None # Every later row moved up by one
+        shift_from = bisect.bisect_left(self.tombstones, position)
+        self.tombstones[shift_from:] = [tombstone + 1 for tombstone in self.tombstones[shift_from:]]
+
+    def add_tombstone(self, position):
+        """Marks the row at position deleted, leaving it in place until the ledger is compacted."""
+        ledger = app_data["transactions"]
+        ledger[position] = dict(ledger[position], _deleted=True) # A copy: a save in flight may still hold the row
+        bisect.insort(self.tombstones, position)
+
+    def live_count(self):
+        """Returns the number of ledger rows that are not deleted."""
+        return len(app_data.get("transactions", [])) - len(self.tombstones)
+
+    def live_position(self, index):
+        """Returns the ledger position of the index-th live row (oldest first), stepping over tombstones."""
+        position = index
+        for tombstone in self.tombstones:
+            if tombstone > position: break
+            position += 1
+        return position
+
+    def compact(self, force=True):
+        """Drops tombstoned rows from the ledger in one pass (with force=False, only once enough have piled up)."""
+        ledger = app_data.get("transactions", [])
+        if not self.tombstones or (not force and len(self.tombstones) < max(TOMBSTONE_COMPACTION_MIN, len(ledger) // 8)): return
+        ledger[:] = [tx for tx in ledger if not tx.get("_deleted")]
+        self.tombstones = []
+        self.positions = None
+
+    def add(self, tx):
+        """Folds a newly recorded transaction into the aggregates."""
+        self._apply(tx, 1)
+        if self.arrays is not None: self.arrays.pending.append(tx)
+        if self._duplicates is not None: self._duplicates.add(tx)
+
+    def remove(self, tx):
+        """Backs a removed transaction out of the aggregates."""
+        self._apply(tx, -1)
+        self.arrays = None # Rebuilt on the next analytics() call
+        if self._duplicates is not None: self._duplicates.remove(tx)
+
+    def budget_spent_between(self, budget_name, start_ts=None, end_ts=None):
+        """Returns expenses linked to a budget with start_ts <= '_ts' < end_ts."""
+        series = self.budget_series.get(budget_name)
+        return series.total_between(start_ts, end_ts) if series is not None else 0
+
+    def budget_period_spent(self, budget_name, cycle, moment=None):
+        """Returns a budget's spending in the cycle period containing moment (default: now); all-time for 'Once'."""
+        return self.budget_history(budget_name, cycle, periods=1, moment=moment)[0][1]
+
+    def budget_history(self, budget_name, cycle, periods=12, moment=None):
+        """Returns [(period_start, spent)] for the current and previous periods, newest first ([(None, spent)] for 'Once')."""
+        period_start = cycle_period_start(cycle, moment or datetime.datetime.now())
+        if period_start is None: return [(None, self.budget_spent_between(budget_name))]
+        history = []
+        for offset in range(periods):
+            start = shift_period(cycle, period_start, -offset)
+            end = shift_period(cycle, start, 1)
+            history.append((start, self.budget_spent_between(budget_name, to_timestamp(start), to_timestamp(end))))
+        return history
+
+    def reference_count(self, data_type, name):
+        """Returns how many transactions reference a wallet/budget/goal name."""
+        return self.references[data_type].get(name, 0) if name else 0
+
+    def rename_references(self, data_type, old_name, new_name):
+        """
+        Re-points transactions from an entity's old name to its new one. The entity's aggregates move
+        to the new key in one step instead of being backed out and re-added row by row.
+        Returns the number of rows changed.
+        """
+        if not old_name or old_name == new_name or not self.reference_count(data_type, old_name): return 0
+        fields = REFERENCE_FIELDS[data_type]
+        changed = overlapping = 0
+        self.compact()
+        ledger = app_data.get("transactions", [])
+        for position, tx in enumerate(ledger):
+            if not isinstance(tx, dict) or not any(tx.get(field) == old_name for field in fields): continue
+            if any(tx.get(field) == new_name for field in fields): overlapping += 1 # Counted under both names until now
+            # Renamed copies replace the rows, so a save in flight keeps writing the rows it captured
+            ledger[position] = {key: (new_name if key in fields and value == old_name else value) for key, value in tx.items()}
+            changed += 1
+
+        counts = self.references[data_type]
+        counts[new_name] = counts.get(new_name, 0) + counts.pop(old_name) - overlapping
+        totals = {"wallets": self.wallet_totals, "goals": self.goal_contributions}.get(data_type)
+        if totals is not None and old_name in totals:
+            totals[new_name] = totals.get(new_name, 0) + totals.pop(old_name)
+        series = self.budget_series.pop(old_name, None) if data_type == "budgets" else None
+        if series is not None:
+            self.budget_series[new_name] = self.budget_series[new_name].merge(series) if new_name in self.budget_series else series
+        self.arrays = None # Its name codes still spell the old name
+        if data_type == "wallets": self._duplicates = None # Keyed by wallet; rebuilt on next use
+        return changed
+
+    def _apply(self, tx, sign):
+        if not isinstance(tx, dict): return
+        self.rollups.apply(tx, sign)
+        for data_type, fields in REFERENCE_FIELDS.items():
+            counts = self.references[data_type]
+            # A transfer names the same wallet in several fields; count the row once per name
+            for name in {tx.get(field) for field in fields}:
+                if not name: continue
+                new_count = counts.get(name, 0) + sign
+                if new_count > 0: counts[name] = new_count
+                else: counts.pop(name, None)
+
+        amount = tx.get("amount")
+        if not isinstance(amount, int): return
+
+        if tx.get("type") == "expense":
+            budget_name = tx.get("linked_budget")
+            if budget_name:
+                series = self.budget_series.setdefault(budget_name, PrefixSumSeries())
+                ts = tx["_ts"] if "_ts" in tx else parse_transaction_timestamp(tx)
+                if sign > 0: series.add(ts, abs(amount))
+                else:
+                    series.remove(ts, abs(amount))
+                    if not series: del self.budget_series[budget_name]
+            goal_name = tx.get("linked_goal")
+            if goal_name and amount < 0:
+                self.goal_contributions[goal_name] = self.goal_contributions.get(goal_name, 0) + sign * abs(amount)
+
+        wallet_name = tx.get("wallet")
+        if wallet_name:
+            self.wallet_totals[wallet_name] = self.wallet_totals.get(wallet_name, 0) + sign * amount
+
+ledger_index = LedgerIndex()
+
+def prepare_ledger(transactions):
+    """Stores each transaction's parsed timestamp under '_ts' and sorts the ledger oldest first."""
+    for tx in transactions:
+        if "_ts" not in tx: # Rows from a binary snapshot arrive with their timestamp
+            tx["_ts"] = parse_transaction_timestamp(tx)
+    transactions.sort(key=lambda tx: tx["_ts"])
+
+def assign_transaction_ids(transactions):
+    """
+    Gives rows without a transaction_id a new one and, where an ID repeats (an edited row journaled
+    after the original it replaces), keeps only its last occurrence; IDs whose last occurrence is a
+    journaled deletion are dropped. Returns how many rows changed.
+    """
+    last_position, missing = {}, []
+    for position, tx in enumerate(transactions):
+        tx_id = tx.get("transaction_id")
+        if tx_id: last_position[tx_id] = position
+        else: missing.append(tx)
+    replaced = len(transactions) - len(missing) - len(last_position)
+    deleted = sum(1 for position in last_position.values() if transactions[position].get("type") == JOURNAL_TOMBSTONE_TYPE)
+    if replaced or deleted:
+        transactions[:] = [tx for position, tx in enumerate(transactions) if not tx.get("transaction_id")
+                           or (last_position[tx["transaction_id"]] == position and tx.get("type") != JOURNAL_TOMBSTONE_TYPE)]
+    for tx, tx_id in zip(missing, get_unique_ids("tx", len(missing))): tx["transaction_id"] = tx_id
+    return replaced + deleted + len(missing)
+
+def record_transactions(new_transactions):
+    """Inserts transactions into the time-ordered ledger, journals them and updates the aggregate index."""
+    if not isinstance(app_data.get("transactions"), list): app_data["transactions"] = []
+    ledger = app_data["transactions"]
+    assign_transaction_ids(new_transactions)
+    for tx in new_transactions:
+        if "_ts" not in tx: tx["_ts"] = parse_transaction_timestamp(tx)
+        ledger_index.add(tx)
+    if len(new_transactions) > 16 and ledger and ledger[-1]["_ts"] > min(tx["_ts"] for tx in new_transactions):
+        # Large back-dated batch (e.g. a statement import): one stable sort merges the two sorted runs
+        ledger_index.compact() # Tombstone positions would not survive the sort
+        ledger.extend(sorted(new_transactions, key=lambda row: row["_ts"]))
+        ledger.sort(key=lambda row: row["_ts"])
+        ledger_index.positions = None
+    else:
+        for tx in new_transactions:
+            # Appending is the common case; back-dated entries are slotted into place
+            if not ledger or ledger[-1]["_ts"] <= tx["_ts"]: position = len(ledger)
+            else: position = bisect.bisect_right(ledger, tx["_ts"], key=lambda row: row["_ts"])
+            ledger.insert(position, tx)
+            ledger_index.note_inserted(position, tx)
+    append_to_journal("transactions", new_transactions)
+    dirty_data.mark("transactions")
+    sync_wallet_balances({tx.get("wallet") for tx in new_transactions})
+
+def _transfer_counterpart(position):
+    """Returns the ledger position of the other half of the transfer at position, or None."""
+    ledger = app_data["transactions"]
+    tx = ledger[position]
+    other_type = {"transfer_out": "transfer_in", "transfer_in": "transfer_out"}.get(tx.get("type"))
+    if other_type is None: return None
+    # Both halves are recorded together with the same timestamp
+    start = bisect.bisect_left(ledger, tx["_ts"], key=lambda row: row["_ts"])
+    end = bisect.bisect_right(ledger, tx["_ts"], key=lambda row: row["_ts"])
+    for other in range(start, end):
+        row = ledger[other]
+        if row.get("type") == other_type and not row.get("_deleted") and row.get("from_account") == tx.get("from_account") \
+                and row.get("to_account") == tx.get("to_account") and row.get("amount") == -tx.get("amount", 0):
+            return other
+    return None
+
+def delete_transactions(tx_ids):
+    """
+    Deletes transactions by ID (a transfer takes its other half along), backing them out of the
+    aggregate index (and so the wallet balances derived from it). Rows are tombstoned in place; the ledger is compacted
+    once enough pile up. With flat files the deletions are journaled too, so they survive a reload before the next save.
+    Returns the deleted rows.
+    """
+    deleted = []
+    for tx_id in tx_ids:
+        position = ledger_index.position_of(tx_id)
+        if position is None: continue
+        counterpart = _transfer_counterpart(position)
+        for row_position in ([position] if counterpart is None else [position, counterpart]):
+            tx = app_data["transactions"][row_position]
+            ledger_index.remove(tx)
+            ledger_index.add_tombstone(row_position)
+            deleted.append(tx)
+    if deleted:
+        store = get_user_store(app_data.get("current_user_id"))
+        if store is None:
+            append_to_journal("transactions", [{"transaction_id": tx["transaction_id"], "type": JOURNAL_TOMBSTONE_TYPE} for tx in deleted])
+        else:
+            try: store.delete_transactions([tx["transaction_id"] for tx in deleted])
+            except sqlite3.Error as e:
+                logging.error(f"Could not delete transactions from {store.db_path}: {e}")
+                compaction_requested.add("transactions") # Rewrite the table from memory on the next save
+        dirty_data.mark("transactions")
+        ledger_index.compact(force=False)
+        sync_wallet_balances({tx.get("wallet") for tx in deleted})
+    return deleted
+
+def update_transaction(tx_id, changes):
+    """
+    Edits a transaction by replacing it: the old row (and a transfer's other half) is deleted and a
+    copy with the changes is recorded under the same ID, so its ledger position, wallet balances and
+    aggregates all follow. A changed amount is mirrored onto a transfer's other half. Returns the new rows.
+    """
+    old_rows = delete_transactions([tx_id])
+    new_rows = []
+    for old in old_rows:
+        row_changes = changes if old.get("transaction_id") == tx_id else \
+            {field: (-value if field == "amount" else value) for field, value in changes.items() if field in ("date", "time", "amount")}
+        tx = {field: value for field, value in old.items() if not field.startswith("_")}
+        tx.update(row_changes)
+        if "date" in row_changes or "time" in row_changes: tx["timestamp"] = f"{tx['date']} {tx['time']}"
+        new_rows.append(tx)
+    if new_rows: record_transactions(new_rows)
+    return new_rows
+
+# --- Wallet Balances ---
+# A wallet's balance is derived: its opening balance (stored with the wallet) plus the sum of its
+# ledger rows (LedgerIndex.wallet_totals). Each save of the transactions file also writes a
+# checkpoint of the index as of its last row, so loading only replays the journal after it.
+def opening_balance(details):
+    """Returns a wallet's opening balance, or None for wallets saved before balances were derived."""
+    value = details.get("opening_balance")
+    return value if isinstance(value, int) else None
+
+def sync_wallet_balances(wallet_names=None):
+    """
+    Sets each wallet's balance (or only the named ones') to its opening balance plus its ledger sum.
+    A wallet saved before balances were derived keeps the balance it had: the part its
+    transactions do not explain becomes its opening balance.
+    """
+    wallets = app_data.get("wallets", {})
+    if not isinstance(wallets, dict): return
+    changed = False
+    for details in wallets.values():
+        if not isinstance(details, dict) or (wallet_names is not None and details.get("name") not in wallet_names): continue
+        ledger_sum = ledger_index.wallet_totals.get(details.get("name"), 0)
+        opening = opening_balance(details)
+        if opening is None:
+            balance = details.get("balance")
+            opening = (balance if isinstance(balance, int) else 0) - ledger_sum
+            changed = True
+        balance = opening + ledger_sum
+        if details.get("balance") != balance: changed = True
+        details["opening_balance"], details["balance"] = opening, balance
+    if changed: dirty_data.mark("wallets")
+
+def ledger_wallet_sums(transactions):
+    """Returns {wallet: sum of amounts in centavos} over a list of transactions."""
+    totals = {}
+    for tx in transactions:
+        amount, wallet_name = tx.get("amount"), tx.get("wallet")
+        if wallet_name and isinstance(amount, int): totals[wallet_name] = totals.get(wallet_name, 0) + amount
+    return totals
+
+def load_ledger_checkpoint(user_id, base_rows):
+    """Returns the LedgerIndex checkpoint saved with the user's committed transactions file, or None if missing or built from other rows."""
+    if "checkpoint" not in get_manifest(user_id)["files"]: return None
+    data = _load_json_data(resolve_user_data_file(user_id, "checkpoint"), default_value={})
+    if data.get("rows") != base_rows or data.get("source") != os.path.basename(resolve_user_data_file(user_id, "transactions")) \
+            or data.get("units") != MONEY_UNITS:
+        logging.info("Saved ledger checkpoint does not match the transactions file. Rebuilding the aggregates.")
+        return None
+    return data
+
+def load_store_checkpoint(store):
+    """Returns (checkpoint, rows inserted since) from a SQLite store, or (None, []) if it is missing or stale."""
+    checkpoint = store.load_checkpoint()
+    if checkpoint is None or not isinstance(checkpoint.get("last_id"), int): return None, []
+    return checkpoint, store.transactions_after(checkpoint["last_id"])
+
+def reconcile_wallets(fix=False):
+    """
+    Re-sums every wallet over the full ledger in one pass (a NumPy group-by when available) and
+    compares it with the running totals balances are derived from. Returns [(wallet name, running
+    total, ledger total)] for every wallet; fix=True adopts the ledger totals.
+    """
+    arrays = ledger_index.analytics()
+    ledger_totals = arrays.group_sum("wallet") if arrays is not None else ledger_wallet_sums(app_data.get("transactions", []))
+    names = sorted(set(ledger_totals) | set(ledger_index.wallet_totals) | set(entity_names.by_name["wallets"]), key=str.lower)
+    report = [(name, ledger_index.wallet_totals.get(name, 0), ledger_totals.get(name, 0)) for name in names]
+    if fix:
+        ledger_index.wallet_totals = dict(ledger_totals)
+        sync_wallet_balances()
+    return report
+
+# --- Entity Name Index ---
+class EntityNameIndex:
+    """Name -> ID lookups for wallets, budgets and goals, plus (type, name) -> key for categories."""
+    DATA_TYPES = ("wallets", "budgets", "goals")
+
+    def __init__(self):
+        self.by_name = {data_type: {} for data_type in self.DATA_TYPES}
+        self.by_folded_name = {data_type: {} for data_type in self.DATA_TYPES} # For case-insensitive uniqueness checks
+        self.categories = {}
+
+    def rebuild(self, data_type=None):
+        """Rebuilds the index for one data type (or all of them, including categories) from app_data."""
+        for dt in ([data_type] if data_type else self.DATA_TYPES):
+            self.by_name[dt] = {}; self.by_folded_name[dt] = {}
+            data_source = app_data.get(dt)
+            if not isinstance(data_source, dict): continue
+            for item_id, details in data_source.items():
+                if isinstance(details, dict): self.add(dt, item_id, details.get("name"))
+        if data_type is None:
+            self.categories = {}
+            for cat_key, details in app_data.get("categories", {}).items():
+                if isinstance(details, dict):
+                    self.categories.setdefault((details.get("type"), details.get("name")), cat_key)
+
+    def add(self, data_type, item_id, name):
+        """Indexes an item under its name."""
+        if not name: return
+        self.by_name[data_type].setdefault(name, item_id)
+        self.by_folded_name[data_type].setdefault(str(name).lower(), item_id)
+
+    def remove(self, data_type, item_id, name):
+        """Drops an item's name entries, falling back to another item that shares the name."""
+        if not name: return
+        folded = str(name).lower()
+        removed = False
+        if self.by_name[data_type].get(name) == item_id:
+            del self.by_name[data_type][name]; removed = True
+        if self.by_folded_name[data_type].get(folded) == item_id:
+            del self.by_folded_name[data_type][folded]; removed = True
+        if not removed: return
+        # Legacy data may hold duplicate names; keep the survivor reachable
+        for other_id, details in app_data.get(data_type, {}).items():
+            if other_id != item_id and isinstance(details, dict) and str(details.get("name", "")).lower() == folded:
+                self.add(data_type, other_id, details.get("name"))
+
+    def find_id(self, data_type, name, ignore_case=False):
+        """Returns the ID of the item with the given name, or None."""
+        if not name: return None
+        if ignore_case: return self.by_folded_name[data_type].get(str(name).lower())
+        return self.by_name[data_type].get(name)
+
+    def find_category(self, name, category_type):
+        """Returns the category details for a name within a type ('expense'/'income'), or None."""
+        cat_key = self.categories.get((category_type, name))
+        return app_data.get("categories", {}).get(cat_key) if cat_key else None
+
+entity_names = EntityNameIndex()
+
+def add_entity(data_type, item_id, details):
+    """Adds a wallet/budget/goal to app_data and the name index."""
+    if not isinstance(app_data.get(data_type), dict): app_data[data_type] = {}
+    app_data[data_type][item_id] = details
+    entity_names.add(data_type, item_id, details.get("name"))
+    dirty_data.mark(data_type)
+
+def update_entity(data_type, item_id, changes):
+    """Applies changes to an existing wallet/budget/goal, re-indexing it if renamed."""
+    details = app_data[data_type][item_id]
+    old_name = details.get("name")
+    details.update(changes)
+    if details.get("name") != old_name:
+        entity_names.remove(data_type, item_id, old_name)
+        entity_names.add(data_type, item_id, details.get("name"))
+        # Transactions follow the rename; journaled rows still carry the old name, so rewrite on next save
+        app_data.ensure_loaded("transactions") # References are only counted once the ledger is read
+        if ledger_index.rename_references(data_type, old_name, details.get("name")):
+            compaction_requested.add("transactions")
+            dirty_data.mark("transactions")
+    if data_type == "wallets" and "balance" in changes:
+        # A corrected balance moves the opening balance; the ledger sum stays what it is
+        app_data.ensure_loaded("transactions")
+        details["opening_balance"] = changes["balance"] - ledger_index.wallet_totals.get(details.get("name"), 0)
+        sync_wallet_balances({details.get("name")})
+    dirty_data.mark(data_type)
+
+def remove_entity(data_type, item_id):
+    """Removes a wallet/budget/goal from app_data and the name index."""
+    details = app_data[data_type].pop(item_id)
+    if isinstance(details, dict): entity_names.remove(data_type, item_id, details.get("name"))
+    dirty_data.mark(data_type)
+    return details
+
 # --- Data Loading Helpers ---
 def _load_json_data(file_path, default_value=None):
     """Loads data from a JSON file."""
@@ -309,51 +2095,63 @@ def _load_json_data(file_path, default_value=None):
         logging.exception(f"Unexpected error loading JSON {file_path}: {e}")
         return default_value
 
-def _load_csv_data(file_path, expected_fields, id_field=None, numeric_fields=None):
-    """Loads data from a CSV file into a list or dictionary."""
-    if numeric_fields is None: numeric_fields = []
-    data_list = [] # Temporarily store all rows read
-
-    logging.debug(f"Executing _load_csv_data for: {file_path}")
-    logging.debug(f"  Expected fields: {expected_fields}")
-    logging.debug(f"  ID field: {id_field}")
-
-    try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-
-            # Check header existence and content
-            if not reader.fieldnames:
-                 logging.warning(f"CSV file '{file_path}' appears empty or has no header. Returning empty data.")
-                 return {} if id_field else []
-
-            processed_rows = 0
-            for row_num, row in enumerate(reader, 1):
-                processed_row = {}
-                try:
-                    # Process only expected fields
-                    for field in expected_fields:
-                        val = row.get(field)
-
-                        # Handle numeric conversion
-                        if field in numeric_fields:
-                            try:
-                                processed_row[field] = float(val) if val not in [None, ''] else 0.0
-                            except (ValueError, TypeError):
-                                logging.warning(f"Invalid numeric value '{val}' for field '{field}' in row {row_num} of {file_path}. Using 0.0.")
-                                processed_row[field] = 0.0
-
-                        else:
-                             processed_row[field] = val if val is not None else ''
+def _compile_row_builder(header, expected_fields, money_fields, file_path):
+    """Precompiles a function turning a raw csv.reader row into a dict of expected fields."""
+    column_index = {name: index for index, name in enumerate(header)}
+    missing_index = len(header) # Columns absent from the header read from a padded empty cell
+    indices = [column_index.get(field, missing_index) for field in expected_fields]
+    width = max(indices) + 1 if indices else 0
+    money_fields = set(money_fields)
+    missing_money_fields = [field for field in expected_fields if field in money_fields and field not in column_index]
+    money_fields = [field for field in expected_fields if field in money_fields and field in column_index]
+    fields = tuple(expected_fields)
+    if len(indices) == 1:
+        only_index = indices[0]
+        pick = lambda row: (row[only_index],)
+    else:
+        pick = operator.itemgetter(*indices)
 
-                    data_list.append(processed_row)
-                    processed_rows += 1
-                except Exception as e:
-                     logging.error(f"Error processing row {row_num} in {file_path}: {e}. Skipping row: {row}")
-                     continue # Skip to the next row
+    def build(row, row_num):
+        if len(row) < width: row = row + [''] * (width - len(row)) # Short rows behave like DictReader's None fill
+        record = dict(zip(fields, pick(row)))
+        for field in money_fields: # Decimal pesos on disk -> integer centavos
+            val = record[field]
+            try:
+                record[field] = parse_money(val) if val else 0
+            except ValueError:
+                logging.warning(f"Invalid amount '{val}' for field '{field}' in row {row_num} of {file_path}. Using 0.")
+                record[field] = 0
+        for field in missing_money_fields: record[field] = None # The file predates this column
+        return record
+    return build
+
+def iter_csv_rows(file_path, expected_fields, money_fields=None):
+    """Streams rows of a CSV file as dicts of expected fields. Raises FileNotFoundError/csv.Error like open()/csv.reader."""
+    with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if not header:
+            logging.warning(f"CSV file '{file_path}' appears empty or has no header. Returning empty data.")
+            return
+        build = _compile_row_builder(header, expected_fields, money_fields or [], file_path)
+        for row_num, row in enumerate(reader, 1):
+            if not row: continue # DictReader skipped blank lines too
+            try:
+                yield build(row, row_num)
+            except Exception as e:
+                logging.error(f"Error processing row {row_num} in {file_path}: {e}. Skipping row: {row}")
 
-            logging.debug(f"  Read and processed {processed_rows} rows from {file_path}.")
+def _load_csv_data(file_path, expected_fields, id_field=None, money_fields=None):
+    """Loads data from a CSV file into a list or dictionary."""
+    debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+    if debug_enabled:
+        logging.debug(f"Executing _load_csv_data for: {file_path}")
+        logging.debug(f"  Expected fields: {expected_fields}")
+        logging.debug(f"  ID field: {id_field}")
 
+    try:
+        data_list = list(iter_csv_rows(file_path, expected_fields, money_fields))
+        if debug_enabled: logging.debug(f"  Read and processed {len(data_list)} rows from {file_path}.")
     except FileNotFoundError:
         logging.warning(f"CSV file not found: {file_path}. Returning empty data.")
         return {} if id_field else []
@@ -384,72 +2182,169 @@ def _load_csv_data(file_path, expected_fields, id_field=None, numeric_fields=Non
                 logging.warning(f"Skipping item with missing or empty ID field '{id_field}' in {file_path}: {item}")
                 missing_ids += 1
 
-        logging.debug(f"  Constructed dictionary for {file_path}: {successful_adds} items added, {duplicate_ids} duplicates overwritten, {missing_ids} missing IDs skipped.")
+        if debug_enabled: logging.debug(f"  Constructed dictionary for {file_path}: {successful_adds} items added, {duplicate_ids} duplicates overwritten, {missing_ids} missing IDs skipped.")
         return data_dict
     else:
-        logging.debug(f"  Returning list for {file_path} (no ID field specified).")
+        if debug_enabled: logging.debug(f"  Returning list for {file_path} (no ID field specified).")
         return data_list
 
-def load_user_data(user_id):
-    """Loads all data for the specified user_id into the global app_data."""
-    logging.info(f"Loading data for user: {user_id}")
-    app_data["current_user_id"] = user_id
-
-    # Configure data types for loading (JSON or CSV, with expected fields)
-    data_types_config = {
-        "wallets": {"type": dict, "fields": ['wallet_id', 'name', 'balance'], "id_field": "wallet_id", "numeric_fields": ["balance"]},
-        "budgets": {"type": dict, "fields": ['budget_id', 'name', 'allocated', 'cycle'], "id_field": "budget_id", "numeric_fields": ["allocated"]},
-        "goals": {"type": dict, "fields": ['goal_id', 'name', 'target', 'saved', 'due_date'], "id_field": "goal_id", "numeric_fields": ["target", "saved"]},
-        "transactions": {"type": list, "fields": ['date', 'time', 'timestamp', 'title', 'wallet', 'amount', 'category', 'type', 'from_account', 'to_account', 'linked_budget', 'linked_goal'], "numeric_fields": ["amount"]},
-        "activity_log": {"type": list, "fields": ['timestamp', 'action']},
-        "settings": {"type": dict, "is_json": True},
-    }
-
-    # Load data for each type
-    for data_key, config in data_types_config.items():
-        file_path = get_user_data_file_path(user_id, data_key)
-        is_json = config.get("is_json", False)
-        default_value = {} if config["type"] == dict else []
-        id_field_to_use = config.get("id_field")
-
-        logging.info(f"Attempting to load '{data_key}' from {file_path} (Expected type: {config['type']}, ID Field: {id_field_to_use})")
+# Data types stored per user (JSON or CSV, with expected fields; money fields are decimal pesos on disk, integer centavos in memory)
+USER_DATA_TYPES = {
+    "wallets": {"type": dict, "fields": ['wallet_id', 'name', 'balance', 'opening_balance'], "id_field": "wallet_id", "money_fields": ["balance", "opening_balance"]},
+    "budgets": {"type": dict, "fields": ['budget_id', 'name', 'allocated', 'cycle'], "id_field": "budget_id", "money_fields": ["allocated"]},
+    "goals": {"type": dict, "fields": ['goal_id', 'name', 'target', 'saved', 'due_date'], "id_field": "goal_id", "money_fields": ["target", "saved"]},
+    "transactions": {"type": list, "fields": TRANSACTION_FIELDS, "money_fields": ["amount"]},
+    "activity_log": {"type": list, "fields": ACTIVITY_LOG_FIELDS},
+    "settings": {"type": dict, "is_json": True},
+}
 
-        if is_json:
-            loaded_data = _load_json_data(file_path, default_value=default_value)
-            if data_key == "settings":
-                loaded_data.setdefault("theme", "dark") # Ensure default theme if missing
-            app_data[data_key] = loaded_data
-            logging.info(f"  Loaded JSON data for '{data_key}'.")
-        else: # CSV
+class LedgerLoad:
+    """A transaction ledger read and indexed by _load_dataset without touching shared state; install_ledger() makes it live."""
+    def __init__(self, rows, index, journal_rows=0):
+        self.rows = rows
+        self.index = index # LedgerIndex over rows
+        self.journal_rows = journal_rows # Rows replayed from the journal (see journal_row_counts)
+        self.needs_rewrite = False # IDs were assigned or duplicates dropped; rewrite the files on the next save
+        self.needs_checkpoint = False # SQLite only: no usable checkpoint, so save one on the next save
+
+def install_ledger(load):
+    """Runs on the Tk thread: makes a LedgerLoad the live index, derives wallet balances and returns the rows for app_data."""
+    global ledger_index
+    ledger_index = load.index
+    journal_row_counts["transactions"] = load.journal_rows
+    if load.needs_rewrite: compaction_requested.add("transactions")
+    if load.needs_rewrite or load.needs_checkpoint: dirty_data.mark("transactions")
+    sync_wallet_balances()
+    logging.info("Transaction ledger installed.")
+    return load.rows
+
+def _load_ledger(user_id, store=None):
+    """The transactions loader for LazyAppData: reads and installs the ledger on the calling (Tk) thread."""
+    return install_ledger(_load_dataset(user_id, "transactions", store))
+
+def _load_dataset(user_id, data_key, store=None):
+    """
+    Reads one data type for a user (from the SQLite store if given) and returns it ready for app_data.
+    Transactions come back as a LedgerLoad, so they can be read on the I/O worker and installed later.
+    """
+    config = USER_DATA_TYPES[data_key]
+    file_path = resolve_user_data_file(user_id, data_key)
+    is_json = config.get("is_json", False)
+    default_value = {} if config["type"] == dict else []
+    id_field_to_use = config.get("id_field")
+    checkpoint = None # Saved LedgerIndex aggregates, when they match the rows read
+    tail_rows = [] # Rows recorded after the checkpoint
+    journal_count = 0 # Rows replayed from the journal
+
+    source_path = store.db_path if store is not None else file_path
+    logging.info(f"Attempting to load '{data_key}' from {source_path} (Expected type: {config['type']}, ID Field: {id_field_to_use})")
+
+    if store is not None:
+        loaded_data = store.load(data_key)
+        if data_key == "settings": loaded_data.setdefault("theme", "dark")
+        if data_key == "transactions": checkpoint, tail_rows = load_store_checkpoint(store)
+        logging.info(f"  Loaded '{data_key}' from SQLite. Length: {len(loaded_data)}")
+    elif is_json:
+        loaded_data = _load_json_data(file_path, default_value=default_value)
+        if data_key == "settings":
+            loaded_data.setdefault("theme", "dark") # Ensure default theme if missing
+        logging.info(f"  Loaded JSON data for '{data_key}'.")
+    else: # CSV
+        loaded_data = load_transaction_snapshot(user_id) if data_key == "transactions" else None
+        if loaded_data is None:
             loaded_data = _load_csv_data(
                 file_path,
                 config["fields"],
                 id_field=id_field_to_use,
-                numeric_fields=config.get("numeric_fields", [])
+                money_fields=config.get("money_fields", [])
             )
-            app_data[data_key] = loaded_data
-            logging.info(f"  Loaded CSV data for '{data_key}'. Result type: {type(loaded_data)}, Length: {len(loaded_data) if hasattr(loaded_data, '__len__') else 'N/A'}")
+        logging.info(f"  Loaded CSV data for '{data_key}'. Result type: {type(loaded_data)}, Length: {len(loaded_data) if hasattr(loaded_data, '__len__') else 'N/A'}")
+
+        # Replay rows appended to the journal since the last compaction
+        if data_key in JOURNAL_FIELDS:
+            journal_rows = _load_journal_rows(user_id, data_key, money_fields=config.get("money_fields", []))
+            journal_count = len(journal_rows)
+            if data_key == "transactions":
+                checkpoint, tail_rows = load_ledger_checkpoint(user_id, len(loaded_data)), journal_rows
+            if journal_rows:
+                loaded_data.extend(journal_rows)
+                logging.info(f"  Replayed {len(journal_rows)} journal rows for '{data_key}'.")
+
+    # Post-Load Handling & Defaults
+    if data_key == "wallets" and not loaded_data:
+         logging.info(f"No wallets loaded for user {user_id}. Creating default 'Cash' wallet.")
+         wallet_id = get_unique_id("wallet")
+         if not isinstance(loaded_data, dict): loaded_data = {}
+         loaded_data[wallet_id] = {"wallet_id": wallet_id, "name": "Cash", "balance": 0, "opening_balance": 0}
+         dirty_data.mark("wallets") # Persist the new wallet so its ID stays stable
+    elif data_key == "transactions":
+        if not isinstance(loaded_data, list): loaded_data = []
+        base_rows = len(loaded_data)
+        needs_rewrite = assign_transaction_ids(loaded_data) > 0 # Persist the new IDs (and drop replaced rows) on the next save
+        if len(loaded_data) != base_rows: checkpoint = None # It counted the replaced rows too
+        prepare_ledger(loaded_data)
+        index = LedgerIndex()
+        if checkpoint is not None:
+            try:
+                index.restore(checkpoint, tail_rows) # Only the rows after the checkpoint are folded in
+                logging.info(f"Aggregate index restored from the saved checkpoint plus {len(tail_rows)} newer rows.")
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                logging.warning(f"Could not read the saved ledger checkpoint: {e}. Rebuilding the aggregates.")
+                checkpoint = None
+        if checkpoint is None:
+            index.rebuild(loaded_data)
+            logging.info("Aggregate index rebuilt from the whole ledger.")
+        loaded_data = LedgerLoad(loaded_data, index, journal_count)
+        loaded_data.needs_rewrite = needs_rewrite
+        loaded_data.needs_checkpoint = store is not None and checkpoint is None and bool(loaded_data.rows) # Saves a fresh one; the rows stay put
+    elif data_key == "activity_log":
+        journal_row_counts[data_key] = journal_count
+        # Rows beyond the newest MAX_ACTIVITY_LOG_SIZE were archived when log_activity evicted them
+        loaded_data = new_activity_log(loaded_data if isinstance(loaded_data, list) else ())
+    return loaded_data
+
+def load_user_data(user_id, lazy=True):
+    """
+    Prepares app_data for the specified user_id. With lazy=True each data type is
+    only read on first access (see LazyAppData); lazy=False reads everything now.
+    """
+    logging.info(f"Loading data for user: {user_id}")
+    app_data["current_user_id"] = user_id
 
-        # Post-Load Handling & Defaults
-        if data_key == "wallets" and not app_data[data_key]:
-             logging.info(f"No wallets loaded for user {user_id}. Creating default 'Cash' wallet.")
-             wallet_id = get_unique_id("wallet")
-             if not isinstance(app_data[data_key], dict): app_data[data_key] = {}
-             app_data[data_key][wallet_id] = {"wallet_id": wallet_id, "name": "Cash", "balance": 0.0}
+    store = get_user_store(user_id)
+    from_store = store is not None and store.is_migrated()
+    lazy = lazy and (store is None or from_store) # The first sqlite run imports everything up front
+
+    compaction_requested.clear()
+    dirty_data.clear()
+    ledger_index.clear() # Replaced when the transactions dataset is installed
+    if store is None:
+        get_manifest(user_id, reload=True) # Every dataset is read from the last committed save generation
+        cleanup_user_files(user_id)
+        if os.path.exists(get_activity_archive_path(user_id)): _repair_journal_tail(get_activity_archive_path(user_id))
+    for data_key in USER_DATA_TYPES:
+        if data_key == "transactions": loader = functools.partial(_load_ledger, user_id, store if from_store else None)
+        else: loader = functools.partial(_load_dataset, user_id, data_key, store if from_store else None)
+        if lazy: app_data.register_loader(data_key, loader)
+        else: app_data[data_key] = loader()
 
     # Ensure Categories are Loaded (Global/Shared Structure)
     core_categories = BASE_CATEGORIES
     app_data["categories"] = core_categories
     logging.info("Global categories loaded/reset.")
 
-    logging.info(f"Data loading finished for user: {user_id}")
+    entity_names.rebuild() # Reads the (small) wallets, budgets and goals datasets
+
+    if store is not None and not from_store:
+        store.migrate_from_app_data() # First sqlite run: import the flat files (left in place as a backup)
+
+    logging.info(f"Data loading {'deferred' if lazy else 'finished'} for user: {user_id}")
 
 # --- Data Saving Helpers ---
 def _save_json_data(file_path, data):
     """Saves data to a JSON file."""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
+        write_file_atomically(file_path, lambda f: json.dump(data, f, indent=4))
         return True
     except (IOError, TypeError) as e:
         logging.error(f"Error saving JSON data to {file_path}: {e}")
@@ -458,8 +2353,8 @@ def _save_json_data(file_path, data):
         logging.exception(f"Unexpected error saving JSON {file_path}: {e}")
         return False
 
-def _save_csv_data(file_path, data, fields):
-    """Saves list or dictionary data to a CSV file."""
+def _save_csv_data(file_path, data, fields, money_fields=()):
+    """Saves list or dictionary data to a CSV file, writing money fields (integer centavos) as decimal pesos."""
     logging.debug(f"Executing _save_csv_data for: {file_path}")
     logging.debug(f"  Data type received: {type(data)}")
     if hasattr(data, '__len__'): logging.debug(f"  Data length: {len(data)}")
@@ -506,14 +2401,15 @@ def _save_csv_data(file_path, data, fields):
             return False
 
         # Writing the data
-        with open(file_path, mode='w', newline='', encoding='utf-8') as csvfile:
+        def write_rows(csvfile):
             writer = csv.DictWriter(csvfile, fieldnames=fields, extrasaction='ignore', restval='')
             writer.writeheader()
-            if not list_to_save:
-                logging.info(f"  No data rows to write for {file_path}. Only header written.")
-            else:
-                writer.writerows(list_to_save)
-                logging.debug(f"  Successfully wrote {len(list_to_save)} rows to {file_path}.")
+            writer.writerows(money_rows(list_to_save, money_fields))
+        write_file_atomically(file_path, write_rows)
+        if not list_to_save:
+            logging.info(f"  No data rows to write for {file_path}. Only header written.")
+        else:
+            logging.debug(f"  Successfully wrote {len(list_to_save)} rows to {file_path}.")
         return True
 
     except (IOError, csv.Error, TypeError, KeyError) as e:
@@ -523,58 +2419,436 @@ def _save_csv_data(file_path, data, fields):
         logging.exception(f"Unexpected error saving CSV {file_path}: {e}")
         return False
 
-def save_user_data(user_id):
-    """Saves all data for the specified user_id from app_data to files."""
-    if not user_id:
-        logging.error("Cannot save data: No user ID specified.")
-        return
-
-    logging.info(f"Saving data for user: {user_id}")
-    ensure_data_dir()
-
-    data_types_config = {
-        "wallets": {"type": dict, "fields": ['wallet_id', 'name', 'balance']},
-        "budgets": {"type": dict, "fields": ['budget_id', 'name', 'allocated', 'cycle']},
-        "goals": {"type": dict, "fields": ['goal_id', 'name', 'target', 'saved', 'due_date']},
-        "transactions": {"type": list, "fields": ['date', 'time', 'timestamp', 'title', 'wallet', 'amount', 'category', 'type', 'from_account', 'to_account', 'linked_budget', 'linked_goal']},
-        "activity_log": {"type": list, "fields": ['timestamp', 'action']},
-        "settings": {"type": dict, "is_json": True},
-    }
+def _copy_dataset(data):
+    """Copies a dataset just deeply enough that later edits on the Tk thread do not leak into a background save."""
+    if isinstance(data, dict):
+        return {key: dict(value) if isinstance(value, dict) else value for key, value in data.items()}
+    if isinstance(data, (list, collections.deque)):
+        return list(data) # Recorded rows are never edited in place (renames and deletes swap in copies), so they are shared
+    return data
 
-    save_success = True
-    for data_key, config in data_types_config.items():
-        file_path = get_user_data_file_path(user_id, data_key)
-        is_json = config.get("is_json", False)
+class SaveSnapshot(dict):
+    """Datasets to write (data_key -> copy), plus the sealed journals whose rows they hold and derived files."""
+    def __init__(self):
+        super().__init__()
+        self.folded_journals = []
+        self.checkpoint = None # LedgerIndex.checkpoint() matching the transactions copy
+        self.store_state = None # SQLite: the transactions_state() the checkpoint covers (None: the rows written)
+
+    def __bool__(self):
+        return len(self) > 0 or self.checkpoint is not None # A SQLite checkpoint alone is still worth a write
+
+def snapshot_user_data(user_id, compact=False, only_dirty=False):
+    """
+    Runs on the Tk thread: copies every dataset that needs writing and seals the
+    journals of the journaled ones being rewritten. Journaled data (transactions,
+    activity log) is only rewritten once its journal reaches JOURNAL_COMPACTION_THRESHOLD
+    rows, or when compact=True. With the sqlite backend those rows are inserted as they
+    are recorded and only rewritten on request. only_dirty=True limits the save to
+    datasets marked in dirty_data; either way the dirty flags are cleared.
+    """
+    store = get_user_store(user_id)
+    dirty = dirty_data.take()
+    snapshot = SaveSnapshot()
+    for data_key in USER_DATA_TYPES:
+        file_path = store.db_path if store is not None else resolve_user_data_file(user_id, data_key)
+        if only_dirty and data_key not in dirty and data_key not in compaction_requested and not compact:
+            continue
+        if not app_data.is_loaded(data_key):
+            logging.info(f"'{data_key}' was not loaded this session. Skipping save for {file_path}.")
+            continue
         data_to_save = app_data.get(data_key)
-
         if data_to_save is None:
             logging.warning(f"No data found in app_data for '{data_key}'. Skipping save for {file_path}.")
             continue
-        else:
-            data_type_info = type(data_to_save)
-            data_len_info = f" (Length: {len(data_to_save)})" if hasattr(data_to_save, '__len__') else ""
-            logging.info(f"Attempting to save '{data_key}' (Type: {data_type_info}{data_len_info}) to {file_path}")
-
-        success = False
-        if is_json:
-            success = _save_json_data(file_path, data_to_save)
-        else: # CSV
-            csv_fields = config.get("fields")
-            if not csv_fields:
-                 logging.error(f"Missing 'fields' configuration for CSV data key '{data_key}'. Cannot save.")
-                 success = False
-            else:
-                 success = _save_csv_data(file_path, data_to_save, csv_fields)
 
-        if not success:
-            save_success = False
-        else:
-            logging.info(f"Successfully saved '{data_key}' to '{file_path}'.")
+        if data_key in JOURNAL_FIELDS and not compact and data_key not in compaction_requested \
+                and (store is not None or (os.path.exists(file_path)
+                     and journal_row_counts.get(data_key, 0) < JOURNAL_COMPACTION_THRESHOLD
+                     and not (data_key == "transactions" and USE_BINARY_SNAPSHOTS and not snapshot_is_current(user_id)))):
+            logging.info(f"Skipping rewrite of '{data_key}': {journal_row_counts.get(data_key, 0)} rows already durable in journal.")
+            continue
 
-    if save_success:
-        logging.info(f"Data saving finished successfully for user: {user_id}")
+        if data_key in JOURNAL_FIELDS and store is None:
+            sealed = rotate_journal(user_id, data_key)
+            if sealed is None:
+                compaction_requested.add(data_key)
+                dirty_data.mark(data_key)
+                continue
+            snapshot.folded_journals += sealed
+        compaction_requested.discard(data_key)
+        if data_key == "transactions": ledger_index.compact() # Deleted rows are left out of the rewrite
+        snapshot[data_key] = _copy_dataset(data_to_save)
+        if data_key == "transactions" and store is None: snapshot.checkpoint = ledger_index.checkpoint()
+    if store is not None and app_data.is_loaded("transactions") and ("transactions" in dirty or "transactions" in snapshot):
+        # Rows are inserted as they are recorded, so the running totals cover the table as it stands now
+        snapshot.checkpoint = ledger_index.checkpoint()
+        if "transactions" not in snapshot: snapshot.store_state = store.transactions_state()
+    return snapshot
+
+def write_user_data(user_id, snapshot):
+    """
+    Writes datasets captured by snapshot_user_data() as one batch. Safe to run on the I/O worker.
+    Flat files are written as a new save generation and only become visible when the manifest
+    is replaced, so a crash or failed write leaves the previous generation intact.
+    """
+    if not snapshot:
+        logging.info(f"Nothing to save for user: {user_id}")
+        return True
+    logging.info(f"Saving data for user: {user_id}")
+    ensure_data_dir()
+
+    store = get_user_store(user_id)
+    for data_key, data_to_save in snapshot.items():
+        data_len_info = f" (Length: {len(data_to_save)})" if hasattr(data_to_save, '__len__') else ""
+        logging.info(f"Attempting to save '{data_key}' (Type: {type(data_to_save)}{data_len_info})")
+
+    written_files = {}
+    if store is not None:
+        with store.lock: # No insert may land between the rewrite and the checkpoint taken after it
+            save_success = store.replace_many(snapshot) if len(snapshot) else True
+            if save_success and snapshot.checkpoint is not None:
+                save_success = store.save_checkpoint(snapshot.checkpoint, snapshot.store_state)
     else:
-        logging.error(f"Data saving process encountered errors for user: {user_id}. Some data might not be saved.")
+        generation = get_manifest(user_id)["generation"] + 1
+        save_success = True
+        for data_key, data_to_save in snapshot.items():
+            config = USER_DATA_TYPES[data_key]
+            file_path = get_generation_file_path(user_id, data_key, generation)
+            if config.get("is_json", False):
+                save_success = _save_json_data(file_path, data_to_save)
+            else: # CSV
+                save_success = _save_csv_data(file_path, data_to_save, config["fields"], config.get("money_fields", ()))
+            if not save_success: break
+            written_files[data_key] = file_path
+
+        if save_success and snapshot.checkpoint is not None:
+            # Wallet sums are taken from the rows written, not from the running totals
+            running_totals, wallet_sums = snapshot.checkpoint["wallets"], ledger_wallet_sums(snapshot["transactions"])
+            for wallet_name in set(wallet_sums) | set(running_totals):
+                if wallet_sums.get(wallet_name, 0) != running_totals.get(wallet_name, 0):
+                    logging.warning(f"Running total for wallet '{wallet_name}' differs from its ledger sum "
+                                    f"({money_text(running_totals.get(wallet_name, 0))} vs {money_text(wallet_sums.get(wallet_name, 0))}); run the verify command.")
+            file_path = get_generation_file_path(user_id, "checkpoint", generation)
+            save_success = _save_json_data(file_path, dict(snapshot.checkpoint, wallets=wallet_sums, rows=len(snapshot["transactions"]),
+                                                           source=os.path.basename(written_files["transactions"]), units=MONEY_UNITS))
+            if save_success: written_files["checkpoint"] = file_path
+
+        superseded = []
+        if save_success:
+            try:
+                superseded = commit_manifest(user_id, written_files, snapshot.folded_journals)
+            except OSError as e:
+                logging.error(f"Could not commit save manifest for user {user_id}: {e}")
+                save_success = False
+        if not save_success:
+            remove_files(written_files.values()) # Never referenced by a manifest
+
+    if not save_success:
+        logging.error(f"Data saving failed for user: {user_id}. The previous save is still intact; retrying on the next save.")
+        if snapshot.checkpoint is not None: dirty_data.mark("transactions") # Also retries a SQLite checkpoint
+        for data_key in snapshot:
+            dirty_data.mark(data_key) # Retry on the next autosave
+            if data_key in JOURNAL_FIELDS:
+                compaction_requested.add(data_key) # Sealed journal rows stay on disk until a rewrite commits
+        return False
+
+    if store is None:
+        if "transactions" in written_files and USE_BINARY_SNAPSHOTS:
+            write_transaction_snapshot(user_id, snapshot["transactions"])
+        superseded += [os.path.splitext(path)[0] + ".snap" for path in superseded]
+        remove_files(superseded + snapshot.folded_journals)
+        logging.info(f"Committed save generation {get_manifest(user_id)['generation']} ({', '.join(snapshot)}) for user: {user_id}")
+    logging.info(f"Data saving finished successfully for user: {user_id}")
+    return True
+
+def save_user_data(user_id, compact=False):
+    """Saves all data for the specified user_id on the calling thread (see snapshot_user_data for what is written)."""
+    if not user_id:
+        logging.error("Cannot save data: No user ID specified.")
+        return False
+    return write_user_data(user_id, snapshot_user_data(user_id, compact))
+
+# --- Statement Import ---
+# Header names (lower-case) recognised in bank statement CSVs, per transaction field
+STATEMENT_COLUMN_ALIASES = {
+    "date": ("date", "transaction date", "posted date", "posting date", "value date", "booking date"),
+    "time": ("time", "transaction time"),
+    "title": ("description", "title", "payee", "name", "details", "narrative", "memo", "particulars"),
+    "amount": ("amount", "transaction amount", "value"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out", "paid out"),
+    "credit": ("credit", "deposit", "deposits", "money in", "paid in"),
+    "category": ("category",),
+}
+STATEMENT_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%b %d, %Y", "%Y%m%d")
+# Description keywords -> category name, tried when the statement has no usable category column
+IMPORT_CATEGORY_KEYWORDS = {
+    "Groceries": ("grocery", "supermarket", "market", "mart"),
+    "Dining": ("restaurant", "cafe", "coffee", "food", "pizza", "burger"),
+    "Transportation": ("uber", "grab", "taxi", "fuel", "gas station", "parking", "transit", "toll"),
+    "Utilities": ("electric", "water", "power", "utility"),
+    "Internet": ("internet", "broadband", "wifi", "fiber"),
+    "Subscriptions": ("netflix", "spotify", "subscription", "youtube"),
+    "Shopping": ("amazon", "lazada", "shopee", "store", "mall"),
+    "Healthcare": ("pharmacy", "clinic", "hospital", "drug"),
+    "Rent/Mortgage": ("rent", "mortgage"),
+    "Salary": ("salary", "payroll", "wage"),
+    "Investment": ("dividend", "interest"),
+    "Refunds": ("refund", "reversal"),
+}
+
+def _parse_statement_amount(text):
+    """Parses '1,234.50', '-12', '(12.00)' or '$12.00' into integer centavos (raises ValueError)."""
+    text = (text or "").strip()
+    negative = text.startswith("(") and text.endswith(")")
+    cleaned = re.sub(r"[^0-9.\-]", "", text)
+    if not cleaned: raise ValueError(f"no amount in '{text}'")
+    amount = parse_money(cleaned)
+    return -abs(amount) if negative else amount
+
+def _statement_date_parser(date_format=None):
+    """Returns a cached date-string -> (date, time or None) parser trying date_format or the common statement formats."""
+    formats = (date_format,) if date_format else STATEMENT_DATE_FORMATS
+    @functools.lru_cache(maxsize=4096) # Statements repeat the same dates many times
+    def parse(text):
+        text = text.strip()
+        try:
+            moment = datetime.datetime.fromisoformat(text)
+            return moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M") if " " in text or "T" in text else None
+        except ValueError:
+            pass
+        for fmt in formats:
+            try: return datetime.datetime.strptime(text, fmt).strftime("%Y-%m-%d"), None
+            except ValueError: continue
+        raise ValueError(f"unrecognised date '{text}'")
+    return parse
+
+def iter_statement_csv(file_path, column_map=None, date_format=None):
+    """
+    Streams a bank statement CSV as (line_number, row) pairs, row being a dict with date,
+    time, title, amount and category (None where absent), or an error string for bad rows.
+    column_map overrides the detected header for any field (field -> header name).
+    """
+    parse_date = _statement_date_parser(date_format)
+    with open(file_path, mode='r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        columns = {}
+        for field, aliases in STATEMENT_COLUMN_ALIASES.items():
+            wanted = [(column_map or {}).get(field, "").strip().lower()] if (column_map or {}).get(field) else aliases
+            columns[field] = next((header.index(name) for name in wanted if name in header), None)
+        if columns["date"] is None or (columns["amount"] is None and columns["debit"] is None and columns["credit"] is None):
+            raise ValueError(f"'{os.path.basename(file_path)}' needs a date column and an amount (or debit/credit) column.")
+        cell = lambda row, field: row[columns[field]] if columns[field] is not None and columns[field] < len(row) else ""
+        for line_number, row in enumerate(reader, 2):
+            if not any(value.strip() for value in row): continue
+            try:
+                date_str, time_str = parse_date(cell(row, "date"))
+                if columns["amount"] is not None:
+                    amount = _parse_statement_amount(cell(row, "amount"))
+                else:
+                    credit, debit = cell(row, "credit").strip(), cell(row, "debit").strip()
+                    amount = (abs(_parse_statement_amount(credit)) if credit else 0) - (abs(_parse_statement_amount(debit)) if debit else 0)
+                yield line_number, {"date": date_str, "time": cell(row, "time").strip()[:5] or time_str, "title": cell(row, "title").strip(),
+                                    "amount": amount, "category": cell(row, "category").strip() or None}
+            except ValueError as e:
+                yield line_number, f"line {line_number}: {e}"
+
+def iter_statement_ofx(file_path):
+    """Streams the <STMTTRN> records of an OFX file (SGML or XML flavour) like iter_statement_csv()."""
+    tag_pattern = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+    record, record_line = None, 0
+    with open(file_path, mode='r', encoding='utf-8', errors='replace') as f:
+        for line_number, line in enumerate(f, 1):
+            for closing, tag, value in tag_pattern.findall(line):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    if closing and record is not None:
+                        yield record_line, _ofx_record_to_row(record, record_line)
+                        record = None
+                    elif not closing:
+                        record, record_line = {}, line_number
+                elif record is not None and not closing:
+                    record[tag] = value.strip()
+
+def _ofx_record_to_row(record, line_number):
+    try:
+        posted = record.get("DTPOSTED", "")
+        date_str = datetime.datetime.strptime(posted[:8], "%Y%m%d").strftime("%Y-%m-%d")
+        time_str = f"{posted[8:10]}:{posted[10:12]}" if len(posted) >= 12 and posted[8:12].isdigit() else None
+        amount = _parse_statement_amount(record.get("TRNAMT"))
+        title = record.get("NAME") or record.get("MEMO") or record.get("TRNTYPE", "")
+        return {"date": date_str, "time": time_str, "title": title, "amount": amount, "category": None}
+    except ValueError as e:
+        return f"line {line_number}: {e}"
+
+class StatementImport:
+    """
+    Turns statement rows into transactions for one wallet and records them in batches:
+    the ledger, journal, wallet balance and activity log are each updated once per batch.
+    """
+
+    def __init__(self, wallet_name, batch_size=IMPORT_BATCH_SIZE, skip_duplicates=True):
+        if entity_names.find_id("wallets", wallet_name) is None:
+            raise ValueError(f"Wallet '{wallet_name}' does not exist.")
+        self.wallet_name = wallet_name
+        self.batch_size = max(1, batch_size)
+        self.skip_duplicates = skip_duplicates
+        self.imported = 0
+        self.errors = [] # "line N: reason" for every rejected row
+        self.duplicates = 0 # Rows skipped because the ledger already holds them
+        self.near_duplicates = [] # "line N: ..." for imported rows close to an existing one
+        self.batches = 0
+        self._duplicate_index = ledger_index.duplicates()
+        self._baseline_counts = {} # Content key -> ledger rows with it before this import
+        self._seen_counts = {}     # Content key -> statement rows with it so far
+        # Case-insensitive category lookups: (type, folded name) -> category name
+        self.category_names = {(details.get("type"), str(details.get("name", "")).lower()): details.get("name")
+                               for details in app_data.get("categories", {}).values() if isinstance(details, dict)}
+
+    def resolve_category(self, category, title, tx_type):
+        """Maps a statement category (or, failing that, description keywords) onto an existing category name."""
+        if category:
+            name = self.category_names.get((tx_type, category.lower()))
+            if name: return name
+        folded_title = title.lower()
+        for name, keywords in IMPORT_CATEGORY_KEYWORDS.items():
+            if (tx_type, name.lower()) in self.category_names and any(keyword in folded_title for keyword in keywords):
+                return name
+        return self.category_names.get((tx_type, "other"), "Other")
+
+    def to_transaction(self, row):
+        """Builds a transaction dict shaped like AddTransactionDialog creates them. Raises ValueError for unusable rows."""
+        amount = row["amount"]
+        if amount == 0: raise ValueError("amount is zero")
+        tx_type = "expense" if amount < 0 else "income"
+        title = row["title"] or ("Imported expense" if tx_type == "expense" else "Imported income")
+        time_str = row["time"] or "00:00"
+        return {
+            "date": row["date"], "time": time_str, "timestamp": f"{row['date']} {time_str}",
+            "title": title, "wallet": self.wallet_name, "amount": amount,
+            "category": self.resolve_category(row["category"], title, tx_type), "type": tx_type,
+            "from_account": None, "to_account": None, "linked_budget": None, "linked_goal": None,
+        }
+
+    def is_duplicate(self, tx):
+        """
+        Checks a statement row against the ledger as it was before the import. Repeated rows are
+        only duplicates up to the number of copies the ledger already had, so re-importing a
+        statement skips all of it while legitimately repeated purchases still import once.
+        """
+        key = DuplicateIndex.content_key(tx)
+        if key is None: return False
+        if key not in self._baseline_counts: self._baseline_counts[key] = self._duplicate_index.count(tx)
+        seen = self._seen_counts.get(key, 0)
+        self._seen_counts[key] = seen + 1
+        return seen < self._baseline_counts[key]
+
+    def batches_from(self, parsed_rows):
+        """Yields lists of up to batch_size transactions, recording rejected and duplicate rows."""
+        batch = []
+        for line_number, row in parsed_rows:
+            if isinstance(row, str): self.errors.append(row); continue
+            try: tx = self.to_transaction(row)
+            except ValueError as e: self.errors.append(f"line {line_number}: {e}"); continue
+            tx["_ts"] = parse_transaction_timestamp(tx)
+            if self.is_duplicate(tx):
+                if self.skip_duplicates: self.duplicates += 1; continue
+            elif self._duplicate_index.has_near_duplicate(tx):
+                self.near_duplicates.append(f"line {line_number}: {tx['title']} {format_currency(tx['amount'])} on {tx['date']}")
+            batch.append(tx)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch: yield batch
+
+    def record_batch(self, batch, source_name=""):
+        """Records one batch: ledger + journal (which also updates the wallet balance), then one activity entry."""
+        record_transactions(batch)
+        self.imported += len(batch); self.batches += 1
+        log_activity(f"Imported {len(batch)} transactions into {self.wallet_name}" + (f" from {source_name}" if source_name else ""))
+
+def parse_statement_file(file_path, column_map=None, date_format=None):
+    """Returns the (line_number, row) pairs of a CSV or OFX/QFX statement. Safe to run on the I/O worker."""
+    if os.path.splitext(file_path)[1].lower() in (".ofx", ".qfx"):
+        return list(iter_statement_ofx(file_path))
+    return list(iter_statement_csv(file_path, column_map=column_map, date_format=date_format))
+
+def import_statement(file_path, wallet_name, batch_size=IMPORT_BATCH_SIZE, column_map=None, date_format=None, on_batch=None, skip_duplicates=True):
+    """
+    Headless import of a statement file into wallet_name for the current user. Streams the
+    file and records it in batches, calling on_batch(importer) after each one. Returns the
+    StatementImport with its imported count, row errors and duplicate counts.
+    """
+    importer = StatementImport(wallet_name, batch_size, skip_duplicates)
+    if os.path.splitext(file_path)[1].lower() in (".ofx", ".qfx"): parsed_rows = iter_statement_ofx(file_path)
+    else: parsed_rows = iter_statement_csv(file_path, column_map=column_map, date_format=date_format)
+    for batch in importer.batches_from(parsed_rows):
+        importer.record_batch(batch, os.path.basename(file_path))
+        if on_batch is not None: on_batch(importer)
+    logging.info(f"Imported {importer.imported} transactions from {file_path} ({len(importer.errors)} rows rejected, "
+                 f"{importer.duplicates} duplicates skipped, {len(importer.near_duplicates)} near-duplicates flagged)")
+    return importer
+
+def run_import_command(argv):
+    """Command-line entry point: ExpenseWise.py import FILE --user USER_ID --wallet NAME."""
+    parser = argparse.ArgumentParser(prog="ExpenseWise.py import", description="Import a bank statement (CSV or OFX) without the GUI.")
+    parser.add_argument("file")
+    parser.add_argument("--user", required=True, help="user ID (see user_profiles.csv)")
+    parser.add_argument("--wallet", required=True, help="name of the wallet to import into")
+    parser.add_argument("--date-format", help="strptime format of the date column, if not auto-detected")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--keep-duplicates", action="store_true", help="import rows the ledger already holds")
+    args = parser.parse_args(argv)
+
+    load_user_profiles_from_csv()
+    if args.user not in app_data.get("user_profiles", {}):
+        print(f"Unknown user ID '{args.user}'.", file=sys.stderr); return 2
+    load_user_data(args.user)
+    try:
+        importer = import_statement(args.file, args.wallet, batch_size=args.batch_size, date_format=args.date_format,
+                                    skip_duplicates=not args.keep_duplicates)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"Import failed: {e}", file=sys.stderr); return 1
+    saved = save_user_data(args.user)
+    close_user_store(args.user)
+    print(f"Imported {importer.imported} transactions into '{args.wallet}'; {len(importer.errors)} rows rejected, "
+          f"{importer.duplicates} duplicates skipped.")
+    for error in importer.errors[:20]: print(f"  {error}")
+    if importer.near_duplicates:
+        print(f"{len(importer.near_duplicates)} imported rows are close to an existing transaction (same wallet and amount):")
+        for warning in importer.near_duplicates[:20]: print(f"  {warning}")
+    return 0 if saved else 1
+
+def run_verify_command(argv):
+    """Command-line entry point: ExpenseWise.py verify --user USER_ID [--fix]. Reconciles every wallet against the ledger."""
+    parser = argparse.ArgumentParser(prog="ExpenseWise.py verify", description="Check every wallet balance against the full transaction ledger.")
+    parser.add_argument("--user", required=True, help="user ID (see user_profiles.csv)")
+    parser.add_argument("--fix", action="store_true", help="adopt the ledger sums and save")
+    args = parser.parse_args(argv)
+
+    load_user_profiles_from_csv()
+    if args.user not in app_data.get("user_profiles", {}):
+        print(f"Unknown user ID '{args.user}'.", file=sys.stderr); return 2
+    load_user_data(args.user, lazy=False)
+    report = reconcile_wallets(fix=args.fix)
+    wallets_by_name = {details.get("name"): details for details in app_data.get("wallets", {}).values() if isinstance(details, dict)}
+    mismatched = 0
+    print(f"{'wallet':<24} {'balance':>16} {'running total':>16} {'ledger total':>16}")
+    for name, running_total, ledger_total in report:
+        status = "ok" if running_total == ledger_total else "MISMATCH"
+        if status != "ok": mismatched += 1
+        balance = wallets_by_name.get(name, {}).get("balance")
+        print(f"{name:<24} {format_currency(balance) if balance is not None else '(no wallet)':>16} {format_currency(running_total):>16} {format_currency(ledger_total):>16}  {status}")
+    saved = True
+    if args.fix and mismatched:
+        compaction_requested.add("transactions") # Writes a fresh checkpoint with the transactions file
+        saved = save_user_data(args.user)
+        print(f"Reconciled {mismatched} wallet(s) with the ledger.")
+    elif mismatched:
+        print(f"{mismatched} wallet(s) do not match the ledger; run with --fix to adopt the ledger sums.")
+    close_user_store(args.user)
+    return 0 if saved and (args.fix or not mismatched) else 1
 
 # --- Accounts Page Class (User Profile Selection) ---
 class AccountsPage(tk.Tk):
@@ -584,7 +2858,6 @@ class AccountsPage(tk.Tk):
         self.geometry("800x500")
         self.configure(bg=THEME_DARK["background"])
 
-        load_user_profiles_from_csv()
         self.selected_user_id = None
 
         # Styling
@@ -605,7 +2878,7 @@ class AccountsPage(tk.Tk):
         self.accounts_frame = tk.Frame(self, bg=THEME_DARK["background"])
         self.accounts_frame.grid(row=1, column=0, sticky="n", pady=20)
         self.accounts_frame.grid_columnconfigure(0, weight=1)
-        self.display_user_profiles()
+        self.reload_user_profiles()
         exit_button = ttk.Button(self, text="Exit Application", command=self.exit_app, style="Exit.TButton")
         exit_button.place(relx=0.98, rely=0.95, anchor='se', x=-20, y=-20)
         self.center_window()
@@ -621,6 +2894,12 @@ class AccountsPage(tk.Tk):
         self.geometry(f'{width}x{height}+{x}+{y}')
         self.attributes('-alpha', 1.0)
 
+    def reload_user_profiles(self):
+        """Reads user_profiles.csv on the I/O worker, then redraws the profile icons."""
+        tk.Label(self.accounts_frame, text="Loading profiles…", font=FONT_NORMAL, bg=THEME_DARK["background"], fg=THEME_DARK["disabled"]).pack(pady=10)
+        run_in_background(self, load_user_profiles_from_csv, on_done=lambda _: self.display_user_profiles(),
+                          on_error=lambda e: messagebox.showerror("Error", f"Could not load user profiles.\n{e}", parent=self))
+
     def display_user_profiles(self):
         """Displays user profile icons and names."""
         for widget in self.accounts_frame.winfo_children():
@@ -688,7 +2967,7 @@ class AccountsPage(tk.Tk):
                 new_id = get_unique_id("user")
                 new_profile = {"name": name, "icon_color": random.choice(ACCOUNT_ICON_COLORS)}
                 app_data["user_profiles"][new_id] = new_profile
-                save_user_profiles_to_csv()
+                run_in_background(self, save_user_profiles_to_csv, dict(app_data["user_profiles"]))
                 self.display_user_profiles()
             except ValueError as e: messagebox.showerror("Invalid Input", str(e), parent=self)
             except Exception as e:
@@ -706,8 +2985,8 @@ class AccountsPage(tk.Tk):
         else:
             logging.error(f"Attempted to select non-existent user ID: {user_id}")
             messagebox.showerror("Error", "Selected user profile not found.", parent=self)
-            load_user_profiles_from_csv()
-            self.display_user_profiles()
+            for widget in self.accounts_frame.winfo_children(): widget.destroy()
+            self.reload_user_profiles()
 
     def exit_app(self):
         """Exits the application from the Accounts Page."""
@@ -722,6 +3001,9 @@ class ExpenseWiseApp(tk.Tk):
         super().__init__()
         self.current_user_id = user_id
         self._page_creation_lock = False
+        self._closing = False
+        self._io_jobs = 0 # Background loads/saves in flight
+        self._autosave_future = None
 
         load_user_data(self.current_user_id)
         self.current_theme = app_data.get("settings", {}).get("theme", "dark")
@@ -749,45 +3031,131 @@ class ExpenseWiseApp(tk.Tk):
         self.main_frame.grid_rowconfigure(0, weight=1)
         self.main_frame.grid_columnconfigure(0, weight=1)
         self.current_page_frame = None
+        self.pages = {} # Page name -> cached page frame
 
         # Floating Action Button (FAB)
         self.fab = create_stylish_button(self, "+", self.open_add_transaction_dialog, style="FAB.TButton")
         self.fab.place(relx=0.98, rely=0.95, anchor='se')
 
+        # Progress indicator shown while background loads/saves run
+        self.io_progress = ttk.Progressbar(self, mode="indeterminate", length=120)
+
         # Initial Page
         self.show_page("Home")
         if self.sidebar and self.sidebar.winfo_exists():
             self.sidebar.highlight_button("Home")
+        self.after_idle(self.start_ledger_load) # Home draws from aggregates, so read the ledger once it is up
+        self.after(AUTOSAVE_CHECK_MS, self._autosave_tick)
 
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         logging.info(f"ExpenseWiseApp initialized for user {user_id}.")
 
-    def on_closing(self):
-        """Handles application closing, saving user data."""
+    def run_io(self, func, *args, on_done=None, on_error=None):
+        """Runs load/save work on the I/O worker, showing the progress indicator until it completes."""
+        self._io_jobs += 1
+        if self._io_jobs == 1:
+            self.io_progress.place(relx=0.01, rely=0.99, anchor='sw')
+            self.io_progress.start(15)
+
+        def finish(callback, value):
+            self._io_jobs -= 1
+            if self._io_jobs == 0 and self.io_progress.winfo_exists():
+                self.io_progress.stop()
+                self.io_progress.place_forget()
+            if callback: callback(value)
+
+        def report(error):
+            messagebox.showerror("Background Task Failed", f"A background load/save failed:\n{error}", parent=self)
+
+        return run_in_background(self, func, *args, on_done=lambda result: finish(on_done, result),
+                                 on_error=lambda error: finish(on_error or report, error))
+
+    def start_ledger_load(self):
+        """Reads the transaction ledger on the I/O worker, then installs it and refreshes the visible page on the Tk thread."""
+        if app_data.is_loaded("transactions"): return
+        user_id = self.current_user_id
+        store = get_user_store(user_id)
+        source = store if store is not None and store.is_migrated() else None
+
+        def install(load):
+            if app_data.is_loaded("transactions") or app_data.get("current_user_id") != user_id: return # Superseded
+            app_data["transactions"] = install_ledger(load)
+            self.refresh_current_page()
+
+        def retry(error):
+            logging.error(f"Background ledger load failed; reading it on the Tk thread instead: {error}")
+            try:
+                app_data.ensure_loaded("transactions")
+            except Exception as e:
+                logging.exception("Ledger load failed")
+                messagebox.showerror("Load Error", f"Could not load transactions:\n{e}", parent=self)
+                return
+            self.refresh_current_page()
+
+        self.run_io(_load_dataset, user_id, "transactions", source, on_done=install, on_error=retry)
+
+    def _autosave_tick(self):
+        """Writes the dirty datasets in the background once edits settle (see DirtyTracker.is_due)."""
+        if self._closing: return
+        if dirty_data.is_due() and (self._autosave_future is None or self._autosave_future.done()):
+            snapshot = snapshot_user_data(self.current_user_id, only_dirty=True)
+            if snapshot:
+                logging.info(f"Autosaving {', '.join(snapshot) or 'the ledger checkpoint'} for user {self.current_user_id}")
+                self._autosave_future = run_in_background(self, write_user_data, self.current_user_id, snapshot)
+        self.after(AUTOSAVE_CHECK_MS, self._autosave_tick)
+
+    def on_closing(self, save=True):
+        """Handles application closing: saves user data in the background, then closes once it is on disk."""
+        if self._closing: return
+        self._closing = True
         logging.info(f"Closing application for user {self.current_user_id}...")
-        save_user_data(self.current_user_id)
-        logging.info("User data saved. Exiting main application window.")
-        if hasattr(self, 'sidebar') and self.sidebar and self.sidebar.winfo_exists():
-            self.sidebar.stop_timer()
-        self.destroy()
+        if not save:
+            self._finish_closing()
+            return
+        self._save_before_closing(snapshot_user_data(self.current_user_id, only_dirty=True))
+
+    def _save_before_closing(self, snapshot):
+        """Writes a snapshot on the I/O worker and closes once it is on disk; a failed save asks before anything is dropped."""
+        def done(saved):
+            autosave = self._autosave_future # Ran before this write on the single I/O worker
+            if autosave is not None and (autosave.exception() is not None or autosave.result() is False): saved = False
+            if saved: self._finish_closing()
+            else: self._closing_save_failed("the data files could not be written")
+
+        self.run_io(write_user_data, self.current_user_id, snapshot, on_done=done, on_error=self._closing_save_failed)
+
+    def _closing_save_failed(self, error):
+        """Offers to retry a failed closing save or to quit without saving."""
+        logging.error(f"Saving before closing failed: {error}")
+        if messagebox.askyesno("Save Failed", f"Your latest changes could not be saved:\n{error}\n\n"
+                               "Try saving again? Choose No to quit without saving.", icon='warning', parent=self):
+            self._autosave_future = None
+            self._save_before_closing(snapshot_user_data(self.current_user_id)) # Everything loaded, whatever was marked dirty
+        else:
+            logging.warning(f"Closing without saving for user {self.current_user_id}.")
+            self._finish_closing()
 
     def perform_full_exit(self):
         """Handles saving data and completely exiting the application."""
         logging.info(f"Performing full application exit for user {self.current_user_id}...")
-        save_user_data(self.current_user_id)
-        logging.info("User data saved.")
+        self._full_exit_requested = True # Flag for the main loop; a close already saving will honour it
+        self.on_closing()
+
+    def _finish_closing(self):
+        """Destroys the window once every pending write has finished."""
+        wait_for_io()
+        close_user_store(self.current_user_id)
+        logging.info("Exiting main application window.")
         if hasattr(self, 'sidebar') and self.sidebar and self.sidebar.winfo_exists():
             try:
                 self.sidebar.stop_timer()
             except Exception as e:
                 logging.warning(f"Ignoring error stopping sidebar timer during exit: {e}")
-
-        self._full_exit_requested = True # Flag for the main loop
         try:
             self.destroy()
         except tk.TclError as e:
-            logging.warning(f"TclError during full exit: {e}")
-        logging.info("Full exit procedures initiated.")
+            logging.warning(f"TclError while closing: {e}")
+        if getattr(self, '_full_exit_requested', False): logging.info("Full exit procedures initiated.")
 
     def apply_theme_colors(self):
         """Applies chosen theme colors to global variable."""
@@ -825,7 +3193,7 @@ class ExpenseWiseApp(tk.Tk):
         self.style.configure('FAB.TButton', background=theme_colors["accent"], foreground=theme_colors["button_fg"], font=(FONT_FAMILY, 18, "bold"), padding=10, borderwidth=0, relief=tk.FLAT)
         self.style.map('FAB.TButton', background=[('active', theme_colors["accent_darker"])])
         # Treeview Styling
-        self.style.configure("Treeview", background=theme_colors["card"], foreground=theme_colors["foreground"], fieldbackground=theme_colors["card"], rowheight=25, borderwidth=0, relief=tk.FLAT)
+        self.style.configure("Treeview", background=theme_colors["card"], foreground=theme_colors["foreground"], fieldbackground=theme_colors["card"], rowheight=TRANSACTION_ROW_HEIGHT, borderwidth=0, relief=tk.FLAT)
         self.style.configure("Treeview.Heading", background=theme_colors["treeview_heading_bg"], foreground=theme_colors["foreground"], font=FONT_BOLD, relief="flat", padding=(5, 5))
         self.style.map("Treeview.Heading", background=[('active', theme_colors["accent"])])
         self.style.layout("Treeview", [('Treeview.treearea', {'sticky': 'nswe'})])
@@ -878,6 +3246,7 @@ class ExpenseWiseApp(tk.Tk):
         logging.info(f"Switching theme to: {theme_name}")
         self.current_theme = theme_name
         app_data["settings"]["theme"] = theme_name
+        dirty_data.mark("settings")
         self.apply_theme_colors()
 
         try:
@@ -892,11 +3261,9 @@ class ExpenseWiseApp(tk.Tk):
             self.sidebar = Sidebar(self, self.show_page)
             self.sidebar.grid(row=0, column=0, sticky="nsw")
 
-            self._page_creation_lock = True
-            try:
-                 self.show_page(current_page_name)
-            finally:
-                self._page_creation_lock = False
+            # Cached pages carry the old colors, so rebuild them
+            self.clear_page_cache()
+            self.show_page(current_page_name)
 
             if hasattr(self, 'fab') and self.fab and self.fab.winfo_exists():
                 self.fab.configure(style="FAB.TButton")
@@ -908,33 +3275,33 @@ class ExpenseWiseApp(tk.Tk):
              logging.error(f"TclError during theme switch: {e}")
              messagebox.showwarning("Theme Switch Issue", "An minor error occurred applying the theme.", parent=self)
              try:
-                 self._page_creation_lock = True
+                 self.clear_page_cache()
                  self.show_page("Home")
              except Exception as nested_e:
                   logging.error(f"Failed to recover after theme switch error: {nested_e}")
-             finally:
-                  self._page_creation_lock = False
         except Exception as e:
              logging.exception("Unexpected error during theme switch")
              messagebox.showerror("Theme Switch Error", f"An unexpected error occurred during theme switch:\n{e}", parent=self)
 
     def show_page(self, page_name):
-        """Displays the specified page in the main content area."""
+        """Displays the specified page, re-showing its cached frame when one exists."""
         if self._page_creation_lock:
              logging.warning(f"show_page('{page_name}') called while lock is active. Ignoring.")
              return
 
         logging.info(f"Switching to page: {page_name}")
 
-        # Destroy current page frame
+        # Hide (or, for uncached placeholder pages, destroy) the current page frame
         if self.current_page_frame and self.current_page_frame.winfo_exists():
-            if isinstance(self.current_page_frame, HomePage):
-                self.current_page_frame.unbind_mousewheel()
             try:
-                self.current_page_frame.destroy()
+                self.current_page_frame.on_hide()
+                if self.current_page_frame in self.pages.values():
+                    self.current_page_frame.grid_remove()
+                else:
+                    self.current_page_frame.destroy()
                 self.current_page_frame = None
             except tk.TclError as e:
-                 logging.warning(f"TclError destroying previous page frame: {e}")
+                 logging.warning(f"TclError hiding previous page frame: {e}")
 
         # Map page names to their classes
         page_mapping = {
@@ -944,16 +3311,31 @@ class ExpenseWiseApp(tk.Tk):
             "Goals": GoalsPage,
             "Wallets": WalletsPage,
             "All Spending": AllSpendingPage,
+            "Charts": ChartsPage,
             "Activity Log": ActivityLogPage,
             "Settings": SettingsPage
         }
 
         page_class = page_mapping.get(page_name)
-        page = None
+        page = self.pages.get(page_name)
 
-        if page_class:
+        if page is not None and page.winfo_exists():
+            try:
+                page.refresh()
+                page.grid()
+                page.on_show()
+                self.current_page_frame = page
+            except Exception:
+                logging.exception(f"Error refreshing cached page '{page_name}'. Rebuilding it.")
+                self.pages.pop(page_name, None)
+                try: page.destroy()
+                except tk.TclError: pass
+                page = None
+
+        if self.current_page_frame is None and page_class:
             try:
                  page = page_class(self.main_frame, self)
+                 self.pages[page_name] = page
                  self.current_page_frame = page
                  page.grid(row=0, column=0, sticky="nsew")
             except Exception as e:
@@ -964,7 +3346,7 @@ class ExpenseWiseApp(tk.Tk):
                      self.current_page_frame = page
                      page.grid(row=0, column=0, sticky="nsew")
                 except: pass
-        else:
+        elif self.current_page_frame is None:
             logging.warning(f"Page class not found for '{page_name}'. Showing placeholder.")
             page = PlaceholderPage(self.main_frame, page_name, self)
             self.current_page_frame = page
@@ -974,6 +3356,18 @@ class ExpenseWiseApp(tk.Tk):
              self.sidebar.highlight_button(page_name)
              self.sidebar.current_page_name = page_name
 
+    def clear_page_cache(self):
+        """Destroys every cached page so they are rebuilt (e.g. with new theme colors)."""
+        for page_name, page in list(self.pages.items()):
+            try:
+                if page.winfo_exists():
+                    page.on_hide()
+                    page.destroy()
+            except tk.TclError as e:
+                logging.warning(f"TclError destroying cached page '{page_name}': {e}")
+        self.pages.clear()
+        self.current_page_frame = None
+
     def open_add_transaction_dialog(self):
         """Opens the Add Transaction dialog."""
         dialog = AddTransactionDialog(self)
@@ -985,6 +3379,15 @@ class ExpenseWiseApp(tk.Tk):
         if hasattr(self, 'sidebar') and self.sidebar and self.sidebar.winfo_exists():
              current_page = self.sidebar.get_current_page_name() or "Home"
 
+        page = self.pages.get(current_page)
+        if page is not None and page is self.current_page_frame and page.winfo_exists():
+            try:
+                page.refresh()
+                return
+            except Exception:
+                logging.exception(f"Error refreshing page '{current_page}'. Rebuilding it.")
+                self.clear_page_cache()
+
         if current_page:
              self.show_page(current_page)
         else:
@@ -1008,6 +3411,7 @@ class Sidebar(tk.Frame):
             {"name": "Goals", "type": "page"},
             {"name": "Wallets", "type": "page"},
             {"name": "All Spending", "type": "page"},
+            {"name": "Charts", "type": "page"},
             {"name": "Activity Log", "type": "page"},
             {"name": "Settings", "type": "page"},
         ]
@@ -1085,6 +3489,24 @@ class BasePage(tk.Frame):
         super().__init__(parent, bg=theme_colors["background"])
         self.app = app
 
+    def refresh(self):
+        """Brings a cached page up to date with app_data. Subclasses patch only the widgets that changed."""
+        pass
+
+    def on_show(self):
+        """Called when a cached page is displayed again."""
+        pass
+
+    def on_hide(self):
+        """Called when the page is hidden in favour of another page."""
+        pass
+
+    @staticmethod
+    def patch_widget(widget, **options):
+        """Configures only the widget options whose values actually changed."""
+        changed = {key: value for key, value in options.items() if str(widget.cget(key)) != str(value)}
+        if changed: widget.configure(**changed)
+
 
 # --- Placeholder Page Class ---
 class PlaceholderPage(BasePage):
@@ -1098,6 +3520,7 @@ class HomePage(BasePage):
     def __init__(self, parent, app):
         super().__init__(parent, app)
         self.max_wallets_per_row = 4
+        self.max_cards_per_row = 3
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(0, weight=1)
 
@@ -1184,177 +3607,246 @@ class HomePage(BasePage):
                 self.canvas.yview_scroll(delta, "units")
 
     def create_wallets_section(self, parent_frame, row):
-        """Creates and populates the Wallets summary section."""
+        """Creates the Wallets summary section."""
         wallets_frame = tk.Frame(parent_frame, bg=theme_colors["background"])
         wallets_frame.grid(row=row, column=0, sticky="ew", pady=(0, 20))
         ttk.Label(wallets_frame, text="Wallets", style="Title.TLabel").pack(anchor="w", pady=(0, 10))
-        wallets_grid_frame = tk.Frame(wallets_frame, bg=theme_colors["background"])
-        wallets_grid_frame.pack(fill="x")
+        self.wallets_grid_frame = tk.Frame(wallets_frame, bg=theme_colors["background"])
+        self.wallets_grid_frame.pack(fill="x")
         for i in range(self.max_wallets_per_row):
-            wallets_grid_frame.grid_columnconfigure(i, weight=1, uniform="wallet_col")
+            self.wallets_grid_frame.grid_columnconfigure(i, weight=1, uniform="wallet_col")
+        self.populate_wallets_section(self._sorted_wallets())
+
+    def _sorted_wallets(self):
+        """Returns (wallet_id, details) pairs in display order."""
         user_wallets = app_data.get("wallets", {})
-        if not user_wallets:
+        if not isinstance(user_wallets, dict): return []
+        return sorted(((w_id, details) for w_id, details in user_wallets.items() if isinstance(details, dict)),
+                      key=lambda item: str(item[1].get('name', item[0])).lower())
+
+    def populate_wallets_section(self, sorted_wallets):
+        """Builds one card per wallet, remembering the labels for in-place updates."""
+        wallets_grid_frame = self.wallets_grid_frame
+        for widget in wallets_grid_frame.winfo_children(): widget.destroy()
+        self.wallet_cards = {}
+        self._wallets_layout = self._layout_key(sorted_wallets)
+        if not sorted_wallets:
             ttk.Label(wallets_grid_frame, text="No wallets created yet.", style="Card.TLabel", foreground=theme_colors["disabled"]).grid(row=0, column=0, columnspan=self.max_wallets_per_row, padx=10, pady=5, sticky="w")
-        else:
-            sorted_wallets = sorted(user_wallets.items(), key=lambda item: str(item[1].get('name', item[0])).lower() if isinstance(item[1], dict) else "")
-            grid_row, grid_col = 0, 0
-            for wallet_id, details in sorted_wallets:
-                if not isinstance(details, dict): continue
-                card = create_card_frame(wallets_grid_frame)
-                card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
-                card.grid_columnconfigure(0, weight=1)
-                ttk.Label(card, text=details.get("name", "Unnamed"), style="CardTitle.TLabel").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 0))
-                ttk.Label(card, text=format_currency(details.get('balance', 0.0)), style="Card.TLabel", font=FONT_LARGE).grid(row=1, column=0, sticky="w", padx=10, pady=(0, 10))
-                grid_col += 1
-                if grid_col >= self.max_wallets_per_row: grid_col = 0; grid_row += 1
+            return
+        grid_row, grid_col = 0, 0
+        for wallet_id, details in sorted_wallets:
+            card = create_card_frame(wallets_grid_frame)
+            card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
+            card.grid_columnconfigure(0, weight=1)
+            ttk.Label(card, text=details.get("name", "Unnamed"), style="CardTitle.TLabel").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 0))
+            balance_label = ttk.Label(card, text=format_currency(details.get('balance', 0)), style="Card.TLabel", font=FONT_LARGE)
+            balance_label.grid(row=1, column=0, sticky="w", padx=10, pady=(0, 10))
+            self.wallet_cards[wallet_id] = {"balance": balance_label}
+            grid_col += 1
+            if grid_col >= self.max_wallets_per_row: grid_col = 0; grid_row += 1
 
     def create_budgets_section(self, parent_frame, row):
-        """Creates and populates the Budgets summary section."""
+        """Creates the Budgets summary section."""
         budget_frame = tk.Frame(parent_frame, bg=theme_colors["background"])
         budget_frame.grid(row=row, column=0, sticky="ew", pady=20)
         ttk.Label(budget_frame, text="Budgets", style="Title.TLabel").pack(anchor="w", pady=(0, 10))
-        budget_grid_frame = tk.Frame(budget_frame, bg=theme_colors["background"])
-        budget_grid_frame.pack(fill="x")
-        max_cols = 3
-        for i in range(max_cols):
-            budget_grid_frame.grid_columnconfigure(i, weight=1, uniform="budget_col")
+        self.budget_grid_frame = tk.Frame(budget_frame, bg=theme_colors["background"])
+        self.budget_grid_frame.pack(fill="x")
+        for i in range(self.max_cards_per_row):
+            self.budget_grid_frame.grid_columnconfigure(i, weight=1, uniform="budget_col")
+        self.populate_budgets_section(self._sorted_budgets())
+
+    def _sorted_budgets(self):
+        """Returns (budget_id, details) pairs in display order."""
         user_budgets = app_data.get("budgets", {})
-        if not user_budgets:
+        if not isinstance(user_budgets, dict): return []
+        return sorted(((bud_id, details) for bud_id, details in user_budgets.items() if isinstance(details, dict)),
+                      key=lambda item: str(item[1].get('name', item[0])).lower())
+
+    def _budget_card_values(self, details):
+        """Returns (title, spent_text, progress) for a budget card."""
+        cycle_text = f" ({details.get('cycle', 'N/A')})"
+        budget_name = details.get("name", "Unnamed") + cycle_text
+        allocated = details.get('allocated', 0)
+        if not app_data.is_loaded("transactions"):
+            return budget_name, f"Loading… / {format_currency(allocated)}", 0
+        cycle = details.get('cycle')
+        history = ledger_index.budget_history(details.get("name"), cycle, periods=2) if details.get("name") else [(None, 0)]
+        spent = history[0][1]
+        spent_text = f"{format_currency(spent)} / {format_currency(allocated)}"
+        if len(history) > 1: spent_text += f"  ({PREVIOUS_PERIOD_LABELS[cycle]}: {format_currency(history[1][1])})"
+        progress = (spent / allocated) * 100 if allocated and allocated > 0 else 0
+        return budget_name, spent_text, min(progress, 100)
+
+    def populate_budgets_section(self, sorted_budgets):
+        """Builds one card per budget, remembering its widgets for in-place updates."""
+        budget_grid_frame = self.budget_grid_frame
+        for widget in budget_grid_frame.winfo_children(): widget.destroy()
+        self.budget_cards = {}
+        self._budgets_layout = self._layout_key(sorted_budgets)
+        max_cols = self.max_cards_per_row
+        if not sorted_budgets:
             ttk.Label(budget_grid_frame, text="No budgets created yet. Go to 'Budgets'.", style="Card.TLabel", foreground=theme_colors["disabled"]).grid(row=0, column=0, columnspan=max_cols, padx=10, pady=5, sticky="w")
-        else:
-            sorted_budgets = sorted(user_budgets.items(), key=lambda item: str(item[1].get('name', item[0])).lower() if isinstance(item[1], dict) else "")
-            grid_row, grid_col = 0, 0
-            for bud_id, details in sorted_budgets:
-                if not isinstance(details, dict): continue
-                card = create_card_frame(budget_grid_frame)
-                card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
-                card.grid_columnconfigure(0, weight=1)
-                cycle_text = f" ({details.get('cycle', 'N/A')})"
-                budget_name = details.get("name", "Unnamed") + cycle_text
-                ttk.Label(card, text=budget_name, style="CardTitle.TLabel").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
-                allocated = details.get('allocated', 0.0)
-                spent = self.calculate_budget_spent(details.get("name"))
-                spent_text = f"{format_currency(spent)} / {format_currency(allocated)}"
-                ttk.Label(card, text=spent_text, style="Card.TLabel").grid(row=1, column=0, sticky="w", padx=10)
-                progress = (spent / allocated) * 100 if allocated and allocated > 0 else 0
-                pb = ttk.Progressbar(card, orient="horizontal", length=150, mode="determinate", value=min(progress, 100), style="TProgressbar")
-                pb.grid(row=2, column=0, sticky="ew", padx=10, pady=(5, 10))
-                grid_col += 1
-                if grid_col >= max_cols: grid_col = 0; grid_row += 1
+            return
+        grid_row, grid_col = 0, 0
+        for bud_id, details in sorted_budgets:
+            card = create_card_frame(budget_grid_frame)
+            card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
+            card.grid_columnconfigure(0, weight=1)
+            budget_name, spent_text, progress = self._budget_card_values(details)
+            title_label = ttk.Label(card, text=budget_name, style="CardTitle.TLabel")
+            title_label.grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+            spent_label = ttk.Label(card, text=spent_text, style="Card.TLabel")
+            spent_label.grid(row=1, column=0, sticky="w", padx=10)
+            pb = ttk.Progressbar(card, orient="horizontal", length=150, mode="determinate", value=progress, style="TProgressbar")
+            pb.grid(row=2, column=0, sticky="ew", padx=10, pady=(5, 10))
+            self.budget_cards[bud_id] = {"title": title_label, "spent": spent_label, "progress": pb}
+            grid_col += 1
+            if grid_col >= max_cols: grid_col = 0; grid_row += 1
 
     def create_goals_section(self, parent_frame, row):
-        """Creates and populates the Goals summary section, including linked expenses."""
+        """Creates the Goals summary section, including linked expenses."""
         goals_frame = tk.Frame(parent_frame, bg=theme_colors["background"])
         goals_frame.grid(row=row, column=0, sticky="ew", pady=20)
         ttk.Label(goals_frame, text="Goals", style="Title.TLabel").pack(anchor="w", pady=(0, 10))
-        goals_grid_frame = tk.Frame(goals_frame, bg=theme_colors["background"])
-        goals_grid_frame.pack(fill="x")
-        max_cols = 3
-        for i in range(max_cols):
-            goals_grid_frame.grid_columnconfigure(i, weight=1, uniform="goal_col")
-
+        self.goals_grid_frame = tk.Frame(goals_frame, bg=theme_colors["background"])
+        self.goals_grid_frame.pack(fill="x")
+        for i in range(self.max_cards_per_row):
+            self.goals_grid_frame.grid_columnconfigure(i, weight=1, uniform="goal_col")
+        self.populate_goals_section(self._sorted_goals())
+
+    def _sorted_goals(self):
+        """Returns (goal_id, details) pairs sorted by due date, then alphabetically."""
         user_goals = app_data.get("goals", {})
-        user_transactions = app_data.get("transactions", [])
-        if not isinstance(user_transactions, list): user_transactions = []
-        if not isinstance(user_goals, dict): user_goals = {}
-
-        if not user_goals:
+        if not isinstance(user_goals, dict): return []
+
+        def goal_sort_key(item):
+            details = item[1]
+            due_date_obj = datetime.date.max
+            due_date_str = details.get("due_date")
+            name_str = details.get("name", "").lower()
+            if due_date_str:
+                try:
+                    due_date_obj = datetime.datetime.strptime(due_date_str, "%Y-%m-%d").date()
+                except (ValueError, TypeError):
+                    pass
+            return (due_date_obj, name_str)
+
+        return sorted(((g_id, details) for g_id, details in user_goals.items() if isinstance(details, dict)), key=goal_sort_key)
+
+    def _goal_card_values(self, details):
+        """Returns (title, saved_text, progress, remaining_text) for a goal card."""
+        goal_name = details.get("name", "Unnamed Goal")
+        target = details.get('target', 0)
+        base_saved = details.get('saved', 0)
+
+        # Effective saved amount includes base + linked expenses
+        if not app_data.is_loaded("transactions"):
+            saved_text, progress = f"Loading… / {format_currency(target)}", 0
+        else:
+            linked_expense_contribution = ledger_index.goal_contributions.get(goal_name, 0)
+            effective_saved = base_saved + linked_expense_contribution
+            saved_text = f"{format_currency(effective_saved)} / {format_currency(target)}"
+            progress = (effective_saved / target) * 100 if target and target > 0 else 0
+
+        # Due date logic
+        due_date_str = details.get("due_date")
+        remaining_text = "No Due Date"
+        if due_date_str:
+            try:
+                due_date = datetime.datetime.strptime(due_date_str, "%Y-%m-%d").date()
+                today = datetime.date.today()
+                delta = due_date - today
+                if delta.days == 0:
+                    remaining_text = f"Due Today ({due_date_str})"
+                elif delta.days > 0:
+                    remaining_text = f"{delta.days} days left (Due: {due_date_str})"
+                else:
+                    remaining_text = f"Overdue by {abs(delta.days)} days (Due: {due_date_str})"
+            except (ValueError, TypeError):
+                remaining_text = f"Invalid Due Date ({due_date_str})"
+        return goal_name, saved_text, min(progress, 100.0), remaining_text
+
+    def populate_goals_section(self, sorted_goals):
+        """Builds one card per goal, remembering its widgets for in-place updates."""
+        goals_grid_frame = self.goals_grid_frame
+        for widget in goals_grid_frame.winfo_children(): widget.destroy()
+        self.goal_cards = {}
+        self._goals_layout = self._layout_key(sorted_goals)
+        max_cols = self.max_cards_per_row
+        if not sorted_goals:
             ttk.Label(goals_grid_frame, text="No goals set yet. Go to 'Goals'.", style="Card.TLabel",
                       foreground=theme_colors["disabled"]).grid(row=0, column=0, columnspan=max_cols, padx=10,
                                                                 pady=5, sticky="w")
+            return
+
+        grid_row, grid_col = 0, 0
+        for goal_id, details in sorted_goals:
+            goal_name, saved_text, visual_progress, remaining_text = self._goal_card_values(details)
+
+            card = create_card_frame(goals_grid_frame)
+            card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
+            card.grid_columnconfigure(0, weight=1)
+
+            title_label = ttk.Label(card, text=goal_name, style="CardTitle.TLabel")
+            title_label.grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+            saved_label = ttk.Label(card, text=saved_text, style="Card.TLabel")
+            saved_label.grid(row=1, column=0, sticky="w", padx=10)
+            pb = ttk.Progressbar(card, orient="horizontal", length=200, mode="determinate",
+                                 value=visual_progress, style="TProgressbar")
+            pb.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
+            remaining_label = ttk.Label(card, text=remaining_text, style="Card.TLabel",
+                                        foreground=theme_colors["disabled"])
+            remaining_label.grid(row=3, column=0, sticky="w", padx=10, pady=(0, 10))
+
+            self.goal_cards[goal_id] = {"title": title_label, "saved": saved_label, "progress": pb, "remaining": remaining_label}
+            grid_col += 1
+            if grid_col >= max_cols: grid_col = 0; grid_row += 1
+
+    @staticmethod
+    def _layout_key(sorted_items):
+        """Identifies a section's card layout; cards are rebuilt only when it changes."""
+        return tuple((item_id, details.get("name")) for item_id, details in sorted_items)
+
+    def refresh(self):
+        """Updates card labels and progress bars in place, rebuilding a section only if its cards changed."""
+        sorted_wallets = self._sorted_wallets()
+        if self._layout_key(sorted_wallets) != self._wallets_layout:
+            self.populate_wallets_section(sorted_wallets)
+        else:
+            for wallet_id, details in sorted_wallets:
+                self.patch_widget(self.wallet_cards[wallet_id]["balance"], text=format_currency(details.get('balance', 0)))
+
+        sorted_budgets = self._sorted_budgets()
+        if self._layout_key(sorted_budgets) != self._budgets_layout:
+            self.populate_budgets_section(sorted_budgets)
+        else:
+            for bud_id, details in sorted_budgets:
+                budget_name, spent_text, progress = self._budget_card_values(details)
+                widgets = self.budget_cards[bud_id]
+                self.patch_widget(widgets["title"], text=budget_name)
+                self.patch_widget(widgets["spent"], text=spent_text)
+                self.patch_widget(widgets["progress"], value=progress)
+
+        sorted_goals = self._sorted_goals()
+        if self._layout_key(sorted_goals) != self._goals_layout:
+            self.populate_goals_section(sorted_goals)
         else:
-            def goal_sort_key(item):
-                # Sort by due date, then alphabetically
-                details = item[1]
-                due_date_obj = datetime.date.max
-                name_str = ""
-                if isinstance(details, dict):
-                    due_date_str = details.get("due_date")
-                    name_str = details.get("name", "").lower()
-                    if due_date_str:
-                        try:
-                            due_date_obj = datetime.datetime.strptime(due_date_str, "%Y-%m-%d").date()
-                        except (ValueError, TypeError):
-                            pass
-                return (due_date_obj, name_str)
-
-            sorted_goals = sorted(user_goals.items(), key=goal_sort_key)
-
-            grid_row, grid_col = 0, 0
             for goal_id, details in sorted_goals:
-                if not isinstance(details, dict): continue
-
-                goal_name = details.get("name", "Unnamed Goal")
-                target = details.get('target', 0.0)
-                base_saved = details.get('saved', 0.0)
-
-                # Calculate linked contribution from expenses
-                linked_expense_contribution = 0.0
-                for tx in user_transactions:
-                    if (isinstance(tx, dict) and
-                            tx.get("linked_goal") == goal_name and
-                            tx.get("type") == "expense" and
-                            isinstance(tx.get("amount"), (int, float)) and
-                            tx["amount"] < 0):
-                        linked_expense_contribution += abs(tx["amount"])
-
-                # Effective saved amount includes base + linked expenses
-                effective_saved = base_saved + linked_expense_contribution
-
-                card = create_card_frame(goals_grid_frame)
-                card.grid(row=grid_row, column=grid_col, sticky="nsew", padx=10, pady=5)
-                card.grid_columnconfigure(0, weight=1)
-
-                ttk.Label(card, text=goal_name, style="CardTitle.TLabel").grid(row=0, column=0, sticky="w",
-                                                                               padx=10, pady=(10, 5))
-                saved_text = f"{format_currency(effective_saved)} / {format_currency(target)}"
-                ttk.Label(card, text=saved_text, style="Card.TLabel").grid(row=1, column=0, sticky="w", padx=10)
-
-                progress = (effective_saved / target) * 100 if target and target > 0 else 0
-                visual_progress = min(progress, 100.0)
-                pb = ttk.Progressbar(card, orient="horizontal", length=200, mode="determinate",
-                                     value=visual_progress, style="TProgressbar")
-                pb.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
-
-                # Due date logic
-                due_date_str = details.get("due_date")
-                remaining_text = "No Due Date"
-                if due_date_str:
-                    try:
-                        due_date = datetime.datetime.strptime(due_date_str, "%Y-%m-%d").date()
-                        today = datetime.date.today()
-                        delta = due_date - today
-                        if delta.days == 0:
-                            remaining_text = f"Due Today ({due_date_str})"
-                        elif delta.days > 0:
-                            remaining_text = f"{delta.days} days left (Due: {due_date_str})"
-                        else:
-                            remaining_text = f"Overdue by {abs(delta.days)} days (Due: {due_date_str})"
-                    except (ValueError, TypeError):
-                        remaining_text = f"Invalid Due Date ({due_date_str})"
-
-                ttk.Label(card, text=remaining_text, style="Card.TLabel",
-                          foreground=theme_colors["disabled"]).grid(row=3, column=0, sticky="w", padx=10,
-                                                                    pady=(0, 10))
-
-                grid_col += 1
-                if grid_col >= max_cols: grid_col = 0; grid_row += 1
-
-    def calculate_budget_spent(self, budget_name):
-        """Calculates total spending linked to a specific budget."""
-        if not budget_name: return 0.0
-        total_spent = 0.0
-        user_transactions = app_data.get("transactions", [])
-        if not isinstance(user_transactions, list): return 0.0
-
-        for tx in user_transactions:
-            # Check if it's an expense transaction linked to the budget
-            if (isinstance(tx, dict) and
-                    tx.get("type") == "expense" and
-                    tx.get("linked_budget") == budget_name and
-                    isinstance(tx.get("amount"), (int, float))):
-                total_spent += abs(tx["amount"])
-        return total_spent
+                goal_name, saved_text, visual_progress, remaining_text = self._goal_card_values(details)
+                widgets = self.goal_cards[goal_id]
+                self.patch_widget(widgets["saved"], text=saved_text)
+                self.patch_widget(widgets["progress"], value=visual_progress)
+                self.patch_widget(widgets["remaining"], text=remaining_text)
+
+    def on_show(self):
+        """Re-binds mouse wheel scrolling when the cached page is shown again."""
+        self.unbind_mousewheel()
+        self.bind_mousewheel()
+
+    def on_hide(self):
+        """Releases the global mouse wheel bindings while the page is hidden."""
+        self.unbind_mousewheel()
 
     def destroy(self):
         """Destroys the HomePage instance and unbinds mousewheel events."""
@@ -1363,14 +3855,28 @@ class HomePage(BasePage):
 
 # --- TransactionsPage Class ---
 class TransactionsPage(BasePage):
+    """
+    Transaction list rendered as a virtual window: the Treeview only holds the rows
+    that fit on screen, and scrolling re-fills those rows from the sorted ledger.
+    """
     def __init__(self, parent, app):
         super().__init__(parent, app)
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
+        self.rows = []             # Time-ordered ledger (oldest first)
+        self.offset = 0            # Display position of the first visible row
+        self.visible_rows = 0      # Rows that fit in the Treeview
+        self._row_cache = {}       # Display position -> formatted (values, tag)
+
         control_frame = tk.Frame(self, bg=theme_colors["background"])
         control_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 10))
-        ttk.Label(control_frame, text="Transactions", style="Title.TLabel").pack(side=tk.LEFT, padx=(0, 20))
+        self.title_label = ttk.Label(control_frame, text="Transactions", style="Title.TLabel")
+        self.title_label.pack(side=tk.LEFT, padx=(0, 20))
+        self.import_button = create_stylish_button(control_frame, "Import Statement…", self.import_statement, style="TButton")
+        self.import_button.pack(side=tk.RIGHT)
+        create_stylish_button(control_frame, "Delete", self.delete_selected, style="TButton").pack(side=tk.RIGHT, padx=(0, 10))
+        create_stylish_button(control_frame, "Edit…", self.edit_selected, style="TButton").pack(side=tk.RIGHT, padx=(0, 10))
 
         columns = ("date", "title", "wallet", "category", "amount")
         self.tree = ttk.Treeview(self, columns=columns, show="headings", style="Treeview")
@@ -1385,64 +3891,281 @@ class TransactionsPage(BasePage):
         self.tree.column("category", width=120, anchor=tk.W, stretch=tk.YES)
         self.tree.column("amount", width=100, anchor=tk.E, stretch=tk.NO)
 
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview, style="Vertical.TScrollbar")
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # The scrollbar drives the window offset instead of the Treeview's own view
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar, style="Vertical.TScrollbar")
         self.tree.grid(row=1, column=0, sticky="nsew")
-        scrollbar.grid(row=1, column=1, sticky="ns")
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
 
         self.tree.tag_configure('expense', foreground=theme_colors["red"])
         self.tree.tag_configure('income', foreground=theme_colors["accent"])
         self.tree.tag_configure('transfer', foreground=theme_colors["blue"])
         self.tree.tag_configure('other', foreground=theme_colors["foreground"])
 
+        self.tree.bind("<Configure>", self._on_tree_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", self._on_mousewheel)
+        self.tree.bind("<Button-5>", self._on_mousewheel)
+        self.tree.bind("<Up>", lambda e: self._on_arrow_key(-1))
+        self.tree.bind("<Down>", lambda e: self._on_arrow_key(1))
+        self.tree.bind("<Prior>", lambda e: self._on_scrollbar("scroll", -1, "pages"))
+        self.tree.bind("<Next>", lambda e: self._on_scrollbar("scroll", 1, "pages"))
+        self.tree.bind("<Double-1>", lambda e: self.edit_selected())
+        self.tree.bind("<Delete>", lambda e: self.delete_selected())
+
         self.populate_transactions()
 
-    def populate_transactions(self):
-        """Populates the transaction treeview with user data."""
+    def _selected_transaction(self):
+        """Returns the transaction in the selected Treeview row, or None."""
+        selection = self.tree.selection()
+        pool = self.tree.get_children()
+        if not selection or selection[0] not in pool: return None
+        return self._transaction_at(self.offset + pool.index(selection[0]))
+
+    def _reload_window(self):
+        """Re-renders after rows were edited or deleted, keeping the scroll position."""
+        self._row_cache.clear()
+        self.offset = max(0, min(self.offset, self._row_count() - self.visible_rows))
+        self._render_window()
+
+    def delete_selected(self):
+        """Deletes the selected transaction (both halves of a transfer) and reverses its wallet balance change."""
+        tx = self._selected_transaction()
+        if tx is None:
+            messagebox.showwarning("No Selection", "Select a transaction to delete.", parent=self); return
+        what = "both sides of this transfer" if (tx.get("type") or "").startswith("transfer") else f"'{tx.get('title', '')}'"
+        if not messagebox.askyesno("Delete Transaction", f"Delete {what} ({format_currency(tx.get('amount'))} on {tx.get('date', '')})?\n\n"
+                                   "The wallet balance will be adjusted.", parent=self):
+            return
         try:
-             for item in self.tree.get_children(): self.tree.delete(item)
-        except tk.TclError as e: logging.warning(f"TclError clearing transaction tree: {e}")
+            deleted = delete_transactions([tx["transaction_id"]])
+            log_activity(f"Deleted Transaction: {tx.get('title', '')} ({format_currency(tx.get('amount'))}) from {tx.get('wallet', '')}")
+            logging.info(f"Deleted {len(deleted)} transaction row(s) for ID {tx['transaction_id']}")
+        except Exception as e:
+            logging.exception("Error deleting transaction")
+            messagebox.showerror("Error", f"Could not delete transaction.\n{e}", parent=self)
+        self._reload_window()
+
+    def edit_selected(self):
+        """Edits the selected transaction; date, time and amount changes carry over to a transfer's other half."""
+        tx = self._selected_transaction()
+        if tx is None:
+            messagebox.showwarning("No Selection", "Select a transaction to edit.", parent=self); return
+        tx_type = (tx.get("type") or "").lower()
+        is_transfer = tx_type.startswith("transfer")
+        fields = {}
+        if not is_transfer:
+            fields["title"] = {"label": "Title:", "initial": tx.get("title", "")}
+        fields["amount"] = {"label": "Amount:", "type": "currency", "initial": money_text(abs(tx.get('amount') or 0))}
+        fields["date"] = {"label": "Date (YYYY-MM-DD):", "type": "date", "initial": tx.get("date")}
+        fields["time"] = {"label": "Time (HH:MM):", "initial": (tx.get("time") or "00:00")[:5]}
+        if not is_transfer:
+            wallet_names = sorted(entity_names.by_name["wallets"], key=str.lower)
+            category_names = sorted({cat["name"] for cat in app_data.get("categories", {}).values() if cat.get("type") == tx_type} | {tx.get("category", "")} - {""})
+            fields["wallet"] = {"label": "Wallet:", "type": "combo", "values": wallet_names, "initial": tx.get("wallet")}
+            fields["category"] = {"label": "Category:", "type": "combo", "values": category_names, "initial": tx.get("category")}
+        dialog = SimpleEntryDialog(self, "Edit Transfer" if is_transfer else "Edit Transaction", fields)
+        if not dialog.result: return
+        try:
+            result = dialog.result
+            try: amount = abs(parse_money(result["amount"]))
+            except ValueError: raise ValueError("Invalid amount entered.")
+            if amount <= 0: raise ValueError("Amount must be positive.")
+            try:
+                datetime.datetime.strptime(result["date"], "%Y-%m-%d")
+                datetime.datetime.strptime(result["time"], "%H:%M")
+            except ValueError:
+                raise ValueError("Invalid date or time format (Use YYYY-MM-DD and HH:MM).")
+            changes = {"date": result["date"], "time": result["time"], "amount": amount if (tx.get("amount") or 0) >= 0 else -amount}
+            if not is_transfer:
+                if not result["title"].strip(): raise ValueError("Title cannot be empty.")
+                if entity_names.find_id("wallets", result["wallet"]) is None: raise ValueError(f"Wallet '{result['wallet']}' is invalid.")
+                changes.update(title=result["title"].strip(), wallet=result["wallet"], category=result["category"])
+            if all(tx.get(field) == value for field, value in changes.items()): return
+            update_transaction(tx["transaction_id"], changes)
+            log_activity(f"Edited Transaction: {changes.get('title', tx.get('title', ''))} ({format_currency(changes['amount'])})")
+        except ValueError as e:
+            messagebox.showerror("Invalid Input", str(e), parent=self); return
+        except Exception as e:
+            logging.exception("Error editing transaction")
+            messagebox.showerror("Error", f"Could not edit transaction.\n{e}", parent=self)
+        self._reload_window()
+
+    def import_statement(self):
+        """Imports a CSV/OFX bank statement into a chosen wallet: parsed on the I/O worker, recorded batch by batch."""
+        if not ledger_ready(self): return
+        file_path = filedialog.askopenfilename(parent=self, title="Import Bank Statement",
+                                               filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("All files", "*.*")])
+        if not file_path: return
+        wallet_names = sorted(entity_names.by_name["wallets"], key=str.lower)
+        if not wallet_names:
+            messagebox.showwarning("No Wallets", "Create a wallet to import the statement into first.", parent=self)
+            return
+        dialog = SimpleEntryDialog(self, "Import Statement", {
+            "wallet": {"label": "Into Wallet:", "type": "combo", "values": wallet_names, "required": True, "initial": wallet_names[0]}})
+        if not dialog.result or not dialog.result.get("wallet"): return
+        try:
+            importer = StatementImport(dialog.result["wallet"])
+        except ValueError as e:
+            messagebox.showerror("Import Error", str(e), parent=self); return
+
+        self.import_button.configure(state=tk.DISABLED)
+        def on_error(error):
+            self.import_button.configure(state=tk.NORMAL)
+            messagebox.showerror("Import Error", f"Could not read '{os.path.basename(file_path)}':\n{error}", parent=self)
+        self.app.run_io(parse_statement_file, file_path,
+                        on_done=lambda rows: self._record_import_batches(importer, importer.batches_from(rows), os.path.basename(file_path)),
+                        on_error=on_error)
+
+    def _record_import_batches(self, importer, batches, source_name):
+        """Records one batch per Tk tick so the window stays responsive, refreshing the page once per batch."""
+        batch = next(batches, None)
+        if batch is not None:
+            importer.record_batch(batch, source_name)
+            self.app.refresh_current_page()
+            self.app.after(1, self._record_import_batches, importer, batches, source_name)
+            return
+        if self.winfo_exists(): self.import_button.configure(state=tk.NORMAL)
+        summary = f"Imported {importer.imported} transactions into '{importer.wallet_name}'."
+        if importer.duplicates: summary += f"\nSkipped {importer.duplicates} transactions already in the ledger."
+        if importer.near_duplicates:
+            summary += f"\n{len(importer.near_duplicates)} imported rows look similar to existing ones (same wallet and amount):\n" + "\n".join(importer.near_duplicates[:5])
+        if importer.errors:
+            summary += f"\n\n{len(importer.errors)} rows were skipped:\n" + "\n".join(importer.errors[:10])
+            if len(importer.errors) > 10: summary += "\n…"
+        messagebox.showinfo("Import Finished", summary, parent=self.app)
 
-        user_transactions = app_data.get("transactions", [])
+    def populate_transactions(self):
+        """Points the view at the time-ordered ledger and renders the visible window."""
+        loading = not app_data.is_loaded("transactions")
+        self.patch_widget(self.title_label, text="Transactions (loading…)" if loading else "Transactions")
+        user_transactions = [] if loading else app_data["transactions"]
         if not isinstance(user_transactions, list): user_transactions = []
+        self.rows = user_transactions # Oldest first; displayed in reverse
+        self.offset = 0
+        self._row_cache.clear()
+        self._render_window()
 
-        # Sort transactions by timestamp (most recent first)
-        def sort_key(tx):
-             if not isinstance(tx, dict): return datetime.datetime.min
-             ts_str = tx.get('timestamp'); date_str = tx.get('date')
-             try:
-                 if ts_str:
-                     try: return datetime.datetime.strptime(ts_str, "%Y-%m-%d %H:%M")
-                     except ValueError: return datetime.datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-                 elif date_str: return datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                 else: return datetime.datetime.min
-             except (ValueError, TypeError): return datetime.datetime.min
+    def refresh(self):
+        """Re-renders the visible window; only on-screen rows are reformatted."""
+        self.populate_transactions()
+
+    def _row_count(self):
+        """Returns the number of rows to display (deleted rows awaiting compaction are skipped)."""
+        return ledger_index.live_count() if self._shows_ledger() else len(self.rows)
+
+    def _transaction_at(self, position):
+        """Returns the transaction shown at a display position (0 = most recent)."""
+        index = self._row_count() - 1 - position
+        return self.rows[ledger_index.live_position(index) if self._shows_ledger() else index]
+
+    def _shows_ledger(self):
+        """True when the rows are the live ledger (deleted rows awaiting compaction are skipped), not a stand-in list."""
+        return app_data.is_loaded("transactions") and self.rows is app_data["transactions"]
+
+    def _format_row(self, position):
+        """Returns the Treeview values and tag for a display position, formatting it on first use."""
+        cached = self._row_cache.get(position)
+        if cached is not None: return cached
+        tx = self._transaction_at(position)
         try:
-             valid_transactions = [tx for tx in user_transactions if isinstance(tx, dict)]
-             sorted_transactions = sorted(valid_transactions, key=sort_key, reverse=True)
+            amount = tx.get('amount', 0)
+            amount_str = format_currency(amount)
+            category_name = tx.get("category", "Uncategorized")
+            wallet_name = tx.get("wallet", "N/A")
+            tx_type = tx.get("type", "").lower()
+            tag = 'other'
+            if tx_type == "income" or tx_type == "transfer_in": tag = 'income'
+            elif tx_type == "expense": tag = 'expense'
+            elif tx_type == "transfer_out": tag = 'transfer'
+            elif amount > 0: tag = 'income'
+            elif amount < 0: tag = 'expense'
+            formatted = ((tx.get('date', 'N/A'), tx.get('title', 'N/A'), wallet_name, category_name, amount_str,), tag)
         except Exception as e:
-             logging.exception(f"Error sorting transactions: {e}. Displaying unsorted.")
-             sorted_transactions = valid_transactions
+            logging.error(f"Error formatting transaction row for '{tx.get('title', 'N/A')}': {e}")
+            formatted = (("Error", "Error processing row", "", "", ""), 'expense')
+        self._row_cache[position] = formatted
+        return formatted
+
+    def _render_window(self):
+        """Fills the pooled Treeview rows with the transactions at the current offset."""
+        total = self._row_count()
+        count = max(0, min(self.visible_rows, total - self.offset))
+        try:
+            pool = list(self.tree.get_children())
+            # Grow or shrink the pool of Treeview rows to match the window
+            for i in range(len(pool), count):
+                pool.append(self.tree.insert("", tk.END, iid=f"row{i}"))
+            if len(pool) > count:
+                self.tree.delete(*pool[count:])
+                pool = pool[:count]
+
+            for i, iid in enumerate(pool):
+                values, tag = self._format_row(self.offset + i)
+                self.tree.item(iid, values=values, tags=(tag,))
+        except tk.TclError as e:
+            logging.warning(f"TclError rendering transaction window: {e}")
+
+        # Keep formatted rows for the window plus a buffer on each side; drop the rest
+        keep_start = max(0, self.offset - TRANSACTION_ROW_BUFFER)
+        keep_end = min(total, self.offset + count + TRANSACTION_ROW_BUFFER)
+        if len(self._row_cache) > (keep_end - keep_start):
+            self._row_cache = {pos: row for pos, row in self._row_cache.items() if keep_start <= pos < keep_end}
+        for pos in range(keep_start, keep_end):
+            self._format_row(pos)
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll_to(self, offset):
+        """Moves the window to start at the given display position."""
+        max_offset = max(0, self._row_count() - self.visible_rows)
+        offset = max(0, min(int(offset), max_offset))
+        if offset != self.offset:
+            self.offset = offset
+            self._render_window()
+
+    def _on_scrollbar(self, action, *args):
+        """Translates scrollbar commands into window offsets."""
+        try:
+            if action == "moveto":
+                self._scroll_to(float(args[0]) * self._row_count())
+            elif action == "scroll":
+                step = int(args[0])
+                if len(args) > 1 and args[1] == "pages": step *= max(1, self.visible_rows - 1)
+                self._scroll_to(self.offset + step)
+        except (ValueError, IndexError) as e:
+            logging.warning(f"Ignoring invalid scroll command {action} {args}: {e}")
+        return "break"
 
-        for tx in sorted_transactions:
-            try:
-                amount = tx.get('amount', 0.0)
-                amount_str = format_currency(amount)
-                category_name = tx.get("category", "Uncategorized")
-                wallet_name = tx.get("wallet", "N/A")
-                tx_type = tx.get("type", "").lower()
-                tag = 'other'
-                if tx_type == "income" or tx_type == "transfer_in": tag = 'income'
-                elif tx_type == "expense": tag = 'expense'
-                elif tx_type == "transfer_out": tag = 'transfer'
-                elif amount > 0: tag = 'income'
-                elif amount < 0: tag = 'expense'
-                values = (tx.get('date', 'N/A'), tx.get('title', 'N/A'), wallet_name, category_name, amount_str,)
-                self.tree.insert("", tk.END, values=values, tags=(tag,))
-            except Exception as e:
-                 logging.error(f"Error inserting transaction row for '{tx.get('title', 'N/A')}': {e}")
-                 try: self.tree.insert("", tk.END, values=("Error", "Error processing row", "", "", ""), tags=('expense',))
-                 except: pass
+    def _on_mousewheel(self, event):
+        """Scrolls the window by a few rows per wheel notch."""
+        if event.num == 4 or event.delta > 0: self._scroll_to(self.offset - 3)
+        elif event.num == 5 or event.delta < 0: self._scroll_to(self.offset + 3)
+        return "break"
+
+    def _on_arrow_key(self, direction):
+        """Scrolls the window when keyboard selection moves past its edge."""
+        pool = self.tree.get_children()
+        if not pool: return "break"
+        focused = self.tree.focus()
+        index = pool.index(focused) if focused in pool else 0
+        new_index = index + direction
+        if new_index < 0 or new_index >= len(pool):
+            self._scroll_to(self.offset + direction)
+            new_index = max(0, min(new_index, len(pool) - 1))
+        self.tree.focus(pool[new_index]); self.tree.selection_set(pool[new_index])
+        return "break"
+
+    def _on_tree_configure(self, event=None):
+        """Recomputes how many rows fit when the Treeview is resized."""
+        # One row's worth of height is taken by the headings
+        rows_that_fit = max(1, self.tree.winfo_height() // TRANSACTION_ROW_HEIGHT - 1)
+        if rows_that_fit != self.visible_rows:
+            self.visible_rows = rows_that_fit
+            self.offset = max(0, min(self.offset, self._row_count() - self.visible_rows))
+            self._render_window()
 
 # --- ActivityLogPage Class ---
 class ActivityLogPage(BasePage):
@@ -1452,7 +4175,7 @@ class ActivityLogPage(BasePage):
         self.grid_columnconfigure(0, weight=1)
         ttk.Label(self, text="Activity Log", style="Title.TLabel").grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 15))
         columns = ("timestamp", "action")
-        tree = ttk.Treeview(self, columns=columns, show="headings", style="Treeview")
+        self.tree = tree = ttk.Treeview(self, columns=columns, show="headings", style="Treeview")
         tree.heading("timestamp", text="Timestamp")
         tree.heading("action", text="Action")
         tree.column("timestamp", width=150, anchor=tk.W, stretch=tk.NO)
@@ -1461,17 +4184,68 @@ class ActivityLogPage(BasePage):
         tree.configure(yscrollcommand=scrollbar.set)
         tree.grid(row=1, column=0, sticky="nsew")
         scrollbar.grid(row=1, column=1, sticky="ns")
+        self.older_button = create_stylish_button(self, "Load Older Entries", self.load_older_entries)
+        self.older_button.grid(row=2, column=0, sticky="w", pady=(10, 0))
+        self._newest_entry = None # Most recent log entry currently shown
+        self._archive_cursor = None # Where the next archive page starts (None once it is exhausted)
+        self.populate_log()
+
+    def populate_log(self):
+        """Fills the treeview with the in-memory activity log, newest first; older entries load from the archive on request."""
         activity_log = app_data.get("activity_log", [])
-
-        if not isinstance(activity_log, list): activity_log = []
+        if not isinstance(activity_log, (list, collections.deque)): activity_log = []
+        # Entries archived from here on are still on screen, so paging starts at the archive's current end
+        user_id = self.app.current_user_id
+        self._archive_cursor = activity_archive_end(user_id) if user_id else None
+        self._update_older_button()
         try:
-             for item in tree.get_children(): tree.delete(item)
+             for item in self.tree.get_children(): self.tree.delete(item)
              for log_entry in reversed(activity_log):
                  if isinstance(log_entry, dict):
-                     tree.insert("", tk.END, values=(log_entry.get('timestamp', 'N/A'), log_entry.get('action', 'N/A')))
+                     self.tree.insert("", tk.END, values=(log_entry.get('timestamp', 'N/A'), log_entry.get('action', 'N/A')))
                  else: logging.warning(f"Skipping invalid activity log entry: {log_entry}")
         except tk.TclError as e: logging.warning(f"TclError populating activity log: {e}")
         except Exception as e: logging.exception("Error populating activity log")
+        self._newest_entry = activity_log[-1] if activity_log else None
+
+    def _update_older_button(self):
+        if self._archive_cursor is None: self.older_button.configure(text="No Older Entries", state=tk.DISABLED)
+        else: self.older_button.configure(text="Load Older Entries", state=tk.NORMAL)
+
+    def load_older_entries(self):
+        """Appends the next page of archived entries below the ones shown."""
+        if self._archive_cursor is None or not self.app.current_user_id: return
+        try:
+            entries, self._archive_cursor = read_activity_archive(self.app.current_user_id, self._archive_cursor)
+        except (OSError, sqlite3.Error, csv.Error) as e:
+            logging.error(f"Could not read the activity archive: {e}")
+            messagebox.showerror("Activity Log", f"Could not read older entries:\n{e}", parent=self)
+            return
+        try:
+            for log_entry in entries:
+                self.tree.insert("", tk.END, values=(log_entry.get('timestamp', 'N/A'), log_entry.get('action', 'N/A')))
+        except tk.TclError as e: logging.warning(f"TclError loading archived activity: {e}")
+        self._update_older_button()
+
+    def refresh(self):
+        """Inserts only the entries logged since the page was last shown."""
+        activity_log = app_data.get("activity_log", [])
+        if not isinstance(activity_log, (list, collections.deque)) or self._newest_entry is None:
+            self.populate_log(); return
+        new_entries = []
+        for log_entry in reversed(activity_log):
+            if log_entry is self._newest_entry: break
+            new_entries.append(log_entry)
+        else:
+            # Last shown entry is gone (log was reset); start over
+            self.populate_log(); return
+        if not new_entries: return
+        try:
+            for log_entry in reversed(new_entries):
+                if isinstance(log_entry, dict):
+                    self.tree.insert("", 0, values=(log_entry.get('timestamp', 'N/A'), log_entry.get('action', 'N/A')))
+        except tk.TclError as e: logging.warning(f"TclError updating activity log: {e}")
+        self._newest_entry = activity_log[-1]
 
 
 # --- AllSpendingPage Class ---
@@ -1487,36 +4261,19 @@ class AllSpendingPage(BasePage):
         summary_frame.grid(row=1, column=0, sticky="ew", pady=(0, 20))
         summary_frame.grid_columnconfigure((0, 1, 2), weight=1, uniform="summary_col")
 
-        # Calculate Summaries
-        total_income, total_expense = 0.0, 0.0
-        expense_by_category = {}
-        transactions = app_data.get("transactions", [])
-        if not isinstance(transactions, list): transactions = []
-        for tx in transactions:
-            if not isinstance(tx, dict): continue
-            tx_type = tx.get('type', '').lower(); amount = tx.get('amount'); category = tx.get('category', 'Uncategorized')
-            if not isinstance(amount, (int, float)): continue
-            if tx_type.startswith("transfer"): continue
-            is_income = (tx_type == "income") or (tx_type != "expense" and amount > 0)
-            is_expense = (tx_type == "expense") or (tx_type != "income" and amount < 0)
-            if is_income: total_income += amount
-            elif is_expense:
-                expense_amount = abs(amount)
-                total_expense += expense_amount
-                expense_by_category[category] = expense_by_category.get(category, 0.0) + expense_amount
-        net_total = total_income - total_expense
-
         # Display Summary Cards
         card_net = create_card_frame(summary_frame); card_net.grid(row=0, column=0, sticky="nsew", padx=10, pady=5)
         ttk.Label(card_net, text="Net Income", style="CardTitle.TLabel").pack(padx=10, pady=(10, 0), anchor='w')
-        net_color = theme_colors["accent"] if net_total >= 0 else theme_colors["red"]
-        ttk.Label(card_net, text=format_currency(net_total), style="Card.TLabel", font=FONT_LARGE, foreground=net_color).pack(padx=10, pady=(0, 10), anchor='w')
+        self.net_label = ttk.Label(card_net, text="", style="Card.TLabel", font=FONT_LARGE)
+        self.net_label.pack(padx=10, pady=(0, 10), anchor='w')
         card_income = create_card_frame(summary_frame); card_income.grid(row=0, column=1, sticky="nsew", padx=10, pady=5)
         ttk.Label(card_income, text="Total Income", style="CardTitle.TLabel").pack(padx=10, pady=(10, 0), anchor='w')
-        ttk.Label(card_income, text=format_currency(total_income), style="Card.TLabel", font=FONT_LARGE, foreground=theme_colors["accent"]).pack(padx=10, pady=(0, 10), anchor='w')
+        self.income_label = ttk.Label(card_income, text="", style="Card.TLabel", font=FONT_LARGE, foreground=theme_colors["accent"])
+        self.income_label.pack(padx=10, pady=(0, 10), anchor='w')
         card_expense = create_card_frame(summary_frame); card_expense.grid(row=0, column=2, sticky="nsew", padx=10, pady=5)
         ttk.Label(card_expense, text="Total Expenses", style="CardTitle.TLabel").pack(padx=10, pady=(10, 0), anchor='w')
-        ttk.Label(card_expense, text=format_currency(total_expense), style="Card.TLabel", font=FONT_LARGE, foreground=theme_colors["red"]).pack(padx=10, pady=(0, 10), anchor='w')
+        self.expense_label = ttk.Label(card_expense, text="", style="Card.TLabel", font=FONT_LARGE, foreground=theme_colors["red"])
+        self.expense_label.pack(padx=10, pady=(0, 10), anchor='w')
 
         # Expense Breakdown Section
         ttk.Label(self, text="Expense Breakdown by Category", style="Title.TLabel").grid(row=2, column=0, sticky="w", pady=(10, 10))
@@ -1530,12 +4287,200 @@ class AllSpendingPage(BasePage):
         scrollbar = ttk.Scrollbar(breakdown_frame, orient="vertical", command=self.breakdown_tree.yview, style="Vertical.TScrollbar")
         self.breakdown_tree.configure(yscrollcommand=scrollbar.set)
         self.breakdown_tree.grid(row=0, column=0, sticky="nsew"); scrollbar.grid(row=0, column=1, sticky="ns")
+        self._breakdown_rows = None
+        self.refresh()
+
+    def calculate_summary(self, start_date=None, end_date=None):
+        """Returns (total_income, total_expense, expense_by_category) over the ledger, optionally for a date range."""
+        return ledger_index.rollups.summary(start_date, end_date)
+
+    def refresh(self):
+        """Updates the summary cards and rewrites the breakdown only when it changed."""
+        if not app_data.is_loaded("transactions"):
+            for label in (self.net_label, self.income_label, self.expense_label): self.patch_widget(label, text="Loading…")
+            rows = [("Loading…", "", "")]
+        else:
+            rows = self._summary_rows()
+        if rows == self._breakdown_rows: return
+        try:
+            self.breakdown_tree.delete(*self.breakdown_tree.get_children())
+            for values in rows: self.breakdown_tree.insert("", tk.END, values=values)
+        except tk.TclError as e: logging.warning(f"TclError updating spending breakdown: {e}")
+        self._breakdown_rows = rows
+
+    def _summary_rows(self):
+        """Fills the summary cards from the rollups and returns the breakdown rows."""
+        total_income, total_expense, expense_by_category = self.calculate_summary()
+        net_total = total_income - total_expense
+        net_color = theme_colors["accent"] if net_total >= 0 else theme_colors["red"]
+        self.patch_widget(self.net_label, text=format_currency(net_total), foreground=net_color)
+        self.patch_widget(self.income_label, text=format_currency(total_income))
+        self.patch_widget(self.expense_label, text=format_currency(total_expense))
+
         sorted_categories = sorted(expense_by_category.items(), key=lambda item: item[1], reverse=True)
-        if not sorted_categories: self.breakdown_tree.insert("", tk.END, values=("No expenses recorded.", "", ""))
+        if not sorted_categories: return [("No expenses recorded.", "", "")]
+        rows = []
+        for category, amount in sorted_categories:
+            percentage = (amount / total_expense * 100) if total_expense else 0
+            rows.append((category, format_currency(amount), f"{percentage:.1f}%"))
+        return rows
+
+# --- Charts ---
+def monthly_spending_series(months=12):
+    """Returns (month labels, income, expenses in pesos) for the last `months` months with activity, from the rollups."""
+    keys = sorted(key for key in ledger_index.rollups.months if key >= "1900")[-months:] # Skips undated rows
+    buckets = [ledger_index.rollups.months[key] for key in keys]
+    labels = [datetime.datetime.strptime(key, "%Y-%m").strftime("%b %y") for key in keys]
+    return labels, [cents_to_pesos(bucket["income"]) for bucket in buckets], [cents_to_pesos(bucket["expense"]) for bucket in buckets]
+
+def category_share_series(max_slices=6):
+    """Returns [(category, expense)] largest first, folding the smallest categories into 'Other'."""
+    _, _, by_category = ledger_index.rollups.summary()
+    ranked = sorted(((category, amount) for category, amount in by_category.items() if amount > 0),
+                    key=lambda item: item[1], reverse=True)
+    if len(ranked) > max_slices:
+        ranked = ranked[:max_slices - 1] + [("Other", sum(amount for _, amount in ranked[max_slices - 1:]))]
+    return ranked
+
+def budget_burndown_series(budget_name, cycle, allocated, now=None):
+    """Returns (day offsets, allowance remaining in pesos at each day boundary so far, period length in days) for a budget's current period."""
+    now = now or datetime.datetime.now()
+    period_start = cycle_period_start(cycle, now)
+    series = ledger_index.budget_series.get(budget_name)
+    if period_start is None: # 'Once' budgets run from their first expense
+        first_ts = series.timestamps[0] if series else to_timestamp(now)
+        period_start = cycle_period_start("Daily", TIMESTAMP_EPOCH + datetime.timedelta(seconds=max(first_ts, 0)))
+        period_end = cycle_period_start("Daily", now) + datetime.timedelta(days=1)
+    else:
+        period_end = shift_period(cycle, period_start, 1)
+    total_days = max(1, (period_end - period_start).days)
+    elapsed_days = min(total_days, (now - period_start).days + 1)
+    start_ts = to_timestamp(period_start)
+    days = list(range(elapsed_days + 1))
+    remaining = [cents_to_pesos(allocated - ledger_index.budget_spent_between(budget_name, start_ts, start_ts + day * SECONDS_PER_DAY)) for day in days]
+    return days, remaining, total_days
+
+class SpendingCharts:
+    """
+    Owns the matplotlib Figure behind the Charts page. update() patches the existing artists
+    (line data, wedge angles, legend and tick labels) and reports whether anything changed, so
+    the canvas is only redrawn when the underlying aggregates moved.
+    """
+
+    def __init__(self, colors):
+        self.colors = colors
+        self.figure = Figure(figsize=(9, 6), dpi=100, facecolor=colors["background"])
+        grid = self.figure.add_gridspec(2, 2, height_ratios=(1, 1.1))
+        self.trend_ax = self.figure.add_subplot(grid[0, :])
+        self.pie_ax = self.figure.add_subplot(grid[1, 0])
+        self.burn_ax = self.figure.add_subplot(grid[1, 1])
+        for ax, title in ((self.trend_ax, "Spending over time"), (self.pie_ax, "Expenses by category"), (self.burn_ax, "Budget burn-down")):
+            ax.set_facecolor(colors["card"])
+            ax.set_title(title, color=colors["foreground"], fontsize=10, loc="left")
+            ax.tick_params(colors=colors["foreground"], labelsize=8)
+            for spine in ax.spines.values(): spine.set_color(colors["disabled"])
+        self.income_line, = self.trend_ax.plot([], [], color=colors["accent"], marker="o", label="Income")
+        self.expense_line, = self.trend_ax.plot([], [], color=colors["red"], marker="o", label="Expenses")
+        self.trend_ax.legend(loc="upper left", fontsize=8, facecolor=colors["card"], labelcolor=colors["foreground"])
+        self.remaining_line, = self.burn_ax.plot([], [], color=colors["blue"], label="Remaining")
+        self.ideal_line, = self.burn_ax.plot([], [], color=colors["disabled"], linestyle="--", label="Even pace")
+        self.burn_ax.axhline(0, color=colors["disabled"], linewidth=0.8)
+        self.burn_ax.legend(loc="upper right", fontsize=8, facecolor=colors["card"], labelcolor=colors["foreground"])
+        self.pie_ax.set_aspect("equal")
+        self.wedges, self.pie_legend = [], None
+        self.figure.tight_layout()
+        self._drawn = {} # Chart name -> data it currently shows
+
+    def update(self, trend, shares, burndown, burndown_title):
+        """Patches every chart whose data changed. Returns True if the figure needs a redraw."""
+        changed = False
+        if self._drawn.get("trend") != trend:
+            labels, income, expenses = trend
+            positions = list(range(len(labels)))
+            self.income_line.set_data(positions, income)
+            self.expense_line.set_data(positions, expenses)
+            self.trend_ax.set_xticks(positions, labels)
+            self.trend_ax.relim(); self.trend_ax.autoscale_view()
+            self._drawn["trend"] = trend; changed = True
+        if self._drawn.get("shares") != shares:
+            self._update_pie(shares)
+            self._drawn["shares"] = shares; changed = True
+        if self._drawn.get("burndown") != (burndown, burndown_title):
+            days, remaining, total_days = burndown
+            self.remaining_line.set_data(days, remaining)
+            self.ideal_line.set_data(*(([0, total_days], [remaining[0], 0]) if remaining else ([], [])))
+            self.burn_ax.set_title(burndown_title, color=self.colors["foreground"], fontsize=10, loc="left")
+            self.burn_ax.relim(); self.burn_ax.autoscale_view()
+            self._drawn["burndown"] = (burndown, burndown_title); changed = True
+        return changed
+
+    def _update_pie(self, shares):
+        total = sum(amount for _, amount in shares)
+        labels = [f"{category} ({amount / total * 100:.0f}%)" for category, amount in shares] if total else []
+        if len(self.wedges) == len(shares) and shares: # Same slices: move the wedge edges, keep the artists
+            theta = 90.0
+            for wedge, (_, amount) in zip(self.wedges, shares):
+                span = amount / total * 360
+                wedge.set_theta1(theta); wedge.set_theta2(theta + span)
+                theta += span
+            for text, label in zip(self.pie_legend.get_texts(), labels): text.set_text(label)
+            return
+        for wedge in self.wedges: wedge.remove()
+        if self.pie_legend is not None: self.pie_legend.remove()
+        self.wedges, self.pie_legend = [], None
+        if not shares: return
+        palette = [self.colors[key] for key in ("red", "blue", "yellow", "accent", "accent_darker", "disabled")]
+        self.wedges, _ = self.pie_ax.pie([amount for _, amount in shares], startangle=90, colors=palette[:len(shares)],
+                                         wedgeprops={"edgecolor": self.colors["card"]})
+        self.pie_legend = self.pie_ax.legend(self.wedges, labels, loc="center left", bbox_to_anchor=(0.95, 0.5), fontsize=8,
+                                             frameon=False, labelcolor=self.colors["foreground"])
+
+class ChartsPage(BasePage):
+    def __init__(self, parent, app):
+        super().__init__(parent, app)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        header = tk.Frame(self, bg=theme_colors["background"])
+        header.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        ttk.Label(header, text="Charts", style="Title.TLabel").pack(side=tk.LEFT)
+        self.charts = None
+        if Figure is None:
+            ttk.Label(self, text="Charts need matplotlib (pip install -r requirements.txt).", style="TLabel").grid(row=1, column=0, sticky="n", pady=40)
+            return
+
+        self.budget_var = tk.StringVar()
+        self.budget_combo = ttk.Combobox(header, textvariable=self.budget_var, state="readonly", width=24, style="TCombobox")
+        self.budget_combo.pack(side=tk.RIGHT)
+        self.budget_combo.bind("<<ComboboxSelected>>", lambda event: self.refresh())
+        ttk.Label(header, text="Burn-down for:", style="TLabel").pack(side=tk.RIGHT, padx=(0, 8))
+
+        self.charts = SpendingCharts(theme_colors)
+        self.canvas = FigureCanvasTkAgg(self.charts.figure, master=self)
+        self.canvas.get_tk_widget().configure(bg=theme_colors["background"], highlightthickness=0)
+        self.canvas.get_tk_widget().grid(row=1, column=0, sticky="nsew")
+        self.refresh()
+
+    def _selected_budget(self):
+        """Keeps the budget picker in sync with the budgets dataset and returns the chosen budget's details."""
+        budgets = sorted((details for details in app_data.get("budgets", {}).values() if isinstance(details, dict)),
+                         key=lambda details: str(details.get("name", "")).lower())
+        names = [details.get("name", "") for details in budgets]
+        if list(self.budget_combo.cget("values")) != names: self.budget_combo.configure(values=names)
+        if self.budget_var.get() not in names: self.budget_var.set(names[0] if names else "")
+        return next((details for details in budgets if details.get("name") == self.budget_var.get()), None)
+
+    def refresh(self):
+        """Feeds the charts from the rollups and budget series, redrawing only when something changed."""
+        if self.charts is None or not app_data.is_loaded("transactions"): return # Drawn once the ledger is installed
+        budget = self._selected_budget()
+        if budget is not None:
+            allocated = budget.get("allocated") or 0
+            burndown = budget_burndown_series(budget.get("name"), budget.get("cycle"), allocated)
+            title = f"{budget.get('name')} — {format_budget_period(budget.get('cycle'), cycle_period_start(budget.get('cycle'), datetime.datetime.now()))}"
         else:
-            for category, amount in sorted_categories:
-                percentage = (amount / total_expense * 100) if total_expense else 0
-                self.breakdown_tree.insert("", tk.END, values=(category if category else "Uncategorized", format_currency(amount), f"{percentage:.1f}%"))
+            burndown, title = ([], [], 0), "Budget burn-down (no budgets)"
+        if self.charts.update(monthly_spending_series(), category_share_series(), burndown, title):
+            self.canvas.draw_idle()
 
 # --- Base Class for Editing Lists/Dicts ---
 class EditListPageBase(BasePage):
@@ -1552,7 +4497,7 @@ class EditListPageBase(BasePage):
         self.grid_rowconfigure(1, weight=1); self.grid_columnconfigure(0, weight=1)
 
         # Title and Action Buttons
-        title_frame = tk.Frame(self, bg=theme_colors["background"])
+        title_frame = self.title_frame = tk.Frame(self, bg=theme_colors["background"])
         title_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 15))
         ttk.Label(title_frame, text=title, style="Title.TLabel").pack(side=tk.LEFT, padx=(0, 20))
 
@@ -1581,6 +4526,10 @@ class EditListPageBase(BasePage):
         self.tree.bind("<ButtonRelease-1>", self.on_action_click)
         self.populate_data()
 
+    def refresh(self):
+        """Re-reads the (small) entity dict so values changed elsewhere are shown."""
+        self.populate_data()
+
     def delete_selected_item(self):
         """Deletes the currently selected item in the treeview."""
         selection = self.tree.selection()
@@ -1648,7 +4597,10 @@ class EditListPageBase(BasePage):
                     if is_required: raise ValueError(f"Field '{label}' is required.")
                     elif field_type == "date": processed_data[field] = None
                     else: processed_data[field] = None
-                elif field_type in ["number", "currency"]:
+                elif field_type == "currency":
+                    try: processed_data[field] = parse_money(value)
+                    except ValueError: raise ValueError(f"Invalid amount for '{label}'.")
+                elif field_type == "number":
                     try: processed_data[field] = float(str(value).replace(",", "").strip())
                     except (ValueError, TypeError): raise ValueError(f"Invalid number format for '{label}'.")
                 elif field_type == "date":
@@ -1680,8 +4632,7 @@ class EditListPageBase(BasePage):
                 new_id = get_unique_id(id_prefix)
                 id_field_name = f"{id_prefix}_id"
                 if id_field_name in self.columns: processed_data[id_field_name] = new_id
-                if not isinstance(app_data.get(self.data_key), dict): app_data[self.data_key] = {}
-                app_data[self.data_key][new_id] = processed_data
+                add_entity(self.data_key, new_id, processed_data)
                 log_activity(f"Added {self.item_name}: {processed_data.get('name', new_id)}")
                 self.populate_data()
                 logging.info(f"Added new {self.item_name} with ID {new_id}")
@@ -1690,6 +4641,7 @@ class EditListPageBase(BasePage):
 
     def edit_item(self, item_id):
         """Opens a dialog to edit an existing item and saves changes."""
+        if not ledger_ready(self): return # A rename re-points transactions
         data_source = app_data.get(self.data_key)
         if not isinstance(data_source, dict) or item_id not in data_source:
             messagebox.showerror("Error", f"{self.item_name} ID '{item_id}' not found.", parent=self); self.populate_data(); return
@@ -1698,7 +4650,9 @@ class EditListPageBase(BasePage):
 
         edit_fields_with_initials = {}
         for field, config in self.edit_dialog_fields.items():
-            new_config = config.copy(); new_config['initial'] = original_data.get(field); edit_fields_with_initials[field] = new_config
+            initial = original_data.get(field)
+            if config.get("type") == "currency" and isinstance(initial, int): initial = money_text(initial)
+            new_config = config.copy(); new_config['initial'] = initial; edit_fields_with_initials[field] = new_config
         self._update_dynamic_dialog_fields(edit_fields_with_initials)
         dialog = SimpleEntryDialog(self, f"Edit {self.item_name}", edit_fields_with_initials)
         processed_data = self._validate_and_process_dialog_result(dialog.result, is_edit=True, item_id=item_id)
@@ -1709,7 +4663,7 @@ class EditListPageBase(BasePage):
                     id_field_name = f"{id_prefix}_id"
                     processed_data.pop(id_field_name, None)
 
-                    app_data[self.data_key][item_id].update(processed_data)
+                    update_entity(self.data_key, item_id, processed_data)
                     log_activity(f"Edited {self.item_name}: {processed_data.get('name', item_id)}")
                     self.populate_data()
                     logging.info(f"Edited {self.item_name} with ID {item_id}")
@@ -1719,6 +4673,7 @@ class EditListPageBase(BasePage):
 
     def delete_item(self, item_id):
         """Deletes a selected item after confirmation and dependency check."""
+        if not ledger_ready(self): return # The dependency check counts transactions
         data_source = app_data.get(self.data_key)
         if not isinstance(data_source, dict) or item_id not in data_source:
             logging.warning(f"Attempted to delete non-existent {self.item_name} ID: {item_id}")
@@ -1730,7 +4685,7 @@ class EditListPageBase(BasePage):
                 can_delete, reason = self.check_can_delete(item_id)
                 if not can_delete: messagebox.showwarning("Cannot Delete", reason, parent=self); return
                 if item_id in app_data.get(self.data_key, {}):
-                    del app_data[self.data_key][item_id]
+                    remove_entity(self.data_key, item_id)
                     log_activity(f"Deleted {self.item_name}: {item_name_display}")
                     self.populate_data()
                     logging.info(f"Deleted {self.item_name}: {item_name_display} (ID: {item_id})")
@@ -1780,7 +4735,7 @@ class EditListPageBase(BasePage):
         budget_names = sorted([b.get("name", "") for b in budgets_data.values()
                                if isinstance(b, dict) and "name" in b and b["name"] is not None],
                               key=lambda x: str(x).lower())
-        budget_cycles = ["Once", "Daily", "Weekly", "Monthly", "Yearly"]
+        budget_cycles = BUDGET_CYCLES
         try:
             for field, config in dialog_fields.items():
                 if config.get("type") == "combo":
@@ -1815,38 +4770,36 @@ class WalletsPage(EditListPageBase):
         """Returns display values for a wallet item."""
         return (
             details.get('name', 'N/A'),
-            format_currency(details.get('balance', 0.0))
+            format_currency(details.get('balance', 0))
         )
 
     def validate_specific_fields(self, data, is_edit, item_id):
         """Validates wallet name uniqueness and balance input."""
-        name_to_check = data.get("name", "").strip(); wallets_dict = app_data.get("wallets", {})
+        name_to_check = data.get("name", "").strip()
         if not name_to_check: raise ValueError("Wallet name cannot be empty.")
-        for w_id, w_details in wallets_dict.items():
-            if is_edit and w_id == item_id: continue
-            if isinstance(w_details, dict) and w_details.get("name", "").lower() == name_to_check.lower(): raise ValueError(f"Wallet named '{data.get('name')}' already exists.")
+        existing_id = entity_names.find_id("wallets", name_to_check, ignore_case=True)
+        if existing_id is not None and not (is_edit and existing_id == item_id): raise ValueError(f"Wallet named '{data.get('name')}' already exists.")
 
         if 'balance' in data and data.get('balance') is None:
              raise ValueError("Corrected Balance cannot be empty.")
         return data
 
     def add_item(self):
-        """Opens dialog to add new wallet, sets initial balance to 0.0, and saves."""
+        """Opens dialog to add new wallet, sets initial balance to 0, and saves."""
         self._update_dynamic_dialog_fields(self.add_dialog_fields)
         dialog = SimpleEntryDialog(self, f"Add New {self.item_name}", self.add_dialog_fields)
         processed_data = self._validate_and_process_dialog_result(dialog.result, is_edit=False)
 
         if processed_data:
             try:
-                processed_data['balance'] = 0.0
+                processed_data['balance'] = processed_data['opening_balance'] = 0
 
                 id_prefix = self.data_key[:-1] if self.data_key.endswith('s') else self.data_key
                 new_id = get_unique_id(id_prefix)
                 id_field_name = f"{id_prefix}_id"
                 if id_field_name in self.columns: processed_data[id_field_name] = new_id
 
-                if not isinstance(app_data.get(self.data_key), dict): app_data[self.data_key] = {}
-                app_data[self.data_key][new_id] = processed_data
+                add_entity(self.data_key, new_id, processed_data)
                 log_activity(f"Added {self.item_name}: {processed_data.get('name', new_id)}")
                 self.populate_data()
                 logging.info(f"Added new {self.item_name} with ID {new_id} (Balance: 0.00)")
@@ -1855,26 +4808,27 @@ class WalletsPage(EditListPageBase):
 
     def check_can_delete(self, item_id):
         """Checks if a wallet is used in any transactions before deletion."""
-        wallets_dict = app_data.get("wallets", {}); transactions = app_data.get("transactions", [])
+        wallets_dict = app_data.get("wallets", {})
         if item_id not in wallets_dict or not isinstance(wallets_dict[item_id], dict): return False, "Wallet not found."
         wallet_name = wallets_dict[item_id].get("name")
         if not wallet_name: return True, ""
-        if not isinstance(transactions, list): transactions = []
-        if any(isinstance(tx, dict) and wallet_name in [tx.get("wallet"), tx.get("from_account"), tx.get("to_account")] for tx in transactions):
-            return False, f"Cannot delete wallet '{wallet_name}' used in transactions."
+        used_by = ledger_index.reference_count("wallets", wallet_name)
+        if used_by:
+            return False, f"Cannot delete wallet '{wallet_name}' used in {used_by} transaction(s)."
         return True, ""
 
 # BudgetPage
 class BudgetPage(EditListPageBase):
     def __init__(self, parent, app):
-        columns = {"name": "Budget Name", "allocated": "Allocated", "cycle": "Cycle", "spent": "Spent"}
+        columns = {"name": "Budget Name", "allocated": "Allocated", "cycle": "Cycle", "spent": "Spent (This Period)", "previous": "Previous Period"}
         column_config = {
             "name": {"width": 200, "anchor": tk.W, "stretch": tk.YES},
             "allocated": {"width": 120, "anchor": tk.E, "stretch": tk.NO},
             "cycle": {"width": 80, "anchor": tk.W, "stretch": tk.NO},
-            "spent": {"width": 120, "anchor": tk.E, "stretch": tk.NO}
+            "spent": {"width": 140, "anchor": tk.E, "stretch": tk.NO},
+            "previous": {"width": 120, "anchor": tk.E, "stretch": tk.NO}
         }
-        budget_cycles = ["Once", "Daily", "Weekly", "Monthly", "Yearly"]
+        budget_cycles = BUDGET_CYCLES
         add_dialog_fields = {
             "name": {"label": "Budget Name:", "type": "text", "required": True},
             "allocated": {"label": "Allocated Amount:", "type": "currency", "required": True, "initial": "100.00"},
@@ -1887,50 +4841,58 @@ class BudgetPage(EditListPageBase):
             "cycle": {"label": "Cycle:", "type": "combo", "values": budget_cycles, "required": True}
         }
         super().__init__(parent, app, "Budgets", "budgets", columns, column_config, "Budget", add_dialog_fields,edit_dialog_fields)
+        create_stylish_button(self.title_frame, "Spending History", self.show_history, style="TButton").pack(side=tk.RIGHT, padx=(5, 0))
 
     def get_values_for_item(self, details):
-        """Gets display values for a budget, calculating current spending."""
+        """Gets display values for a budget, calculating spending in its current and previous cycle period."""
         budget_name = details.get('name', 'N/A')
-        calculated_spent = self._calculate_spent_for_budget(budget_name)
+        if not app_data.is_loaded("transactions"):
+            return budget_name, format_currency(details.get('allocated', 0)), details.get('cycle', 'N/A'), "Loading…", "Loading…"
+        history = self._calculate_spent_for_budget(budget_name, details.get('cycle'), periods=2)
         return (
             budget_name,
-            format_currency(details.get('allocated', 0.0)),
+            format_currency(details.get('allocated', 0)),
             details.get('cycle', 'N/A'),
-            format_currency(calculated_spent)
+            format_currency(history[0][1]),
+            format_currency(history[1][1]) if len(history) > 1 else "—"
         )
 
-    def _calculate_spent_for_budget(self, budget_name):
-        """Calculates total spending linked to a specific budget name."""
-        if not budget_name: return 0.0
-        total_spent = 0.0
-        transactions = app_data.get("transactions", [])
-        if not isinstance(transactions, list): return 0.0
+    def _calculate_spent_for_budget(self, budget_name, cycle, periods=1):
+        """Returns [(period_start, spent)] for a budget's current and previous cycle periods, newest first."""
+        if not budget_name or budget_name == 'N/A': return [(None, 0)]
+        return ledger_index.budget_history(budget_name, cycle, periods=periods)
 
-        for tx in transactions:
-            if (isinstance(tx, dict) and
-                    tx.get("type") == "expense" and
-                    tx.get("linked_budget") == budget_name and
-                    isinstance(tx.get("amount"), (int, float))):
-                total_spent += abs(tx["amount"])
-        return total_spent
+    def show_history(self):
+        """Shows per-period spending for the selected budget."""
+        if not ledger_ready(self): return
+        selection = self.tree.selection()
+        details = app_data.get("budgets", {}).get(selection[0]) if selection else None
+        if not isinstance(details, dict):
+            messagebox.showwarning("No Selection", "Please select a budget to view its spending history.", parent=self)
+            return
+        cycle = details.get('cycle'); allocated = details.get('allocated', 0) or 0
+        lines = []
+        for period_start, spent in self._calculate_spent_for_budget(details.get('name'), cycle, periods=12):
+            status = "over" if spent > allocated else "left"
+            lines.append(f"{format_budget_period(cycle, period_start)}:  {format_currency(spent)}  ({format_currency(abs(allocated - spent))} {status})")
+        messagebox.showinfo(f"{details.get('name', 'Budget')} — {cycle or 'N/A'}", "\n".join(lines), parent=self)
 
     def validate_specific_fields(self, data, is_edit, item_id):
         """Validates budget name uniqueness and positive allocation."""
-        name_to_check = data.get("name", "").strip(); budgets_dict = app_data.get("budgets", {})
+        name_to_check = data.get("name", "").strip()
         if not name_to_check: raise ValueError("Budget name cannot be empty.")
-        for bud_id, bud_details in budgets_dict.items():
-            if is_edit and bud_id == item_id: continue
-            if isinstance(bud_details, dict) and bud_details.get("name", "").lower() == name_to_check.lower():
-                raise ValueError(f"Budget named '{data.get('name')}' already exists.")
+        existing_id = entity_names.find_id("budgets", name_to_check, ignore_case=True)
+        if existing_id is not None and not (is_edit and existing_id == item_id):
+            raise ValueError(f"Budget named '{data.get('name')}' already exists.")
         allocated = data.get('allocated'); cycle = data.get('cycle')
         if allocated is None or allocated <= 0: raise ValueError("Allocated amount must be positive.")
-        if not cycle or cycle not in ["Once", "Daily", "Weekly", "Monthly", "Yearly"]:
+        if not cycle or cycle not in BUDGET_CYCLES:
             raise ValueError("Please select a valid budget cycle.")
         return data
 
     def check_can_delete(self, item_id):
         """Checks if a budget is linked to any transactions before deletion."""
-        budgets_dict = app_data.get("budgets", {}); transactions = app_data.get("transactions", [])
+        budgets_dict = app_data.get("budgets", {})
         if item_id not in budgets_dict or not isinstance(budgets_dict[item_id], dict):
             return False, "Budget not found."
 
@@ -1938,9 +4900,9 @@ class BudgetPage(EditListPageBase):
         if not budget_name:
             return True, ""
 
-        if not isinstance(transactions, list): transactions = []
-        if any(isinstance(tx, dict) and tx.get("linked_budget") == budget_name for tx in transactions):
-            return False, f"Cannot delete budget '{budget_name}' as it is linked to existing transactions."
+        used_by = ledger_index.reference_count("budgets", budget_name)
+        if used_by:
+            return False, f"Cannot delete budget '{budget_name}' as it is linked to {used_by} existing transaction(s)."
 
         return True, ""
 
@@ -1972,21 +4934,14 @@ class GoalsPage(EditListPageBase):
     def get_values_for_item(self, details):
         """Gets display values for a goal, calculating effective saved amount including linked expenses."""
         goal_name = details.get('name', 'N/A')
-        target = details.get('target', 0.0)
-        base_saved = details.get('saved', 0.0)
+        target = details.get('target', 0)
+        base_saved = details.get('saved', 0)
 
-        linked_expense_contribution = 0.0
-        user_transactions = app_data.get("transactions", [])
-        if not isinstance(user_transactions, list): user_transactions = []
+        if not app_data.is_loaded("transactions"):
+            return goal_name, format_currency(target), "Loading…", details.get('due_date', '') or ""
 
-        # Calculate linked contribution from expenses
-        for tx in user_transactions:
-            if (isinstance(tx, dict) and
-                    tx.get("linked_goal") == goal_name and
-                    tx.get("type") == "expense" and
-                    isinstance(tx.get("amount"), (int, float)) and
-                    tx["amount"] < 0):
-                linked_expense_contribution += abs(tx["amount"])
+        # Linked contribution from expenses
+        linked_expense_contribution = ledger_index.goal_contributions.get(goal_name, 0)
 
         effective_saved = base_saved + linked_expense_contribution
 
@@ -1999,12 +4954,11 @@ class GoalsPage(EditListPageBase):
 
     def validate_specific_fields(self, data, is_edit, item_id):
         """Validates goal name uniqueness, amounts, and date format."""
-        name_to_check = data.get("name", "").strip(); goals_dict = app_data.get("goals", {})
+        name_to_check = data.get("name", "").strip()
         if not name_to_check: raise ValueError("Goal name cannot be empty.")
-        for g_id, g_details in goals_dict.items():
-            if is_edit and g_id == item_id: continue
-            if isinstance(g_details, dict) and g_details.get("name", "").lower() == name_to_check.lower():
-                raise ValueError(f"Goal named '{data.get('name')}' already exists.")
+        existing_id = entity_names.find_id("goals", name_to_check, ignore_case=True)
+        if existing_id is not None and not (is_edit and existing_id == item_id):
+            raise ValueError(f"Goal named '{data.get('name')}' already exists.")
 
         target = data.get('target'); saved = data.get('saved')
         if target is None or target <= 0: raise ValueError("Target amount must be positive.")
@@ -2026,22 +4980,21 @@ class GoalsPage(EditListPageBase):
         return data
 
     def add_item(self):
-        """Opens dialog to add new goal, sets initial saved amount to 0.0, and saves."""
+        """Opens dialog to add new goal, sets initial saved amount to 0, and saves."""
         self._update_dynamic_dialog_fields(self.add_dialog_fields)
         dialog = SimpleEntryDialog(self, f"Add New {self.item_name}", self.add_dialog_fields)
         processed_data = self._validate_and_process_dialog_result(dialog.result, is_edit=False)
 
         if processed_data:
             try:
-                processed_data['saved'] = 0.0
+                processed_data['saved'] = 0
 
                 id_prefix = self.data_key[:-1] if self.data_key.endswith('s') else self.data_key
                 new_id = get_unique_id(id_prefix)
                 id_field_name = f"{id_prefix}_id"
                 if id_field_name in self.columns: processed_data[id_field_name] = new_id
 
-                if not isinstance(app_data.get(self.data_key), dict): app_data[self.data_key] = {}
-                app_data[self.data_key][new_id] = processed_data
+                add_entity(self.data_key, new_id, processed_data)
                 log_activity(f"Added {self.item_name}: {processed_data.get('name', new_id)}")
                 self.populate_data()
                 logging.info(f"Added new {self.item_name} with ID {new_id} (Saved: 0.00)")
@@ -2050,14 +5003,14 @@ class GoalsPage(EditListPageBase):
 
     def check_can_delete(self, item_id):
         """Checks if a goal is linked to any transactions before deletion."""
-        goals_dict = app_data.get("goals", {}); transactions = app_data.get("transactions", [])
+        goals_dict = app_data.get("goals", {})
         if item_id not in goals_dict or not isinstance(goals_dict[item_id], dict):
             return False, "Goal not found."
         goal_name = goals_dict[item_id].get("name")
         if not goal_name: return True, ""
-        if not isinstance(transactions, list): transactions = []
-        if any(isinstance(tx, dict) and tx.get("linked_goal") == goal_name for tx in transactions):
-            return False, f"Cannot delete goal '{goal_name}' as it is linked to existing income transactions."
+        used_by = ledger_index.reference_count("goals", goal_name)
+        if used_by:
+            return False, f"Cannot delete goal '{goal_name}' as it is linked to {used_by} existing transaction(s)."
         return True, ""
 
 
@@ -2120,8 +5073,14 @@ class SettingsPage(BasePage):
         new_theme = self.theme_var.get()
         logging.info(f"Theme selection changed to: {new_theme}")
         self.app.switch_theme(new_theme)
-        self.create_ui_elements()
-        self.configure(bg=theme_colors["background"])
+        # The theme switch rebuilds cached pages, so this instance may already be gone
+        if self.winfo_exists():
+            self.create_ui_elements()
+            self.configure(bg=theme_colors["background"])
+
+    def refresh(self):
+        """Keeps the theme selection in sync with the saved settings."""
+        self.theme_var.set(app_data.get("settings", {}).get("theme", "dark"))
 
     def switch_user(self):
         """Closes the current application and returns to the user selection screen."""
@@ -2144,18 +5103,20 @@ class SettingsPage(BasePage):
                 app_data["budgets"] = {}
                 app_data["goals"] = {}
                 app_data["transactions"] = []
-                app_data["activity_log"] = []
+                app_data["activity_log"] = new_activity_log() # The archive keeps the history from before the reset
+                ledger_index.clear()
 
                 # Create default wallet again
                 wallet_id = get_unique_id("wallet")
-                app_data["wallets"][wallet_id] = {"wallet_id": wallet_id, "name": "Cash", "balance": 0.0}
+                app_data["wallets"][wallet_id] = {"wallet_id": wallet_id, "name": "Cash", "balance": 0, "opening_balance": 0}
+                entity_names.rebuild()
 
-                # Save the now empty/default data
-                save_user_data(user_id)
+                # Save the now empty/default data in the background, discarding the journals
+                snapshot = snapshot_user_data(user_id, compact=True)
                 log_activity("Reset all user data")
-
-                messagebox.showinfo("Data Reset", "All financial data for this user has been reset successfully.", parent=self)
                 self.app.show_page("Home")
+                self.app.run_io(write_user_data, user_id, snapshot, on_done=lambda _: messagebox.showinfo(
+                    "Data Reset", "All financial data for this user has been reset successfully.", parent=self.app))
             except Exception as e:
                 logging.exception("Error resetting user data")
                 messagebox.showerror("Error", f"Could not reset data:\n{e}", parent=self)
@@ -2176,30 +5137,40 @@ class SettingsPage(BasePage):
                 logging.warning(f"Attempting to delete user: {user_name} (ID: {user_id})")
 
                 # Remove user from profiles dictionary
-                if user_id in app_data.get("user_profiles", {}):
+                profiles_changed = user_id in app_data.get("user_profiles", {})
+                if profiles_changed:
                     del app_data["user_profiles"][user_id]
-                    save_user_profiles_to_csv()
 
-                # Delete associated user data files
-                data_types = ["wallets", "budgets", "goals", "transactions", "activity_log", "settings"]
-                for data_type in data_types:
-                    file_path = get_user_data_file_path(user_id, data_type)
-                    if os.path.exists(file_path):
-                        try:
-                            os.remove(file_path)
-                            logging.info(f"Deleted user data file: {file_path}")
-                        except OSError as e:
-                            logging.error(f"Could not delete file {file_path}: {e}")
+                # Delete associated user data files (every save generation, journal and snapshot, plus the manifest)
+                file_paths = list_user_files(user_id)
+                user_manifests.pop(user_id, None)
+                close_user_store(user_id)
+                file_paths += [get_store_file_path(user_id) + suffix for suffix in ("", "-wal", "-shm")]
 
-                messagebox.showinfo("User Deleted", f"User profile '{user_name}' and all associated data have been permanently deleted.", parent=self)
+                def on_deleted(_):
+                    messagebox.showinfo("User Deleted", f"User profile '{user_name}' and all associated data have been permanently deleted.", parent=self)
+                    # Close current application (without re-saving the deleted data) and return to account selection
+                    self.app.on_closing(save=False)
 
-                # Close current application and return to account selection
-                self.app.on_closing()
+                profiles_to_save = dict(app_data.get("user_profiles", {})) if profiles_changed else None
+                self.app.run_io(self._remove_user_files, profiles_to_save, file_paths, on_done=on_deleted)
 
             except Exception as e:
                 logging.exception("Error deleting user")
                 messagebox.showerror("Error", f"An error occurred while deleting the user:\n{e}", parent=self)
 
+    @staticmethod
+    def _remove_user_files(profiles_to_save, file_paths):
+        """Runs on the I/O worker: rewrites the profile list, then deletes a user's data files."""
+        if profiles_to_save is not None: save_user_profiles_to_csv(profiles_to_save)
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                    logging.info(f"Deleted user data file: {file_path}")
+                except OSError as e:
+                    logging.error(f"Could not delete file {file_path}: {e}")
+
     def exit_application(self):
         """Saves data and immediately closes the entire application."""
         logging.info("Exit Application action initiated from Settings (no confirmation).")
@@ -2541,12 +5512,13 @@ class AddTransactionDialog(tk.Toplevel):
 
     def add_transaction(self):
         """Validates input, creates a new transaction(s), and updates wallet balances."""
+        if not ledger_ready(self): return # Duplicate checks and the wallet balance need the ledger
         try:
             # Input Validation
             amount_str = self.amount_var.get().replace(",", "").strip()
             if not amount_str: raise ValueError("Amount cannot be empty.")
             try:
-                amount = abs(float(amount_str))
+                amount = abs(parse_money(amount_str))
                 if amount <= 0: raise ValueError("Amount must be positive.")
             except ValueError:
                 raise ValueError("Invalid amount entered.")
@@ -2557,9 +5529,7 @@ class AddTransactionDialog(tk.Toplevel):
             wallet_name = self.wallet_var.get()
             if not wallet_name: raise ValueError("Please select a wallet.")
 
-            user_wallets = app_data.get("wallets", {})
-            valid_wallet_names = [w['name'] for w in user_wallets.values() if isinstance(w, dict)]
-            if wallet_name not in valid_wallet_names: raise ValueError(f"Wallet '{wallet_name}' is invalid.")
+            if entity_names.find_id("wallets", wallet_name) is None: raise ValueError(f"Wallet '{wallet_name}' is invalid.")
 
             date_str = self.date_var.get()
             time_str = self.time_var.get()
@@ -2572,7 +5542,7 @@ class AddTransactionDialog(tk.Toplevel):
 
             current_tab_index = self.notebook.index(self.notebook.select())
             category = ""
-            final_amount = 0.0
+            final_amount = 0
             tx_type = ""
             log_message = ""
             linked_budget_name = None
@@ -2584,13 +5554,12 @@ class AddTransactionDialog(tk.Toplevel):
                 category = self.selected_category_var.get()
                 if not category: raise ValueError("Please select a category.")
 
-                cat_details = next((v for k,v in app_data.get("categories", {}).items() if isinstance(v, dict) and v.get('name') == category), None)
-                if not cat_details or cat_details.get('type') != 'expense':
+                if entity_names.find_category(category, 'expense') is None:
                     raise ValueError(f"Invalid category '{category}' selected for an expense.")
 
                 budget_selection = self.budget_var.get()
                 if budget_selection != "None":
-                    if budget_selection in [b['name'] for b in app_data.get("budgets", {}).values() if isinstance(b, dict)]:
+                    if entity_names.find_id("budgets", budget_selection) is not None:
                         linked_budget_name = budget_selection
                     else:
                         logging.warning(f"Selected budget '{budget_selection}' no longer exists. Ignoring link.")
@@ -2598,7 +5567,7 @@ class AddTransactionDialog(tk.Toplevel):
 
                 goal_selection = self.goal_var.get()
                 if goal_selection != "None":
-                    if goal_selection in [g['name'] for g in app_data.get("goals", {}).values() if isinstance(g, dict)]:
+                    if entity_names.find_id("goals", goal_selection) is not None:
                         linked_goal_name = goal_selection
                     else:
                         logging.warning(f"Selected goal '{goal_selection}' no longer exists. Ignoring link.")
@@ -2614,8 +5583,7 @@ class AddTransactionDialog(tk.Toplevel):
                 category = self.selected_category_var.get()
                 if not category: raise ValueError("Please select income source.")
 
-                cat_details = next((v for k,v in app_data.get("categories", {}).items() if isinstance(v, dict) and v.get('name') == category), None)
-                if not cat_details or cat_details.get('type') != 'income':
+                if entity_names.find_category(category, 'income') is None:
                      raise ValueError(f"Invalid category '{category}' selected for income.")
 
                 linked_goal_name = None
@@ -2626,10 +5594,9 @@ class AddTransactionDialog(tk.Toplevel):
                 to_wallet_name = self.to_wallet_var.get()
                 if not to_wallet_name: raise ValueError("Please select 'To Wallet'.")
                 if wallet_name == to_wallet_name: raise ValueError("'From' and 'To' wallets must be different.")
-                if to_wallet_name not in valid_wallet_names: raise ValueError(f"'To Wallet' ({to_wallet_name}) is invalid.")
+                if entity_names.find_id("wallets", to_wallet_name) is None: raise ValueError(f"'To Wallet' ({to_wallet_name}) is invalid.")
 
-                all_categories = app_data.get("categories", {})
-                transfer_cat = next((v for k,v in all_categories.items() if isinstance(v, dict) and k == 'cat_transfer'), None)
+                transfer_cat = app_data.get("categories", {}).get('cat_transfer')
                 transfer_cat_name = transfer_cat['name'] if transfer_cat else 'Transfer'
 
 
@@ -2642,11 +5609,9 @@ class AddTransactionDialog(tk.Toplevel):
                          "category": transfer_cat_name, "type": "transfer_in", "from_account": wallet_name,
                          "to_account": to_wallet_name, "linked_budget": None, "linked_goal": None}
 
-                if not isinstance(app_data.get("transactions"), list): app_data["transactions"] = []
-                app_data["transactions"].extend([tx_out, tx_in])
+                if not self.confirm_if_duplicate(tx_out): return
+                record_transactions([tx_out, tx_in])
                 log_activity(f"Added Transfer: {format_currency(amount)} from {wallet_name} to {to_wallet_name}")
-                self.update_wallet_balance(wallet_name, -amount)
-                self.update_wallet_balance(to_wallet_name, amount)
                 self.app.refresh_current_page()
                 messagebox.showinfo("Success", "Transfer added!", parent=self)
                 self.destroy()
@@ -2668,11 +5633,10 @@ class AddTransactionDialog(tk.Toplevel):
                 "linked_goal": linked_goal_name
             }
 
-            if not isinstance(app_data.get("transactions"), list): app_data["transactions"] = []
-            app_data["transactions"].append(new_transaction)
+            if not self.confirm_if_duplicate(new_transaction): return
+            record_transactions([new_transaction])
 
             log_activity(log_message)
-            self.update_wallet_balance(wallet_name, final_amount)
 
             # Refresh and Close
             self.app.refresh_current_page()
@@ -2685,22 +5649,16 @@ class AddTransactionDialog(tk.Toplevel):
             logging.exception("Error adding transaction")
             messagebox.showerror("Error", f"Could not add transaction.\n{e}", parent=self)
 
-    def update_wallet_balance(self, wallet_name, amount_change):
-        """Updates the balance of a specified wallet."""
-        wallets_dict = app_data.get("wallets", {})
-        if not isinstance(wallets_dict, dict): logging.error("Wallets data not a dict."); return
-        wallet_id_to_update = None
-        for w_id, w_details in wallets_dict.items():
-            if isinstance(w_details, dict) and w_details.get("name") == wallet_name: wallet_id_to_update = w_id; break
-        try:
-            current_balance = float(wallets_dict[wallet_id_to_update].get('balance', 0.0))
-            new_balance = current_balance + amount_change
-            wallets_dict[wallet_id_to_update]["balance"] = new_balance
-            logging.info(f"Updated balance for '{wallet_name}' to {format_currency(new_balance)}")
-        except (ValueError, TypeError) as e:
-            logging.error(f"Error converting balance for {wallet_name}: {e}")
-        except Exception as e:
-            logging.exception(f"Error updating balance for {wallet_name}")
+    def confirm_if_duplicate(self, tx):
+        """Asks before recording a transaction that matches (or nearly matches) one already in the ledger."""
+        match = ledger_index.duplicates().classify(tx)
+        if match is None: return True
+        if match == "exact":
+            message = f"A transaction '{tx['title']}' of {format_currency(tx['amount'])} in '{tx['wallet']}' on {tx['date']} {tx['time']} already exists."
+        else:
+            message = (f"'{tx['wallet']}' already has a {format_currency(tx['amount'])} transaction within "
+                       f"{DUPLICATE_WINDOW_MINUTES} minutes of {tx['date']} {tx['time']}.")
+        return messagebox.askyesno("Possible Duplicate", f"{message}\n\nAdd it anyway?", parent=self)
 
 # --- Simple Entry Dialog (Used for Add/Edit Items) ---
 class SimpleEntryDialog(tk.Toplevel):
@@ -2809,6 +5767,7 @@ def launch_main_app(user_id):
     try:
         app = ExpenseWiseApp(user_id)
         app.mainloop()
+        wait_for_io() # Never leave with a save still in flight
         logging.info(f"Main application mainloop finished for user {user_id}.")
         # Check if full exit was requested
         if app and getattr(app, '_full_exit_requested', False):
@@ -2824,6 +5783,10 @@ def launch_main_app(user_id):
 
 if __name__ == "__main__":
     ensure_data_dir()
+    if sys.argv[1:2] in (["import"], ["verify"]):
+        exit_code = (run_import_command if sys.argv[1] == "import" else run_verify_command)(sys.argv[2:])
+        io_executor.shutdown(wait=True)
+        sys.exit(exit_code)
     logging.info("--- ExpenseWise Application Starting ---")
     continue_running = True
     while continue_running:
@@ -2846,4 +5809,5 @@ if __name__ == "__main__":
         if selected_user_id and continue_running:
             continue_running = launch_main_app(selected_user_id)
 
+    io_executor.shutdown(wait=True)
     logging.info("--- ExpenseWise Application Finished ---")
@@ -0,0 +1,112 @@
+"""Benchmark: ledger aggregation with per-row Python loops vs. the NumPy LedgerArrays engine (array construction included)"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ExpenseWise  # noqa: E402
+
+
+def make_transactions(rows):
+    """Builds a synthetic, time-sorted ledger shaped like the loaded transactions dataset."""
+    rng = random.Random(42)
+    wallets = ["Cash", "Bank", "Credit Card"]
+    categories = ["Food", "Transport", "Bills", "Salary", "Shopping"]
+    start = ExpenseWise.datetime.datetime(2020, 1, 1)
+    transactions = []
+    for i in range(rows):
+        stamp = start + ExpenseWise.datetime.timedelta(minutes=i)
+        is_income = rng.random() < 0.2
+        amount = rng.randint(100, 50_000) # Centavos
+        transactions.append({
+            "date": stamp.strftime("%Y-%m-%d"), "time": stamp.strftime("%H:%M:%S"), "timestamp": stamp.isoformat(),
+            "title": f"Transaction {i}", "wallet": rng.choice(wallets), "amount": amount if is_income else -amount,
+            "category": rng.choice(categories), "type": "income" if is_income else "expense",
+            "from_account": "", "to_account": "",
+            "linked_budget": "Food" if not is_income and rng.random() < 0.3 else "",
+            "linked_goal": "Trip" if not is_income and rng.random() < 0.05 else "",
+        })
+    ExpenseWise.prepare_ledger(transactions)
+    return transactions
+
+
+def loop_summary(transactions):
+    """The AllSpendingPage loop the summary used to run on every refresh."""
+    total_income, total_expense, expense_by_category = 0, 0, {}
+    for tx in transactions:
+        kind, amount = ExpenseWise.classify_spending(tx)
+        if kind == "income": total_income += amount
+        elif kind == "expense":
+            total_expense += amount
+            category = ExpenseWise.spending_category(tx.get("category"))
+            expense_by_category[category] = expense_by_category.get(category, 0) + amount
+    return total_income, total_expense, expense_by_category
+
+
+def loop_rebuild(transactions):
+    """LedgerIndex.rebuild() without numpy: one _apply() per row."""
+    index = ExpenseWise.LedgerIndex()
+    for tx in transactions:
+        index._apply(tx, 1)
+    return index
+
+
+def vectorized_rebuild(transactions):
+    index = ExpenseWise.LedgerIndex()
+    index.rebuild(transactions)
+    return index
+
+
+def vectorized_summary(transactions):
+    """Builds LedgerArrays and the daily rollups from them, then reads the summary."""
+    rollups = ExpenseWise.SpendingRollups()
+    ExpenseWise.LedgerArrays(transactions).daily_rollups(rollups)
+    return rollups.summary()
+
+
+def time_call(func, repeat):
+    """Runs func `repeat` times. Returns (best wall time, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="ledger sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best time is reported")
+    args = parser.parse_args()
+    if ExpenseWise.np is None:
+        sys.exit("numpy is not installed (pip install -r requirements.txt)")
+
+    print(f"{'rows':>10}  {'operation':<24} {'python loop':>12} {'numpy':>10} {'speedup':>8}")
+    row = lambda rows, label, loop_time, numpy_time: print(f"{rows:>10,}  {label:<24} {loop_time:>10.3f} s {numpy_time:>8.3f} s {loop_time / numpy_time:>7.1f}x")
+    for rows in args.rows:
+        transactions = make_transactions(rows)
+
+        loop_time, loop_index = time_call(lambda: loop_rebuild(transactions), args.repeat)
+        numpy_time, numpy_index = time_call(lambda: vectorized_rebuild(transactions), args.repeat)
+        budget_totals = lambda index: {name: series.cumulative[-1] for name, series in index.budget_series.items()}
+        assert budget_totals(loop_index) == budget_totals(numpy_index) and loop_index.wallet_totals == numpy_index.wallet_totals, "Rebuilds disagree"
+        assert loop_index.references == numpy_index.references, "Reference counts disagree"
+        row(rows, "index rebuild", loop_time, numpy_time)
+
+        loop_time, expected = time_call(lambda: loop_summary(transactions), args.repeat)
+        numpy_time, actual = time_call(lambda: vectorized_summary(transactions), args.repeat)
+        assert expected == actual, "Summaries disagree"
+        row(rows, "arrays + daily rollups", loop_time, numpy_time)
+
+        loop_time, expected = time_call(lambda: ExpenseWise.ledger_wallet_sums(transactions), args.repeat)
+        numpy_time, actual = time_call(lambda: ExpenseWise.LedgerArrays(transactions).group_sum("wallet"), args.repeat)
+        assert expected == actual, "Wallet sums disagree"
+        row(rows, "arrays + wallet group-by", loop_time, numpy_time)
+
+if __name__ == "__main__":
+    main()
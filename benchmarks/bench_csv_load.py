@@ -0,0 +1,88 @@
+"""Benchmark: loading a large transactions CSV with the streaming loader vs. the old DictReader loop"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ExpenseWise  # noqa: E402
+
+
+def write_transactions_csv(file_path, rows):
+    """Writes a synthetic transactions_<user>.csv with the app's schema."""
+    rng = random.Random(42)
+    wallets = ["Cash", "Bank", "Credit Card"]
+    categories = ["Food", "Transport", "Bills", "Salary", "Shopping"]
+    start = ExpenseWise.datetime.datetime(2020, 1, 1)
+    with open(file_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=ExpenseWise.TRANSACTION_FIELDS)
+        writer.writeheader()
+        for i in range(rows):
+            stamp = start + ExpenseWise.datetime.timedelta(minutes=i)
+            is_income = rng.random() < 0.2
+            writer.writerow({
+                "date": stamp.strftime("%Y-%m-%d"), "time": stamp.strftime("%H:%M:%S"), "timestamp": stamp.isoformat(),
+                "title": f"Transaction {i}", "wallet": rng.choice(wallets), "amount": f"{rng.uniform(1, 500):.2f}",
+                "category": rng.choice(categories), "type": "income" if is_income else "expense",
+                "from_account": "", "to_account": "",
+                "linked_budget": "Food" if not is_income and rng.random() < 0.3 else "", "linked_goal": "",
+            })
+
+
+def legacy_load(file_path, expected_fields, money_fields):
+    """The pre-streaming loader: DictReader plus a per-field list membership test (amounts parsed to centavos like the app does)."""
+    data_list = []
+    with open(file_path, mode="r", newline="", encoding="utf-8") as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row_num, row in enumerate(reader, 1):
+            processed_row = {}
+            for field in expected_fields:
+                val = row.get(field)
+                if field in money_fields:
+                    try:
+                        processed_row[field] = ExpenseWise.parse_money(val) if val not in [None, ''] else 0
+                    except ValueError:
+                        processed_row[field] = 0
+                else:
+                    processed_row[field] = val if val is not None else ''
+            data_list.append(processed_row)
+    return data_list
+
+
+def time_call(label, func, repeat):
+    """Runs func `repeat` times and prints the best wall time."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best:8.3f} s  ({len(result):,} rows)")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of transactions to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per loader; the best time is reported")
+    args = parser.parse_args()
+
+    fields, money = ExpenseWise.TRANSACTION_FIELDS, ["amount"]
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "transactions_bench.csv")
+        print(f"Generating {args.rows:,} rows...")
+        write_transactions_csv(file_path, args.rows)
+
+        legacy_time, legacy_rows = time_call("DictReader (legacy)", lambda: legacy_load(file_path, fields, money), args.repeat)
+        stream_time, stream_rows = time_call("_load_csv_data (streaming)", lambda: ExpenseWise._load_csv_data(file_path, fields, money_fields=money), args.repeat)
+
+        assert legacy_rows == stream_rows, "Loaders disagree on the loaded rows"
+        print(f"Speedup: {legacy_time / stream_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
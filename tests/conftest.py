@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ExpenseWise  # noqa: E402
+
+
+@pytest.fixture
+def user_id(tmp_path, monkeypatch):
+    """Runs a test against an empty data directory with the flat-file backend; yields the user ID to load."""
+    monkeypatch.chdir(tmp_path) # DATA_DIR is relative to the working directory
+    monkeypatch.setattr(ExpenseWise, "STORAGE_BACKEND", "csv")
+    ExpenseWise.user_manifests.clear()
+    yield "test_user"
+    ExpenseWise.user_manifests.clear()
+
+
+def make_transaction(title, amount, wallet="Cash", day=1):
+    """An expense (negative amount) or income row in centavos, as the Add Transaction dialog builds it."""
+    date = f"2024-03-{day:02d}"
+    return {"date": date, "time": "12:00", "timestamp": f"{date} 12:00", "title": title, "wallet": wallet,
+            "amount": amount, "category": "Food", "type": "expense" if amount < 0 else "income",
+            "from_account": None, "to_account": None, "linked_budget": None, "linked_goal": None}
+
+
+def titles():
+    return sorted(tx["title"] for tx in ExpenseWise.app_data["transactions"])
+
+
+def cash_balance():
+    return next(details["balance"] for details in ExpenseWise.app_data["wallets"].values() if details["name"] == "Cash")
@@ -0,0 +1,104 @@
+"""Crash safety of the flat-file save path: generation files + manifest commit, and journal replay."""
+import os
+
+import pytest
+
+import ExpenseWise
+from conftest import cash_balance, make_transaction, titles
+
+
+class SimulatedCrash(Exception):
+    """Stands in for the process dying: unlike OSError, write_user_data does not catch it."""
+
+
+def test_interrupted_save_loads_last_committed_generation(user_id, monkeypatch):
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    ExpenseWise.record_transactions([make_transaction("groceries", -12550)])
+    assert ExpenseWise.save_user_data(user_id, compact=True)
+    committed = dict(ExpenseWise.get_manifest(user_id))
+
+    ExpenseWise.record_transactions([make_transaction("salary", 500000, day=2)])
+
+    def crash(*args):
+        raise SimulatedCrash()
+    with monkeypatch.context() as patch:
+        patch.setattr(ExpenseWise, "commit_manifest", crash)
+        with pytest.raises(SimulatedCrash):
+            ExpenseWise.save_user_data(user_id, compact=True)
+    uncommitted = [name for name in os.listdir(ExpenseWise.DATA_DIR) if f".g{committed['generation'] + 1}." in name]
+    assert uncommitted # The generation files were written before the "crash"
+
+    ExpenseWise.user_manifests.clear()
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    assert ExpenseWise.get_manifest(user_id)["generation"] == committed["generation"]
+    assert ExpenseWise.get_manifest(user_id)["files"] == committed["files"]
+    assert not any(os.path.exists(os.path.join(ExpenseWise.DATA_DIR, name)) for name in uncommitted)
+    # The journal sealed for the failed save is still replayed, so nothing recorded is lost
+    assert titles() == ["groceries", "salary"]
+    assert cash_balance() == 500000 - 12550
+
+
+def test_journal_replay_restores_rows_recorded_after_last_save(user_id):
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    ExpenseWise.record_transactions([make_transaction("rent", -1500000)])
+    assert ExpenseWise.save_user_data(user_id, compact=True)
+
+    ExpenseWise.record_transactions([make_transaction("coffee", -15000, day=3), make_transaction("refund", 2500, day=4)])
+    assert os.path.exists(ExpenseWise.get_journal_file_path(user_id, "transactions"))
+
+    ExpenseWise.user_manifests.clear()
+    ExpenseWise.load_user_data(user_id, lazy=False) # No save since the last two rows
+    assert titles() == ["coffee", "refund", "rent"]
+    assert cash_balance() == -1500000 - 15000 + 2500
+    assert ExpenseWise.ledger_index.wallet_totals == ExpenseWise.ledger_wallet_sums(ExpenseWise.app_data["transactions"])
+
+
+
+def test_journal_replay_keeps_deleted_and_edited_rows_out(user_id):
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    ExpenseWise.record_transactions([make_transaction("rent", -1500000), make_transaction("lunch", -25000, day=2)])
+    assert ExpenseWise.save_user_data(user_id, compact=True)
+
+    ExpenseWise.record_transactions([make_transaction("coffee", -15000, day=3)])
+    ids = {tx["title"]: tx["transaction_id"] for tx in ExpenseWise.app_data["transactions"]}
+    ExpenseWise.delete_transactions([ids["rent"], ids["coffee"]]) # One saved row, one journaled row
+    ExpenseWise.update_transaction(ids["lunch"], {"title": "dinner", "amount": -40000})
+
+    ExpenseWise.user_manifests.clear()
+    ExpenseWise.load_user_data(user_id, lazy=False) # No save since the deletes
+    assert titles() == ["dinner"]
+    assert cash_balance() == -40000
+    assert ExpenseWise.ledger_index.wallet_totals == ExpenseWise.ledger_wallet_sums(ExpenseWise.app_data["transactions"])
+
+
+def test_load_restores_index_from_checkpoint_plus_journal(user_id, monkeypatch):
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    ExpenseWise.record_transactions([dict(make_transaction("groceries", -12550), linked_budget="Food"),
+                                     dict(make_transaction("savings", -50000, day=2), linked_goal="Trip")])
+    assert ExpenseWise.save_user_data(user_id, compact=True)
+    ExpenseWise.record_transactions([dict(make_transaction("snacks", -3000, day=3), linked_budget="Food")])
+
+    def full_rebuild(*args):
+        raise AssertionError("the aggregates should come from the checkpoint")
+    with monkeypatch.context() as patch:
+        patch.setattr(ExpenseWise.LedgerIndex, "rebuild", full_rebuild)
+        ExpenseWise.user_manifests.clear()
+        ExpenseWise.load_user_data(user_id, lazy=False)
+    restored = ExpenseWise.ledger_index
+    rebuilt = ExpenseWise.LedgerIndex()
+    rebuilt.rebuild(ExpenseWise.app_data["transactions"])
+    assert restored.checkpoint() == rebuilt.checkpoint()
+    assert restored.budget_spent_between("Food") == 15550
+    assert cash_balance() == -12550 - 50000 - 3000
+
+def test_snapshot_rows_unaffected_by_later_rename_and_delete(user_id):
+    ExpenseWise.load_user_data(user_id, lazy=False)
+    ExpenseWise.record_transactions([make_transaction("lunch", -25000), make_transaction("bus", -1300, day=2)])
+    snapshot = ExpenseWise.snapshot_user_data(user_id, compact=True)
+    wallet_id = next(iter(ExpenseWise.app_data["wallets"]))
+
+    ExpenseWise.update_entity("wallets", wallet_id, {"name": "Pocket"})
+    ExpenseWise.delete_transactions([ExpenseWise.app_data["transactions"][0]["transaction_id"]])
+    assert {tx["wallet"] for tx in snapshot["transactions"]} == {"Cash"}
+    assert not any(tx.get("_deleted") for tx in snapshot["transactions"])
+    assert ExpenseWise.write_user_data(user_id, snapshot)